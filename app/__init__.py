@@ -1,64 +1,71 @@
 import logging
-import os
-import tensorflow as tf
 from flask import Flask, jsonify
 
 from .config import Config
 from .extensions import db, ma
+from . import serialization
 
 def load_tokenizer(path: str):
-    with open(path, "r", encoding="utf-8") as f:
-        return tf.keras.preprocessing.text.tokenizer_from_json(f.read())
+    """Same result as tokenizer_from_json, but decoded with the fast JSON backend."""
+    # TensorFlow is only imported once a model is actually needed
+    import tensorflow as tf
+
+    config = serialization.load_file(path)["config"]
+    word_counts = serialization.loads(config.pop("word_counts"))
+    word_docs = serialization.loads(config.pop("word_docs"))
+    index_docs = {int(k): v for k, v in serialization.loads(config.pop("index_docs")).items()}
+    index_word = {int(k): v for k, v in serialization.loads(config.pop("index_word")).items()}
+    word_index = serialization.loads(config.pop("word_index"))
+
+    tokenizer = tf.keras.preprocessing.text.Tokenizer(**config)
+    tokenizer.word_counts = word_counts
+    tokenizer.word_docs = word_docs
+    tokenizer.index_docs = index_docs
+    tokenizer.word_index = word_index
+    tokenizer.index_word = index_word
+    return tokenizer
 
 def create_app():
     app = Flask(__name__, instance_relative_config=False)
+    app.json = serialization.FastJSONProvider(app)
 
     # Load configuration
     app.config.from_object(Config)
 
-    model_path    = app.config["MODEL_PATH"]
-    tok_in_path   = app.config["TOKENIZER_INPUT_PATH"]
-    tok_out_path  = app.config["TOKENIZER_TARGET_PATH"]
+    if app.config.get("METRICS_ENABLED"):
+        from app.services import metrics
+        metrics.init_app(app)
+    if app.config.get("PROFILE_ENABLED"):
+        from app.services import profiler
+        profiler.init_app(app)
 
-    summarization_model = None
-    tok_input = None
-    tok_target = None
-    start_i = None
-    end_i = None
-
-    # Load ML model and tokenizers if available
-    if os.path.exists(model_path):
-        try:
-            summarization_model = tf.keras.models.load_model(model_path)
-            tok_input  = load_tokenizer(tok_in_path)
-            tok_target = load_tokenizer(tok_out_path)
+    # The summarizer and ASR models are loaded on first use (or preloaded below)
+    # and shared with app.models.speech_to_text_and_enhance
+    from app.services.model_handles import MODEL_HANDLES, register_defaults
+    register_defaults(app.config)
 
-            widx = tok_target.word_index
-            start_i = widx.get("<start>", widx.get("start"))
-            end_i   = widx.get("<end>",   widx.get("end"))
-
-            app.logger.info("Model and tokenizers loaded successfully.")
-
-        except Exception as e:
-            app.logger.error(f"Failed to load model/tokenizers: {e}")
-    else:
-        app.logger.warning("Summarizer model not found. Skipping model/tokenizer load.")
-
-    # Update app config (conditionally)
     app.config.update({
-        "SUMMARIZER":         summarization_model,
-        "TOK_INPUT":          tok_input,
-        "TOK_TARGET":         tok_target,
-        "START_TOKEN_INDEX":  start_i,
-        "END_TOKEN_INDEX":    end_i,
         "MAX_INPUT_LEN":      int(app.config.get("MAX_LENGTH_INPUT", 50)),
         "MAX_TARGET_LEN":     int(app.config.get("MAX_LENGTH_TARGET", 20)),
     })
 
+    for name in app.config.get("MODEL_PRELOAD", []):
+        try:
+            MODEL_HANDLES.warm_up([name])
+            app.logger.info(f"Model {name} loaded successfully.")
+        except Exception as e:
+            app.logger.warning(f"Model {name} not preloaded, will retry on first use: {e}")
+    MODEL_HANDLES.start_reaper()
+
     # Initialize Flask extensions
     db.init_app(app)
     ma.init_app(app)
 
+    # Create the model registry index and pick up graphs saved before it existed
+    from app.services import model_registry
+    with app.app_context():
+        model_registry.init_registry()
+
     # Register blueprints
     from app.blueprints.notes import notes_bp
     from app.blueprints.visual_ai import visual_ai_bp
@@ -67,6 +74,10 @@ def create_app():
     app.register_blueprint(notes_bp, url_prefix="/api/notes")
     app.register_blueprint(visual_ai_bp)
 
+    if app.config.get("PLUGIN_HOT_RELOAD"):
+        from app.services.plugin_loader import PLUGIN_REGISTRY
+        PLUGIN_REGISTRY.start_watching()
+
     # Health check endpoint
     @app.route("/healthz", methods=["GET"])
     def healthz():
@@ -1,7 +1,12 @@
-from flask import Blueprint, request, jsonify, current_app, abort
+from flask import Blueprint, request, jsonify, current_app, abort, url_for
+import os
 import numpy as np
 from tensorflow.keras.preprocessing.sequence import pad_sequences
 
+from app.services import audio_jobs
+from app.services.metrics import timed
+from app.services.model_handles import MODEL_HANDLES
+
 notes_bp = Blueprint("notes", __name__)
 
 def extract_text():
@@ -14,23 +19,64 @@ def extract_text():
 
 def summarize_lstm(text: str) -> str:
     """Generate summary using the LSTM model."""
-    model = current_app.config["SUMMARIZER"]
-    tok_input = current_app.config["TOK_INPUT"]
-    tok_target = current_app.config["TOK_TARGET"]
+    try:
+        summarizer = MODEL_HANDLES.get("summarizer")
+    except (OSError, ValueError) as e:
+        current_app.logger.error("Summarizer unavailable: %s", e)
+        abort(503, "Summarizer model not available")
+    model = summarizer["model"]
+    tok_input = summarizer["tok_input"]
+    tok_target = summarizer["tok_target"]
     max_input_len = current_app.config["MAX_INPUT_LEN"]
     max_target_len = current_app.config["MAX_TARGET_LEN"]
 
-    seq = tok_input.texts_to_sequences([text])
-    padded = pad_sequences(seq, maxlen=max_input_len, padding='post')
+    with timed("summarize", "tokenize"):
+        seq = tok_input.texts_to_sequences([text])
+    with timed("summarize", "pad"):
+        padded = pad_sequences(seq, maxlen=max_input_len, padding='post')
 
-    pred = model.predict(np.array(padded))[0]
-    output_seq = np.argmax(pred, axis=1)
-    output_text = tok_target.sequences_to_texts([output_seq])[0]
+    with timed("summarize", "predict"):
+        pred = model.predict(np.array(padded))[0]
+    with timed("summarize", "decode"):
+        output_seq = np.argmax(pred, axis=1)
+        output_text = tok_target.sequences_to_texts([output_seq])[0]
 
     return output_text.strip()
 
+def enqueue_audio():
+    """
+    Save the uploaded audio to disk (multipart field "audio_file", or a raw
+    audio/* body) and queue it for transcription and summarization.
+    """
+    upload = request.files.get("audio_file")
+    if upload is not None:
+        # Werkzeug spools large multipart files to a temp file, so this is a disk-to-disk copy
+        job_id, audio_path = audio_jobs.save_upload(upload.stream, upload.filename)
+    elif request.mimetype.startswith("audio/"):
+        job_id, audio_path = audio_jobs.save_upload(request.stream)
+    else:
+        abort(400, "No audio provided")
+
+    try:
+        status = audio_jobs.submit(current_app._get_current_object(), job_id, audio_path, summarize_lstm)
+    except audio_jobs.QueueFull as e:
+        os.remove(audio_path)
+        abort(503, str(e))
+
+    return jsonify({
+        "status": "accepted",
+        "data": {
+            "job_id": job_id,
+            "state": status["status"],
+            "status_url": url_for("notes.get_job", job_id=job_id),
+        }
+    }), 202
+
 @notes_bp.route("/process", methods=["POST"])
 def process_note():
+    # Audio uploads (e.g. from the recorder in the UI) are processed in the background
+    if request.files or request.mimetype.startswith("audio/"):
+        return enqueue_audio()
     text = extract_text()
     summary = summarize_lstm(text)
     return jsonify({
@@ -41,6 +87,17 @@ def process_note():
         }
     }), 200
 
+@notes_bp.route("/audio", methods=["POST"])
+def process_audio():
+    return enqueue_audio()
+
+@notes_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    status = audio_jobs.get_status(job_id)
+    if status is None:
+        abort(404, "Job not found")
+    return jsonify({"status": "success", "data": status}), 200
+
 @notes_bp.route("/evaluate", methods=["POST"])
 def evaluate_summary():
     data = request.get_json(silent=True) or {}
@@ -1,27 +1,32 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, abort
 import uuid
 import os
-import json
+import numpy as np
+
+from app.serialization import validate_graph, validate_log, loads, SchemaError
 
 from app.services.graph_simulator import run_simulation
-from app.services.ai_registry import save_ai_model, load_ai_model, list_user_models
+from app.services.plugin_executor import get_executor
+from app.services import model_registry, datasets
 
 visual_ai_bp = Blueprint('visual_ai', __name__, url_prefix='/ai')
 
-# Store files in a local folder (or switch to DB later)
-STORAGE_PATH = "./ai_models"
+# Graphs live in the blob store and are indexed by app.services.model_registry
+DATASET_PATH = datasets.DATASET_DIR
 NODE_LIBRARY_PATH ="app/services/node_library.json"
 
 
-os.makedirs(STORAGE_PATH, exist_ok=True)
-
 @visual_ai_bp.route('/create', methods=['POST'])
 def create_model():
     data = request.json
+    try:
+        validate_graph(data)
+    except SchemaError as e:
+        abort(400, str(e))
     model_id = str(uuid.uuid4())
+    owner = data.get("owner") or request.headers.get("X-User-Id")
 
-    with open(os.path.join(STORAGE_PATH, f"{model_id}.json"), "w") as f:
-        json.dump(data, f)
+    model_registry.save_model(model_id, data, owner=owner)
 
     return jsonify({"status": "ok", "model_id": model_id})
 
@@ -32,38 +37,102 @@ def train_model():
     model_id = payload["model_id"]
     dataset_name = payload["dataset"]  # Assume pre-stored datasets
 
-    with open(os.path.join(STORAGE_PATH, f"{model_id}.json"), "r") as f:
-        graph = json.load(f)
+    graph = model_registry.load_model(model_id)
+
+    if payload.get("mode") == "compiled":
+        return train_compiled(model_id, graph, dataset_name, payload)
 
-    logs = run_simulation(graph, dataset_name)
-    with open(os.path.join(STORAGE_PATH, f"{model_id}_logs.json"), "w") as f:
-        json.dump(logs, f)
+    executor = get_executor() if current_app.config.get("PLUGIN_SANDBOX") else None
+    # Without explicit timesteps the dataset length decides how long to run
+    timesteps = payload.get("timesteps")
+    try:
+        logs = run_simulation(
+            graph, dataset_name,
+            timesteps=int(timesteps) if timesteps is not None else None,
+            executor=executor,
+            batch_size=int(payload.get("batch_size", 1)),
+        )
+    except ValueError as e:
+        abort(400, str(e))
+    model_registry.atomic_write_json(model_registry.logs_path(model_id), logs)
 
     return jsonify({"status": "training_complete"})
 
 
+def train_compiled(model_id, graph, dataset_name, payload):
+    """
+    Train the graph as a compiled TensorFlow model on ./datasets/<name>.npz,
+    which holds one [N, timesteps] array per input node id plus targets "y".
+    """
+    from app.services.graph_compiler import train_graph
+
+    path = os.path.join(DATASET_PATH, f"{os.path.basename(dataset_name)}.npz")
+    if not os.path.exists(path):
+        return jsonify({"error": "Dataset not found"}), 404
+
+    with np.load(path) as data:
+        feeds = {k: data[k] for k in data.files if k != "y"}
+        targets = data["y"]
+
+    history = train_graph(
+        graph, feeds, targets,
+        timesteps=targets.shape[1],
+        epochs=int(payload.get("epochs", 5)),
+        batch_size=int(payload.get("batch_size", 32)),
+    )
+    history = {k: [float(v) for v in vals] for k, vals in history.items()}
+
+    model_registry.atomic_write_json(
+        model_registry.logs_path(model_id),
+        {"mode": "compiled", "dataset_name": dataset_name, "history": history},
+    )
+
+    return jsonify({"status": "training_complete", "history": history})
+
+
+@visual_ai_bp.route('/datasets', methods=['GET'])
+def list_datasets():
+    return jsonify(datasets.list_datasets())
+
+
 @visual_ai_bp.route('/<model_id>/logs', methods=['GET'])
 def get_logs(model_id):
     try:
-        with open(os.path.join(STORAGE_PATH, f"{model_id}_logs.json"), "r") as f:
-            logs = json.load(f)
-        return jsonify(logs)
+        with open(model_registry.logs_path(model_id), "rb") as f:
+            raw = f.read()
     except FileNotFoundError:
         return jsonify({"error": "Logs not found"}), 404
+    try:
+        validate_log(loads(raw))
+    except ValueError as e:  # SchemaError or malformed JSON
+        current_app.logger.error("Corrupt logs for model %s: %s", model_id, e)
+        return jsonify({"error": "Stored logs are corrupt"}), 500
+    # Valid JSON already; send the bytes back as stored
+    return current_app.response_class(raw, mimetype="application/json")
 
 
 @visual_ai_bp.route('/list', methods=['GET'])
 def list_models():
-    files = os.listdir(STORAGE_PATH)
-    model_files = [f for f in files if f.endswith(".json") and not f.endswith("_logs.json")]
-    models = [{"model_id": f.replace(".json", "")} for f in model_files]
-    return jsonify(models)
+    try:
+        rows, next_cursor = model_registry.list_models(
+            owner=request.args.get("owner"),
+            graph_hash=request.args.get("graph_hash"),
+            limit=request.args.get("limit", model_registry.DEFAULT_PAGE_SIZE, type=int),
+            cursor=request.args.get("cursor"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    models = [{"model_id": row.id, "name": row.name, "owner": row.owner} for row in rows]
+    response = jsonify(models)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 
 @visual_ai_bp.route('/nodes/library', methods=['GET'])
 def get_node_library():
     try:
-        with open(NODE_LIBRARY_PATH, "r") as f:
-            return jsonify(json.load(f))
+        with open(NODE_LIBRARY_PATH, "rb") as f:
+            return current_app.response_class(f.read(), mimetype="application/json")
     except FileNotFoundError:
         return jsonify({"error": "Node library not found"}), 404
@@ -0,0 +1,290 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+from app.services import metrics
+
+# Chunked transcription settings. Chunks overlap so words cut at a boundary are
+# seen whole by one of the two chunks; the duplicate words are removed when stitching.
+SAMPLE_RATE = 16000  # wav2vec2 expects 16 kHz mono
+CHUNK_SECONDS = float(os.environ.get("ASR_CHUNK_SECONDS", 20))
+OVERLAP_SECONDS = float(os.environ.get("ASR_OVERLAP_SECONDS", 2))
+ASR_BATCH_SIZE = int(os.environ.get("ASR_BATCH_SIZE", 4))
+# Decoded chunks waiting for the model; bounds memory to roughly
+# QUEUE_CHUNKS * CHUNK_SECONDS of float32 audio however long the recording is
+QUEUE_CHUNKS = int(os.environ.get("ASR_QUEUE_CHUNKS", 8))
+# Longest run of repeated words looked for when stitching neighbouring chunks
+MAX_STITCH_WORDS = 12
+
+# Voice activity detection: only audio whose frame energy is above the threshold
+# (in dBFS) is sent to the model. Short pauses don't split a segment, and each
+# segment keeps a little padding so word onsets aren't clipped.
+ASR_VAD = os.environ.get("ASR_VAD", "true").lower() == "true"
+VAD_THRESHOLD_DB = float(os.environ.get("VAD_THRESHOLD_DB", -40))
+VAD_FRAME_MS = 30
+VAD_MIN_SILENCE_MS = 500
+VAD_MIN_SPEECH_MS = 250
+VAD_PAD_MS = 200
+
+_DONE = object()
+
+
+def _ffmpeg_pcm(file_path, sample_rate, read_bytes):
+    """Yield raw s16le mono PCM blocks decoded by ffmpeg, without loading the whole file."""
+    cmd = [
+        AudioSegment.converter, "-nostdin", "-loglevel", "error", "-i", file_path,
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "-",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            block = proc.stdout.read(read_bytes)
+            if not block:
+                break
+            yield block
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {proc.stderr.read().decode(errors='replace').strip()}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.stderr.close()
+        proc.wait()
+
+def _pydub_pcm(file_path, sample_rate, read_bytes):
+    """Fallback when ffmpeg isn't on PATH: pydub can still read WAV, but decodes it whole."""
+    audio = AudioSegment.from_file(file_path)
+    raw = audio.set_channels(1).set_frame_rate(sample_rate).set_sample_width(2).raw_data
+    for start in range(0, len(raw), read_bytes):
+        yield raw[start:start + read_bytes]
+
+def pcm_blocks(file_path, block_samples, sample_rate=SAMPLE_RATE):
+    """Yield the decoded audio as float32 arrays of block_samples samples (the last may be shorter)."""
+    has_ffmpeg = shutil.which(AudioSegment.converter) is not None
+    blocks = (_ffmpeg_pcm if has_ffmpeg else _pydub_pcm)(file_path, sample_rate, block_samples * 2)
+    for block in blocks:
+        yield np.frombuffer(block[:len(block) // 2 * 2], dtype="<i2").astype("float32") / 32768.0
+
+def decode_chunks(file_path, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS,
+                  sample_rate=SAMPLE_RATE):
+    """
+    Yield (start_seconds, samples) for fixed-size overlapping chunks of float32
+    mono audio. Each chunk starts chunk_seconds - overlap_seconds after the last.
+    """
+    chunk_len = int(chunk_seconds * sample_rate)
+    step = chunk_len - int(overlap_seconds * sample_rate)
+    if step <= 0:
+        raise ValueError("overlap_seconds must be shorter than chunk_seconds")
+
+    buf = np.zeros(0, dtype="float32")
+    offset = 0  # sample index of buf[0]
+    for samples in pcm_blocks(file_path, step, sample_rate):
+        buf = np.concatenate([buf, samples])
+        while len(buf) >= chunk_len:
+            yield offset / sample_rate, buf[:chunk_len]
+            buf = buf[step:]
+            offset += step
+    # Tail, unless it is entirely covered by the previous chunk's overlap
+    if len(buf) and (offset == 0 or len(buf) > chunk_len - step):
+        yield offset / sample_rate, buf
+
+
+
+def frame_energy_db(samples, frame_len):
+    """Energy of each whole frame of `samples`, in dBFS."""
+    n = len(samples) // frame_len
+    frames = samples[:n * frame_len].reshape(n, frame_len)
+    return 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+def _runs(mask):
+    """(value, start, end) for each run of equal values in a boolean array."""
+    if not len(mask):
+        return []
+    edges = np.flatnonzero(np.diff(mask.astype("int8"))) + 1
+    starts = np.concatenate([[0], edges])
+    ends = np.concatenate([edges, [len(mask)]])
+    return zip(mask[starts].tolist(), starts.tolist(), ends.tolist())
+
+def vad_chunks(file_path, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS,
+               sample_rate=SAMPLE_RATE, threshold_db=VAD_THRESHOLD_DB, frame_ms=VAD_FRAME_MS,
+               min_silence_ms=VAD_MIN_SILENCE_MS, min_speech_ms=VAD_MIN_SPEECH_MS, pad_ms=VAD_PAD_MS):
+    """
+    Like decode_chunks, but silence is skipped: yields (start_seconds, samples)
+    for each speech segment. Segments longer than chunk_seconds are split into
+    overlapping chunks. Only the open segment is kept in memory.
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    min_silence = max(1, int(min_silence_ms / frame_ms)) * frame
+    min_speech = int(min_speech_ms * sample_rate / 1000)
+    # Trailing padding must already be decoded when a segment closes
+    pad = min(int(pad_ms * sample_rate / 1000), min_silence)
+    chunk_len = int(chunk_seconds * sample_rate)
+    step = chunk_len - int(overlap_seconds * sample_rate)
+    if step <= 0:
+        raise ValueError("overlap_seconds must be shorter than chunk_seconds")
+
+    buf = np.zeros(0, dtype="float32")
+    buf_off = 0           # absolute sample index of buf[0]
+    pos = 0               # samples analysed so far (whole frames)
+    seg_start = None      # start of the open speech segment
+    lead = pad            # padding before seg_start; none after a split, the overlap covers it
+    silence_since = None  # start of the silence at the end of the open segment
+
+    def _segment(start, end, lead):
+        a = max(start - lead, buf_off)
+        b = min(end, buf_off + len(buf))
+        return a / sample_rate, buf[a - buf_off:b - buf_off]
+
+    for samples in pcm_blocks(file_path, block_samples=sample_rate, sample_rate=sample_rate):
+        buf = np.concatenate([buf, samples])
+        n_frames = (buf_off + len(buf) - pos) // frame
+        energy = frame_energy_db(buf[pos - buf_off:pos - buf_off + n_frames * frame], frame)
+
+        for is_speech, a, b in _runs(energy > threshold_db):
+            a, b = pos + a * frame, pos + b * frame
+            if is_speech:
+                if seg_start is None:
+                    seg_start, lead = a, pad
+                silence_since = None
+            elif seg_start is not None:
+                if silence_since is None:
+                    silence_since = a
+                if b - silence_since >= min_silence:
+                    if silence_since - seg_start >= min_speech:
+                        yield _segment(seg_start, silence_since + pad, lead)
+                    seg_start = silence_since = None
+        pos += n_frames * frame
+
+        while seg_start is not None and pos - seg_start >= chunk_len:
+            yield _segment(seg_start, seg_start + chunk_len, lead)
+            seg_start, lead = seg_start + step, 0
+
+        keep_from = seg_start - lead if seg_start is not None else pos - pad
+        keep_from = min(max(keep_from, buf_off), pos)
+        buf = buf[keep_from - buf_off:]
+        buf_off = keep_from
+
+    if seg_start is not None:
+        end = silence_since + pad if silence_since is not None else buf_off + len(buf)
+        # After a split, skip a tail that the previous chunk's overlap already covers
+        if end - seg_start >= (min_speech if lead else chunk_len - step + 1):
+            yield _segment(seg_start, end, lead)
+
+
+def stitch(previous_words, words, max_overlap=MAX_STITCH_WORDS):
+    """
+    Drop the words at the start of `words` that repeat the end of
+    `previous_words` (the transcript of the overlapping audio).
+    The first word of a chunk may be a cut-off fragment, so a match
+    one word in is accepted too.
+    """
+    limit = min(max_overlap, len(previous_words), len(words))
+    for k in range(limit, 0, -1):
+        tail = [w.lower() for w in previous_words[-k:]]
+        if [w.lower() for w in words[:k]] == tail:
+            return words[k:]
+        if [w.lower() for w in words[1:k + 1]] == tail:
+            return words[k + 1:]
+    return words
+
+
+class _Decoder(threading.Thread):
+    """Decodes chunks into a bounded queue so decoding runs ahead of inference but never too far."""
+
+    def __init__(self, chunks, out):
+        super().__init__(name="asr-decode", daemon=True)
+        self.chunks = chunks
+        self.out = out
+        self.stop = threading.Event()
+
+    def _put(self, item):
+        while not self.stop.is_set():
+            try:
+                self.out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        try:
+            for chunk in self.chunks:
+                if not self._put(chunk):
+                    return
+        except Exception as e:
+            self._put(e)
+        self._put(_DONE)
+
+
+def transcribe_stream(file_path, asr, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS,
+                      batch_size=ASR_BATCH_SIZE, queue_size=QUEUE_CHUNKS, vad=ASR_VAD):
+    """
+    Transcribe an audio file chunk by chunk with a Hugging Face ASR pipeline,
+    yielding partial results as soon as each batch is done:
+        {"index": i, "start": seconds, "end": seconds, "text": new words, "asr_ms": model time}
+    Joining the "text" values with spaces gives the full transcript. With vad,
+    silent stretches are skipped and start/end are the speech segment times.
+    """
+    if vad:
+        source = vad_chunks(file_path, chunk_seconds, overlap_seconds)
+    else:
+        source = decode_chunks(file_path, chunk_seconds, overlap_seconds)
+    chunks = queue.Queue(maxsize=max(1, queue_size))
+    decoder = _Decoder(source, chunks)
+    decoder.start()
+
+    previous = []
+    previous_end = 0.0
+    index = 0
+    done = False
+    try:
+        while not done:
+            # Block for the first chunk, then take whatever else is ready up to batch_size
+            batch = []
+            while len(batch) < batch_size:
+                try:
+                    item = chunks.get() if not batch else chunks.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    done = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                batch.append(item)
+            if not batch:
+                break
+
+            inputs = [{"raw": samples, "sampling_rate": SAMPLE_RATE} for _, samples in batch]
+            started = time.perf_counter()
+            results = asr(inputs, batch_size=len(inputs))
+            # Batch inference time, shared out by chunk length
+            batch_ms = (time.perf_counter() - started) * 1000
+            metrics.STAGE_LATENCY.labels("transcribe", "asr").observe(batch_ms / 1000)
+            metrics.BATCH_SIZE.labels("asr").observe(len(batch))
+            batch_samples = sum(len(samples) for _, samples in batch) or 1
+            for (start, samples), result in zip(batch, results):
+                words = result.get("text", "").split()
+                # Only chunks that overlap the previous one can repeat its words
+                if start < previous_end:
+                    words = stitch(previous, words)
+                previous = (previous + words)[-MAX_STITCH_WORDS:]
+                end = start + len(samples) / SAMPLE_RATE
+                previous_end = end
+                yield {
+                    "index": index,
+                    "start": round(start, 3),
+                    "end": round(end, 3),
+                    "text": " ".join(words),
+                    "asr_ms": round(batch_ms * len(samples) / batch_samples, 1),
+                }
+                index += 1
+    finally:
+        decoder.stop.set()
+        decoder.join(timeout=1.0)
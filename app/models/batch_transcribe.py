@@ -0,0 +1,309 @@
+"""
+Batch transcription + summarization of a directory of recordings (e.g. nightly backfills).
+
+    python -m app.models.batch_transcribe RECORDINGS_DIR --out results.jsonl [--batch-size 8] [--workers 4]
+
+Files are decoded (and VAD-segmented) in a process pool that streams chunks
+back through a bounded queue, so memory doesn't grow with recording length;
+chunks from many files are batched through the ASR model together. Each
+transcript is appended to <out>.transcripts as soon as its file is done, and
+summaries are computed in batches and appended to the output JSONL. Rerunning
+the same command skips files already in it and summarizes the transcripts left
+over, so an interrupted backfill resumes where it stopped. Files that failed
+to decode are recorded with an "error" and only retried with --retry-errors.
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app import serialization
+from app.models import audio_stream
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".m4a", ".webm", ".opus")
+# Chunks gathered before running ASR, as a multiple of the batch size; sorting a
+# larger pool by length gives batches of near-equal length (less padding)
+POOL_BATCHES = 4
+# Messages (of batch_size chunks each) a decoder may queue ahead of the ASR loop
+QUEUE_MESSAGES_PER_WORKER = 2
+# Transcripts waiting for their summary, next to the output file
+TRANSCRIPTS_SUFFIX = ".transcripts"
+
+
+def discover(root, extensions=AUDIO_EXTENSIONS):
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for fname in filenames:
+            if fname.lower().endswith(extensions):
+                paths.append(os.path.join(dirpath, fname))
+    return sorted(paths)
+
+def file_key(path, root):
+    """Identifies one version of a recording: a re-recorded file gets processed again."""
+    st = os.stat(path)
+    return f"{os.path.relpath(path, root)}:{st.st_size}:{st.st_mtime_ns}"
+
+def _read_records(path):
+    """Records of a JSONL file; a torn last line is ignored."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = serialization.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "key" in record:
+                yield record
+
+def load_checkpoint(out_path, retry_errors=False):
+    """Keys of files already written to out_path; with retry_errors, failed files don't count."""
+    return {r["key"] for r in _read_records(out_path) if not (retry_errors and "error" in r)}
+
+def load_transcripts(out_path, done):
+    """Transcripts from an earlier run that never got their summary, by key."""
+    return {r["key"]: r for r in _read_records(out_path + TRANSCRIPTS_SUFFIX) if r["key"] not in done}
+
+
+_chunk_queue = None
+
+def _init_decoder(chunk_queue):
+    global _chunk_queue
+    _chunk_queue = chunk_queue
+    # After an interrupt nobody reads what is still queued; don't wait to flush it on exit
+    _chunk_queue.cancel_join_thread()
+
+def _decode(path, vad, chunk_seconds, overlap_seconds, message_chunks):
+    """
+    Runs in a worker process: decode one file and put its (start, samples)
+    chunks on the queue, message_chunks at a time, then (path, None, error).
+    Blocks while the queue is full, so a long file is never held in memory.
+    """
+    batch, error = [], None
+    try:
+        chunker = audio_stream.vad_chunks if vad else audio_stream.decode_chunks
+        for chunk in chunker(path, chunk_seconds, overlap_seconds):
+            batch.append(chunk)
+            if len(batch) == message_chunks:
+                _chunk_queue.put((path, batch, None))
+                batch = []
+        if batch:
+            _chunk_queue.put((path, batch, None))
+    except Exception as e:
+        error = str(e)
+    _chunk_queue.put((path, None, error))
+
+
+class _FileJob:
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self.starts = []
+        self.ends = []
+        self.texts = []
+        self.remaining = 0
+        self.decoded = False
+        self.asr_ms = 0.0
+
+    def add_chunks(self, chunks):
+        """Register decoded chunks; returns (job, index, samples) items for the ASR pool."""
+        items = []
+        for start, samples in chunks:
+            items.append((self, len(self.texts), samples))
+            self.starts.append(start)
+            self.ends.append(start + len(samples) / audio_stream.SAMPLE_RATE)
+            self.texts.append(None)
+            self.remaining += 1
+        return items
+
+    @property
+    def done(self):
+        return self.decoded and self.remaining == 0
+
+    def transcript(self):
+        words, previous, previous_end = [], [], 0.0
+        segments = []
+        for start, end, text in zip(self.starts, self.ends, self.texts):
+            new = text.split()
+            if start < previous_end:
+                new = audio_stream.stitch(previous, new)
+            previous, previous_end = (previous + new)[-audio_stream.MAX_STITCH_WORDS:], end
+            words.extend(new)
+            segments.append({"start": round(start, 3), "end": round(end, 3), "text": " ".join(new)})
+        return " ".join(words), segments
+
+
+def _append(f, record):
+    f.write(serialization.dumps(record) + b"\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def run_backfill(root, out_path, batch_size=audio_stream.ASR_BATCH_SIZE, workers=None, summary_batch_size=32,
+                 vad=audio_stream.ASR_VAD, chunk_seconds=audio_stream.CHUNK_SECONDS,
+                 overlap_seconds=audio_stream.OVERLAP_SECONDS, limit=None, retry_errors=False):
+    """Process every recording under root not yet in out_path. Returns the number of files written."""
+    done = load_checkpoint(out_path, retry_errors)
+    keys = {p: file_key(p, root) for p in discover(root)}
+    current = set(keys.values())
+    # Transcribed last time, only the summary is missing
+    transcribed = {k: r for k, r in load_transcripts(out_path, done).items() if k in current}
+    todo = [p for p, k in keys.items() if k not in done and k not in transcribed]
+    if limit:
+        todo = todo[:limit]
+    print(f"[Info] {len(todo)} files to process ({len(done)} already done, {len(transcribed)} to summarize)")
+    if not todo and not transcribed:
+        return 0
+
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    # Spawned, not forked: the pool starts its workers lazily, on the first submit(),
+    # which comes after the ASR model has loaded torch and started its threads
+    ctx = multiprocessing.get_context("spawn")
+    chunk_queue = ctx.Queue(maxsize=workers * QUEUE_MESSAGES_PER_WORKER)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                               initializer=_init_decoder, initargs=(chunk_queue,))
+
+    from app.services import enrichment
+    from app.services.model_handles import MODEL_HANDLES
+    from app.models import speech_to_text_and_enhance as speech
+    asr = MODEL_HANDLES.get("asr") if todo else None
+
+    written = 0
+    ready_chunks = []   # (job, index, samples) waiting for ASR
+    finished = list(transcribed.values())   # transcript records waiting for summarization
+    started = time.perf_counter()
+
+    with open(out_path, "ab") as out, open(out_path + TRANSCRIPTS_SUFFIX, "ab") as transcripts_out:
+
+        def write(record):
+            nonlocal written
+            _append(out, record)
+            written += 1
+
+        def finish(job):
+            # Saved before summarization, so an interrupt doesn't lose the ASR work
+            text, segments = job.transcript()
+            record = {
+                "key": job.key,
+                "file": os.path.relpath(job.path, root),
+                "transcription": text,
+                "segments": segments,
+                "speech_seconds": round(sum(e - s for s, e in zip(job.starts, job.ends)), 3),
+                "asr_ms": round(job.asr_ms, 1),
+            }
+            _append(transcripts_out, record)
+            finished.append(record)
+
+        def run_asr(flush=False):
+            ready_chunks.sort(key=lambda item: len(item[2]))
+            while len(ready_chunks) >= batch_size or (flush and ready_chunks):
+                batch, ready_chunks[:] = ready_chunks[:batch_size], ready_chunks[batch_size:]
+                t0 = time.perf_counter()
+                results = asr([{"raw": s, "sampling_rate": audio_stream.SAMPLE_RATE} for _, _, s in batch],
+                              batch_size=len(batch))
+                ms = (time.perf_counter() - t0) * 1000 / len(batch)
+                for (job, i, _), result in zip(batch, results):
+                    job.texts[i] = result.get("text", "")
+                    job.asr_ms += ms
+                    job.remaining -= 1
+                    if job.done:
+                        finish(job)
+
+        def run_summaries(flush=False):
+            while len(finished) >= summary_batch_size or (flush and finished):
+                records, finished[:] = finished[:summary_batch_size], finished[summary_batch_size:]
+                texts = [r["transcription"] for r in records]
+                summaries = speech.generate_summaries(texts, batch_size=summary_batch_size)
+                for record, text, summary in zip(records, texts, summaries):
+                    write({
+                        "key": record["key"],
+                        "file": record["file"],
+                        "transcription": text,
+                        "summary": summary,
+                        "keywords": enrichment.enrich(text)["keywords"] if text else [],
+                        "segments": record["segments"],
+                        "speech_seconds": record["speech_seconds"],
+                        "asr_ms": record["asr_ms"],
+                    })
+
+        decoding = {}       # path -> job whose file is still being decoded
+        futures = set()
+        paths = list(reversed(todo))
+        try:
+            while paths or decoding:
+                # Keep a bounded number of files in flight
+                while paths and len(decoding) < workers * 2:
+                    path = paths.pop()
+                    decoding[path] = _FileJob(path, keys[path])
+                    futures.add(pool.submit(_decode, path, vad, chunk_seconds, overlap_seconds, batch_size))
+                for future in [f for f in futures if f.done()]:
+                    futures.discard(future)
+                    future.result()  # raises if a decoder process died
+                try:
+                    path, chunks, error = chunk_queue.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                job = decoding[path]
+                if chunks is not None:
+                    ready_chunks.extend(job.add_chunks(chunks))
+                elif error:
+                    print(f"[Error] Failed to decode {path}: {error}")
+                    del decoding[path]
+                    ready_chunks[:] = [item for item in ready_chunks if item[0] is not job]
+                    write({"key": job.key, "file": os.path.relpath(path, root), "error": error})
+                else:
+                    del decoding[path]
+                    job.decoded = True
+                    if job.done:
+                        finish(job)
+                if len(ready_chunks) >= batch_size * POOL_BATCHES:
+                    run_asr()
+                run_summaries()
+            run_asr(flush=True)
+            run_summaries(flush=True)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            # A decoder blocked on the full queue can only exit once it is drained
+            while any(not f.done() for f in futures):
+                try:
+                    chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            pool.shutdown()
+
+    # Every transcript has its summary in out_path now
+    os.remove(out_path + TRANSCRIPTS_SUFFIX)
+    elapsed = time.perf_counter() - started
+    print(f"[✔] Wrote {written} results to {out_path} in {elapsed:.1f}s")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe and summarize a directory of recordings.")
+    parser.add_argument("root", help="directory searched recursively for audio files")
+    parser.add_argument("--out", default="backfill_results.jsonl", help="JSONL results file (also the checkpoint)")
+    parser.add_argument("--batch-size", type=int, default=audio_stream.ASR_BATCH_SIZE, help="ASR chunks per batch")
+    parser.add_argument("--summary-batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None, help="decoder processes")
+    parser.add_argument("--no-vad", action="store_true", help="transcribe silences too")
+    parser.add_argument("--limit", type=int, default=None, help="process at most this many files")
+    parser.add_argument("--retry-errors", action="store_true", help="process files that failed to decode last time")
+    args = parser.parse_args(argv)
+
+    run_backfill(
+        args.root, args.out,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        summary_batch_size=args.summary_batch_size,
+        vad=not args.no_vad,
+        limit=args.limit,
+        retry_errors=args.retry_errors,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
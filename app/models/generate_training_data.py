@@ -1,10 +1,14 @@
-from datasets import load_dataset
 import json
 import re
 import os
 import sys
 import random
 
+def load_dataset(*args, **kwargs):
+    # Imported on use so the text helpers below work without the HF datasets package
+    from datasets import load_dataset as hf_load_dataset
+    return hf_load_dataset(*args, **kwargs)
+
 def clean_text(text: str) -> str:
     text = re.sub(r"[^a-zA-Z0-9\s\.,;:!?'\-]", "", text)
     text = re.sub(r"\s+", " ", text)
@@ -1,22 +1,14 @@
-import os
 import json
-import requests
 from flask import current_app
-from transformers import pipeline
-import speech_recognition as sr
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.text import tokenizer_from_json
-from tensorflow.keras.preprocessing.sequence import pad_sequences
-import plaidml.keras
-# plaidml.keras.install_backend()
+from app.models import audio_stream
+from app.config import Config
+from app.services import enrichment, metrics
+from app.services.model_handles import MODEL_HANDLES
 
 
-# Load pre-trained pipelines for speech-to-text conversion (ASR).
-# Here we use Hugging Face's Wav2Vec2 model.
-asr_pipeline = pipeline("automatic-speech-recognition", model="facebook/wav2vec2-base-960h")
-
-# Load the custom-trained text summarization model.
-summarization_model = load_model("app/models/saved_model/summarization_model.h5")
+# The ASR pipeline (Hugging Face's Wav2Vec2) and the summarization model are
+# loaded on first use through app.services.model_handles, so importing this
+# module is cheap and the summarizer is the same one the Flask app serves.
 
 def load_tokenizer(tokenizer_path: str):
     """
@@ -28,26 +20,45 @@ def load_tokenizer(tokenizer_path: str):
     Returns:
         A Keras Tokenizer instance.
     """
+    from tensorflow.keras.preprocessing.text import tokenizer_from_json
+
     with open(tokenizer_path, 'r', encoding='utf-8') as f:
         tokenizer_json = f.read()
     tokenizer = tokenizer_from_json(tokenizer_json)
     return tokenizer
 
-# Load the tokenizer (assumes it was saved during training).
-tokenizer = load_tokenizer("app/models/saved_model/tokenizer.json")
+def transcribe_stream(file_path: str, **kwargs):
+    """
+    Transcribe an audio file in overlapping chunks, yielding partial results
+    as they are ready (see app.models.audio_stream.transcribe_stream).
+    Memory stays bounded however long the recording is.
+    
+    Args:
+        file_path (str): Path to the audio file.
+        **kwargs: chunk_seconds, overlap_seconds, batch_size, queue_size.
+        
+    Yields:
+        dict: {"index", "start", "end", "text"} for each chunk.
+    """
+    return audio_stream.transcribe_stream(file_path, MODEL_HANDLES.get("asr"), **kwargs)
 
-def transcribe_audio(file_path: str) -> str:
+def transcribe_audio(file_path: str, streaming: bool = True) -> str:
     """
     Convert an audio file to text using the Hugging Face ASR pipeline.
     
     Args:
         file_path (str): Path to the audio file.
+        streaming (bool): Transcribe in chunks (bounded memory). If False the
+            whole file is passed to the pipeline in one call.
         
     Returns:
         str: The transcribed text.
     """
     try:
-        result = asr_pipeline(file_path)
+        if streaming:
+            parts = (part["text"] for part in transcribe_stream(file_path))
+            return " ".join(text for text in parts if text)
+        result = MODEL_HANDLES.get("asr")(file_path)
         return result.get("text", "")
     except Exception as e:
         current_app.logger.error("Error in ASR: %s", e)
@@ -64,46 +75,74 @@ def save_transcript(transcript: str, output_path: str) -> None:
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(transcript)
 
-def generate_summary(text: str, max_length: int = 20) -> str:
+def generate_summary(text: str, max_length: int = None) -> str:
     """
     Generate a summary for the provided text using the custom-trained summarization model.
     
     Args:
         text (str): The text to summarize.
-        max_length (int): Maximum sequence length used during training.
+        max_length (int): Maximum input sequence length used during training
+            (defaults to Config.MAX_LENGTH_INPUT, matching the shared model).
         
     Returns:
         str: The generated summary as a string.
     """
-    # Convert input text to a sequence.
-    sequence = tokenizer.texts_to_sequences([text])
-    padded_seq = pad_sequences(sequence, maxlen=max_length, padding='post')
+    return generate_summaries([text], max_length)[0]
+
+def generate_summaries(texts: list, max_length: int = None, batch_size: int = 32) -> list:
+    """
+    Summarize several texts with one model call per batch_size texts.
+    
+    Args:
+        texts (list): The texts to summarize.
+        max_length (int): Maximum input sequence length (see generate_summary).
+        batch_size (int): Texts per forward pass.
+        
+    Returns:
+        list: One summary string per text.
+    """
+    from tensorflow.keras.preprocessing.sequence import pad_sequences
+
+    summarizer = MODEL_HANDLES.get("summarizer")
+    tokenizer = summarizer["tok_input"]
+    max_length = max_length or Config.MAX_LENGTH_INPUT
+
+    # Convert input texts to sequences.
+    with metrics.timed("summarize_batch", "tokenize"):
+        sequences = tokenizer.texts_to_sequences(texts)
+    with metrics.timed("summarize_batch", "pad"):
+        padded_seq = pad_sequences(sequences, maxlen=max_length, padding='post')
     
     # Predict output using the summarization model.
-    predictions = summarization_model.predict(padded_seq)
+    metrics.BATCH_SIZE.labels("summarize").observe(len(texts))
+    with metrics.timed("summarize_batch", "predict"):
+        predictions = summarizer["model"].predict(padded_seq, batch_size=batch_size, verbose=0)
     # For each time step, choose the index with highest probability.
-    predicted_indices = predictions.argmax(axis=-1)[0]
+    predicted_indices = predictions.argmax(axis=-1)
     
     # Convert indices back to words.
-    summary_words = []
-    for idx in predicted_indices:
-        if idx == 0:  # Skip padding index.
-            continue
-        word = tokenizer.index_word.get(idx, '')
-        if word:
-            summary_words.append(word)
-    
-    summary = " ".join(summary_words)
-    return summary
+    summaries = []
+    for row in predicted_indices:
+        summary_words = []
+        for idx in row:
+            if idx == 0:  # Skip padding index.
+                continue
+            word = summarizer["tok_target"].index_word.get(idx, '')
+            if word:
+                summary_words.append(word)
+        summaries.append(" ".join(summary_words))
+    return summaries
 
 def verify_subject_and_extract_keywords(transcript: str) -> str:
     """
-    Verify the subject matter of the transcript using the Bing Web Search API,
-    and extract keywords to append to the transcript. These keywords help ensure
-    the transcript is contextually accurate.
+    Verify the subject matter of the transcript and extract keywords to append
+    to the transcript. These keywords help ensure the transcript is contextually
+    accurate. Keywords come from a local TF-IDF extractor, replaced by keywords
+    from the Bing Web Search API when it answers within ENRICH_BUDGET seconds
+    (see app.services.enrichment).
     
     Environment Variables:
-        - BING_API_KEY: Your Bing Web Search API key.
+        - BING_API_KEY: (Optional) Your Bing Web Search API key; without it only local keywords are used.
         - BING_ENDPOINT: (Optional) The Bing search endpoint (default: "https://api.bing.microsoft.com/v7.0/search")
     
     Args:
@@ -112,33 +151,8 @@ def verify_subject_and_extract_keywords(transcript: str) -> str:
     Returns:
         str: The transcript with appended verified keywords.
     """
-    api_key = os.environ.get("BING_API_KEY")
-    endpoint = os.environ.get("BING_ENDPOINT", "https://api.bing.microsoft.com/v7.0/search")
-    
-    if not api_key:
-        raise ValueError("BING_API_KEY is not set in environment variables.")
-    
-    headers = {"Ocp-Apim-Subscription-Key": api_key}
-    params = {
-        "q": transcript,
-        "textDecorations": True,
-        "textFormat": "HTML",
-        "count": 5
-    }
-    
     try:
-        response = requests.get(endpoint, headers=headers, params=params)
-        response.raise_for_status()
-        search_results = response.json()
-        
-        keywords = []
-        web_pages = search_results.get("webPages", {}).get("value", [])
-        for item in web_pages:
-            title = item.get("name", "")
-            for word in title.split():
-                if len(word) > 3 and word.lower() not in keywords:
-                    keywords.append(word.lower())
-        
+        keywords = enrichment.enrich(transcript)["keywords"]
         enhanced_transcript = (
             transcript +
             "\n\n[Verified Keywords: " +
@@ -170,7 +184,7 @@ def process_audio_file(file_path: str, transcript_output_path: str) -> dict:
     save_transcript(transcript, transcript_output_path)
     
     # Generate a summary using the custom-trained model.
-    summary = generate_summary(transcript, max_length=20)
+    summary = generate_summary(transcript)
     
     # Verify subject matter and extract keywords.
     enhanced_transcript = verify_subject_and_extract_keywords(transcript)
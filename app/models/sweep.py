@@ -0,0 +1,377 @@
+"""
+Hyperparameter sweeps for the summarization model: many short training runs
+in parallel processes, scored by validation ROUGE-1 per millisecond of greedy
+decoding, so a smaller model that summarizes almost as well can beat a bigger one.
+
+    python -m app.models.sweep run app/models/data/text/training_data.json [--trials 16] [--parallel 2] [--epochs 5]
+    python -m app.models.sweep show app/models/saved_model/sweeps/results.jsonl [--top 10]
+
+The data is tokenized once and cached as an .npz keyed by a fingerprint of the
+file (SWEEP_DIR/dataset-<fingerprint>.npz); every trial process loads that.
+Each trial gets cpu_count // parallel threads. Trial 0 is train_model's
+hand-tuned defaults (BASELINE), the rest are sampled from SEARCH_SPACE.
+
+After each epoch a trial reports its validation ROUGE-1 to the results store
+and is pruned if its best so far is below the median of the other trials'
+best at the same epoch.
+
+The results store is an append-only JSONL file, one object per line tagged by "type":
+    sweep   start of a sweep (its settings); `show` reads the last one
+    trial   a trial started: its id and parameters
+    epoch   a trial's validation metrics after an epoch
+    result  a trial's outcome: status (complete, pruned or failed), best ROUGE-1,
+            inference ms, objective and training seconds. Latency is measured
+            once all trials have finished, one model at a time, so failed
+            trials are recorded first and the rest at the end of the sweep
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import itertools
+import argparse
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback
+from tensorflow.keras.preprocessing.text import tokenizer_from_json
+
+from app import serialization
+from app.models import training_text_summarization as training
+
+SWEEP_DIR = os.environ.get("SWEEP_DIR", "app/models/saved_model/sweeps")
+
+SEARCH_SPACE = {
+    "emb_dim": [32, 50, 64, 96],
+    "units": [32, 48, 64, 96, 128],
+    "batch_size": [64, 128, 240],
+    "learning_rate": [5e-5, 2e-4, 1e-3, 3e-3],
+}
+# train_model's defaults
+BASELINE = {"emb_dim": 50, "units": 64, "batch_size": 240, "learning_rate": 5e-5}
+
+# Pruning starts after this many epochs, once at least PRUNE_MIN_TRIALS other trials have reached the epoch
+PRUNE_WARMUP_EPOCHS = 1
+PRUNE_MIN_TRIALS = 3
+
+
+# ---- tokenized dataset cache ----
+
+def fingerprint(data_path):
+    """Hash of the data file and the preprocessing settings that shape the arrays."""
+    h = hashlib.sha256()
+    with open(data_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    h.update(f"{training.max_length_input}/{training.max_length_target}/{training.MAX_VOCAB}".encode())
+    return h.hexdigest()[:16]
+
+def prepare_dataset(data_path, cache_dir=SWEEP_DIR):
+    """
+    Tokenize and pad the data the way train_model does (same 90/10 split and
+    tokenizers) and cache the arrays. Returns the .npz path; an existing one
+    for the same data is reused.
+    """
+    path = os.path.join(cache_dir, f"dataset-{fingerprint(data_path)}.npz")
+    if os.path.exists(path):
+        print(f"[Info] Using cached dataset {path}")
+        return path
+
+    inputs, targets = training.load_training_data(data_path)
+    split = int(0.9 * len(inputs))
+    tok_in = training.create_tokenizer(inputs, add_special_tokens=False)
+    tok_tgt = training.create_tokenizer(targets, add_special_tokens=True)
+    vs_in = min(len(tok_in.word_index) + 1, training.MAX_VOCAB + 1)
+    vs_tgt = min(len(tok_tgt.word_index) + 1, training.MAX_VOCAB + 1)
+    enc = training.preprocess_texts(inputs, tok_in, training.max_length_input, vs_in)
+    dec_in, dec_tgt = training.prepare_decoder_sequences(
+        training.preprocess_texts(targets, tok_tgt, training.max_length_target, vs_tgt))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f, split=split, vocab_in=vs_in, vocab_tgt=vs_tgt,
+            enc=enc, dec_in=dec_in, dec_tgt=dec_tgt,
+            tokenizer_input=tok_in.to_json(), tokenizer_target=tok_tgt.to_json(),
+            )
+    os.replace(tmp_path, path)
+    print(f"[✔] Cached {len(inputs)} tokenized examples to {path}")
+    return path
+
+def load_dataset(path):
+    """(train, val, vocab_in, vocab_tgt, tok_tgt); train and val are (enc, dec_in, dec_tgt)."""
+    with np.load(path) as data:
+        split = int(data["split"])
+        arrays = [data["enc"], data["dec_in"], data["dec_tgt"]]
+        tok_tgt = tokenizer_from_json(str(data["tokenizer_target"]))
+        return (tuple(a[:split] for a in arrays), tuple(a[split:] for a in arrays),
+                int(data["vocab_in"]), int(data["vocab_tgt"]), tok_tgt)
+
+
+# ---- results store ----
+
+class ResultStore:
+    """Append-only JSONL file shared by the sweep and its trial processes."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def append(self, record_type, **fields):
+        fields.update(type=record_type, time=round(time.time(), 3))
+        # One write() on an O_APPEND file: lines from concurrent trials don't interleave
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, serialization.dumps(fields) + b"\n")
+        finally:
+            os.close(fd)
+
+    def records(self, all_sweeps=False):
+        """Records of the last sweep in the file (or of every sweep)."""
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = serialization.loads(line)
+                except ValueError:
+                    continue  # a line still being written
+                if record.get("type") == "sweep" and not all_sweeps:
+                    records = []
+                records.append(record)
+        return records
+
+
+# ---- trials ----
+
+class MedianPruner(Callback):
+    """
+    Reports `monitor` to the store after every epoch and stops training when
+    this trial's best so far is below the median of the other trials' best at
+    the same epoch.
+    """
+
+    def __init__(self, store, trial, monitor="val_rouge1",
+                 warmup_epochs=PRUNE_WARMUP_EPOCHS, min_trials=PRUNE_MIN_TRIALS):
+        super().__init__()
+        self.store = store
+        self.trial = trial
+        self.monitor = monitor
+        self.warmup_epochs = warmup_epochs
+        self.min_trials = min_trials
+        self.best = float("-inf")
+        self.pruned = False
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        value = float(logs.get(self.monitor, 0.0))
+        self.best = max(self.best, value)
+        self.store.append("epoch", trial=self.trial, epoch=epoch + 1,
+                          logs={k: float(v) for k, v in logs.items()})
+        if epoch + 1 <= self.warmup_epochs:
+            return
+
+        # Best value up to this epoch of every other trial that has reached it
+        values = {}
+        for r in self.store.records():
+            if r["type"] == "epoch" and r["trial"] != self.trial and r["epoch"] <= epoch + 1:
+                trial_values = values.setdefault(r["trial"], {})
+                trial_values[r["epoch"]] = float(r["logs"].get(self.monitor, 0.0))
+        peers = [max(v.values()) for v in values.values() if epoch + 1 in v]
+        if len(peers) >= self.min_trials and self.best < statistics.median(peers):
+            print(f"[Info] Trial {self.trial} pruned after epoch {epoch + 1}: "
+                  f"{self.monitor} {self.best:.4f} < median {statistics.median(peers):.4f}")
+            self.pruned = True
+            self.model.stop_training = True
+
+
+def inference_ms(model, enc, repeats=20):
+    """
+    Median milliseconds to greedy-decode one input, as RougeCallback does.
+    The cost depends on the architecture only, not on the trained weights.
+    """
+    forward = tf.function(lambda e, d: model([e, d], training=False))
+    enc = tf.constant(enc[:1])
+
+    def decode():
+        dec = np.zeros((1, training.max_length_target), dtype=np.int32)
+        for t in range(training.max_length_target - 1):
+            logits = forward(enc, tf.constant(dec))
+            dec[0, t + 1] = int(tf.argmax(logits[0, t]))
+
+    decode()  # trace
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        decode()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def run_trial(trial, params, dataset_path, store_path, epochs, threads,
+              steps_per_epoch=None, n_rouge=100, seed=42):
+    """Train one configuration in this process; returns its status, best ROUGE-1, epochs and seconds."""
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    store = ResultStore(store_path)
+    store.append("trial", trial=trial, params=params)
+    start = time.perf_counter()
+
+    (enc, dec_in, dec_tgt), (val_enc, val_dec_in, val_dec_tgt), vs_in, vs_tgt, tok_tgt = load_dataset(dataset_path)
+    tf.keras.utils.set_random_seed(seed)
+    model = training.build_seq2seq_model(vs_in, vs_tgt, params["emb_dim"], None, None, units=params["units"])
+    model.compile(
+        optimizer=training.make_optimizer(params["learning_rate"]),
+        loss="sparse_categorical_crossentropy",
+        weighted_metrics=[tf.keras.metrics.SparseCategoricalAccuracy(name="token_accuracy")],
+        )
+    train_ds, steps = training.make_train_dataset(enc, dec_in, dec_tgt, params["batch_size"], seed=seed)
+    val_ds = training.make_val_dataset(val_enc, val_dec_in, val_dec_tgt, params["batch_size"])
+    # Every trial is scored on the same samples
+    rouge_ds = (
+        tf.data.Dataset
+        .from_tensor_slices(((val_enc, val_dec_in), val_dec_tgt))
+        .take(n_rouge)
+        .batch(n_rouge)
+    )
+    pruner = MedianPruner(store, trial)
+    history = model.fit(
+        train_ds,
+        epochs=epochs,
+        steps_per_epoch=min(steps, steps_per_epoch or steps),
+        validation_data=val_ds,
+        callbacks=[
+            training.RougeCallback(rouge_ds, tok_tgt, training.max_length_target, n_rouge),
+            pruner,
+            ],
+        verbose=0,
+        )
+
+    return {
+        "trial": trial,
+        "params": params,
+        "status": "pruned" if pruner.pruned else "complete",
+        "epochs": len(history.history.get("loss", [])),
+        "rouge1": max(history.history.get("val_rouge1", [0.0])),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+# ---- sweep ----
+
+def sample_trials(n, space=SEARCH_SPACE, seed=42):
+    """BASELINE followed by n - 1 distinct configurations drawn at random from space."""
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    others = [params for params in grid if params != BASELINE]
+    return [dict(BASELINE)] + random.Random(seed).sample(others, min(n - 1, len(others)))
+
+def sweep(data_path, trials=16, parallel=2, epochs=5, steps_per_epoch=None,
+          space=SEARCH_SPACE, store_path=None, cache_dir=SWEEP_DIR, seed=42):
+    """
+    Run `trials` configurations, `parallel` at a time, and return their result
+    records, best objective first. Pruned and failed trials are included.
+    """
+    dataset_path = prepare_dataset(data_path, cache_dir)
+    store = ResultStore(store_path or os.path.join(cache_dir, "results.jsonl"))
+    threads = max(1, (os.cpu_count() or 1) // parallel)
+    configs = sample_trials(trials, space, seed)
+    store.append("sweep", data_path=data_path, dataset=dataset_path, trials=len(configs), parallel=parallel,
+                 threads=threads, epochs=epochs, steps_per_epoch=steps_per_epoch, space=space, seed=seed)
+    print(f"[Info] {len(configs)} trials, {parallel} at a time with {threads} threads each")
+
+    trained = []
+    # A fresh spawned process per trial: TensorFlow state isn't fork-safe, and
+    # its thread pools are sized once per process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=parallel, mp_context=context, max_tasks_per_child=1) as pool:
+        futures = {
+            pool.submit(run_trial, trial, params, dataset_path, store.path, epochs, threads,
+                        steps_per_epoch=steps_per_epoch, seed=seed): (trial, params)
+            for trial, params in enumerate(configs)
+        }
+        for future in as_completed(futures):
+            trial, params = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[Error] Trial {trial} failed: {e}")
+                result = {"trial": trial, "params": params, "status": "failed", "error": str(e)}
+                store.append("result", **result)
+            else:
+                print(f"[✔] Trial {trial} {result['status']} after {result['epochs']} epochs: "
+                      f"ROUGE-1 {result['rouge1']:.4f}, {params}")
+            trained.append(result)
+
+    # Timed here, one model at a time, rather than in the trials where the
+    # other trials' training would skew the numbers
+    _, (val_enc, _, _), vs_in, vs_tgt, _ = load_dataset(dataset_path)
+    latency = {}
+    results = []
+    for result in trained:
+        if result["status"] != "failed":
+            params = result["params"]
+            key = (params["emb_dim"], params["units"])
+            if key not in latency:
+                model = training.build_seq2seq_model(vs_in, vs_tgt, params["emb_dim"], None, None, units=params["units"])
+                latency[key] = inference_ms(model, val_enc)
+            result = dict(result, inference_ms=latency[key], objective=result["rouge1"] / latency[key])
+            store.append("result", **result)
+        results.append(result)
+    return ranked(results)
+
+def ranked(results):
+    """Completed trials by objective (best first), then pruned, then failed ones."""
+    order = {"complete": 0, "pruned": 1, "failed": 2}
+    return sorted(results, key=lambda r: (order[r["status"]], -r.get("objective", 0.0)))
+
+def show(store_path, top=10, all_sweeps=False):
+    results = ranked([r for r in ResultStore(store_path).records(all_sweeps) if r["type"] == "result"])
+    baseline = next((r for r in results if r["params"] == BASELINE and r["status"] != "failed"), None)
+    print(f"{'trial':>5}  {'status':<8} {'ROUGE-1':>7} {'ms':>7} {'ROUGE-1/ms':>10}  params")
+    for r in results[:top]:
+        if r["status"] == "failed":
+            print(f"{r['trial']:>5}  {'failed':<8} {r.get('error', '')}")
+            continue
+        marker = "  (baseline)" if r is baseline else ""
+        print(f"{r['trial']:>5}  {r['status']:<8} {r['rouge1']:7.4f} {r['inference_ms']:7.1f} "
+              f"{r['objective']:10.5f}  {r['params']}{marker}")
+    best = results[0] if results and results[0]["status"] == "complete" else None
+    if best and baseline and best is not baseline and baseline["objective"] > 0:
+        print(f"[Info] Best trial {best['trial']}: {best['objective'] / baseline['objective']:.2f}x "
+              f"the baseline's ROUGE-1 per ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hyperparameter sweeps for the summarization model.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="run a sweep")
+    run_parser.add_argument("data_path")
+    run_parser.add_argument("--trials", type=int, default=16)
+    run_parser.add_argument("--parallel", type=int, default=2, help="trials running at once")
+    run_parser.add_argument("--epochs", type=int, default=5)
+    run_parser.add_argument("--steps-per-epoch", type=int, default=None, help="cap on batches per epoch")
+    run_parser.add_argument("--store", default=None, help=f"results file (default: {SWEEP_DIR}/results.jsonl)")
+    run_parser.add_argument("--seed", type=int, default=42)
+    show_parser = sub.add_parser("show", help="rank the trials of a sweep")
+    show_parser.add_argument("store")
+    show_parser.add_argument("--top", type=int, default=10)
+    show_parser.add_argument("--all-sweeps", action="store_true", help="rank every sweep in the file, not just the last")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = sweep(args.data_path, args.trials, args.parallel, args.epochs, args.steps_per_epoch,
+                        store_path=args.store, seed=args.seed)
+        show(args.store or os.path.join(SWEEP_DIR, "results.jsonl"), top=len(results))
+    elif args.command == "show":
+        show(args.store, args.top, args.all_sweeps)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Resumable training state for train_model, kept by a tf.train.CheckpointManager
+in app/models/saved_model/checkpoints. Each checkpoint holds:
+
+    model             weights
+    optimizer         slots and iterations (so the LR schedule carries on) and,
+                      under mixed precision, the dynamic loss scale
+    epoch             completed epochs, the resumed fit's initial_epoch
+    batch             training batches consumed; make_train_dataset(start_batch=...)
+                      continues the data stream from there
+    tokenizer_input,  tokenizer JSON, so a resumed run uses the vocabulary its
+    tokenizer_target  weights were trained with
+
+Checkpoints are written in the background every `every_n_batches` batches and
+at the end of each epoch. On SIGTERM (pod eviction, spot preemption) the
+running step finishes, a checkpoint is written and waited for, and training
+stops; the next run picks up from it. Under MultiWorkerMirroredStrategy the
+workers agree on the signal after every step, so all of them save and stop
+together, whichever one received it.
+"""
+import os
+import signal
+import threading
+
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback
+from tensorflow.keras.preprocessing.text import tokenizer_from_json
+
+from app.models import training_distribute
+
+CHECKPOINT_EVERY = int(os.environ.get("TRAIN_CHECKPOINT_EVERY", 200))
+CHECKPOINT_KEEP = int(os.environ.get("TRAIN_CHECKPOINT_KEEP", 3))
+
+
+def _state_variables(tok_in_json="", tok_tgt_json=""):
+    return {
+        "epoch": tf.Variable(0, dtype=tf.int64, trainable=False),
+        "batch": tf.Variable(0, dtype=tf.int64, trainable=False),
+        "tokenizer_input": tf.Variable(tok_in_json, dtype=tf.string, trainable=False),
+        "tokenizer_target": tf.Variable(tok_tgt_json, dtype=tf.string, trainable=False),
+    }
+
+def latest(directory):
+    """Path prefix of the newest checkpoint in directory, or None."""
+    return tf.train.latest_checkpoint(directory)
+
+def read_tokenizers(directory):
+    """(tok_in, tok_tgt) stored in the newest checkpoint, or None. Needed before the model can be built."""
+    path = latest(directory)
+    if path is None:
+        return None
+    state = _state_variables()
+    tf.train.Checkpoint(tokenizer_input=state["tokenizer_input"], tokenizer_target=state["tokenizer_target"]) \
+        .read(path).expect_partial()
+    return (tokenizer_from_json(state["tokenizer_input"].numpy().decode("utf-8")),
+            tokenizer_from_json(state["tokenizer_target"].numpy().decode("utf-8")))
+
+
+def _by_path(variables):
+    # Async checkpointing can't copy Keras 3 variable wrappers more than once;
+    # track the tf.Variables underneath them instead, keyed by their layer path
+    return tf.train.Checkpoint(**{v.path.replace("/", "."): v.value for v in variables})
+
+
+class TrainingCheckpoint:
+    """Model, optimizer, progress counters and tokenizers, saved and restored together."""
+
+    def __init__(self, directory, model, optimizer, tok_in, tok_tgt, max_to_keep=CHECKPOINT_KEEP, strategy=None):
+        self.directory = directory
+        state = _state_variables(tok_in.to_json(), tok_tgt.to_json())
+        self.epoch = state["epoch"]
+        self.batch = state["batch"]
+        # Slot variables must exist before restore() can fill them
+        with (strategy or tf.distribute.get_strategy()).scope():
+            optimizer.build(model.trainable_variables)
+        self.checkpoint = tf.train.Checkpoint(
+            model=_by_path(model.variables), optimizer=_by_path(optimizer.variables), **state)
+        self.manager = tf.train.CheckpointManager(self.checkpoint, directory, max_to_keep=max_to_keep)
+
+    def restore(self, directory=None):
+        """Load the newest checkpoint (from `directory`, by default our own). False if there is none."""
+        path = latest(directory) if directory else self.manager.latest_checkpoint
+        if path is None:
+            return False
+        self.checkpoint.restore(path).assert_existing_objects_matched()
+        print(f"[✔] Resumed from {path}: epoch {int(self.epoch.numpy())}, batch {int(self.batch.numpy())}")
+        return True
+
+    def save(self, wait=False):
+        """
+        Write a checkpoint numbered by the batch count. Variables are copied
+        before this returns; the file writes happen in the background unless
+        wait=True.
+        """
+        options = tf.train.CheckpointOptions(experimental_enable_async_checkpoint=not wait)
+        if wait:
+            self.sync()
+        return self.manager.save(checkpoint_number=int(self.batch.numpy()), options=options)
+
+    def sync(self):
+        """Wait for background writes to finish."""
+        self.checkpoint.sync()
+
+
+class CheckpointCallback(Callback):
+    """
+    Saves `ckpt` every `every_n_batches` batches and at each epoch end, and
+    stops training cleanly on SIGTERM. `batches_per_step` is the number of
+    batches one callback step consumes (accum_steps * steps_per_execution in
+    the custom loop, 1 under model.fit). Pass the training `strategy` when it
+    spans several workers.
+    """
+
+    def __init__(self, ckpt, every_n_batches=CHECKPOINT_EVERY, batches_per_step=1, strategy=None):
+        super().__init__()
+        self.ckpt = ckpt
+        self.every_n_batches = max(1, int(every_n_batches))
+        self.batches_per_step = batches_per_step
+        self.strategy = strategy
+        self.preempted = threading.Event()
+        self.interrupted = False
+        self._previous_handler = None
+
+    def _on_sigterm(self, signum, frame):
+        print("[Info] SIGTERM received; checkpointing after the current step")
+        self.preempted.set()
+
+    def _any_preempted(self):
+        """
+        Whether this or any other worker got SIGTERM. Every worker asks at the
+        same steps: a worker that stopped alone would leave the others blocked
+        in their next all-reduce.
+        """
+        local = self.preempted.is_set()
+        if self.strategy is None or training_distribute.num_workers(self.strategy) == 1:
+            return local
+        total, = training_distribute.sum_over_replicas(self.strategy, [1.0 if local else 0.0])
+        if total and not local:
+            print("[Info] Another worker received SIGTERM; checkpointing after the current step")
+            self.preempted.set()
+        return total > 0
+
+    def on_train_begin(self, logs=None):
+        # Signal handlers can only be installed from the main thread
+        if threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGTERM, self._on_sigterm)
+
+    def on_train_batch_end(self, batch, logs=None):
+        before = int(self.ckpt.batch.numpy())
+        after = before + self.batches_per_step
+        self.ckpt.batch.assign(after)
+        if self._any_preempted():
+            if not self.interrupted:
+                self.interrupted = True
+                self._save_and_stop()
+        elif after // self.every_n_batches > before // self.every_n_batches:
+            self.ckpt.save()
+
+    def on_epoch_end(self, epoch, logs=None):
+        # An interrupted epoch isn't counted; its batches are, so the data stream still resumes exactly
+        if self.interrupted:
+            return
+        self.ckpt.epoch.assign(epoch + 1)
+        if self._any_preempted():
+            # SIGTERM arrived after the epoch's last batch
+            self.interrupted = True
+            self._save_and_stop()
+        else:
+            self.ckpt.save()
+
+    def _save_and_stop(self):
+        path = self.ckpt.save(wait=True)
+        print(f"[✔] Saved checkpoint {path}; stopping")
+        self.model.stop_training = True
+
+    def on_train_end(self, logs=None):
+        self.ckpt.sync()
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGTERM, self._previous_handler)
+            self._previous_handler = None
@@ -0,0 +1,97 @@
+"""
+Distribution strategy for train_model, picked by TRAIN_STRATEGY:
+
+    auto          multi_worker when TF_CONFIG lists more than one worker,
+                  mirrored with several local GPUs, else default
+    default       a single device
+    mirrored      every local GPU (MirroredStrategy)
+    multi_worker  MultiWorkerMirroredStrategy over the hosts in TF_CONFIG, e.g.
+                  {"cluster": {"worker": ["host1:12345", "host2:12345"]},
+                   "task": {"type": "worker", "index": 0}}
+
+Under multi_worker each worker reads its own shard of the examples and
+gradients are all-reduced after every step. Worker 0 (or the "chief" task) is
+the chief: only it writes tokenizers, the saved model, telemetry and the
+checkpoints a run resumes from, so workers must share the save directory
+(e.g. a mounted volume) to resume.
+
+MultiWorkerMirroredStrategy must be created before any other TensorFlow op runs.
+"""
+import os
+import json
+import tempfile
+
+import tensorflow as tf
+
+TRAIN_STRATEGY = os.environ.get("TRAIN_STRATEGY", "auto")
+STRATEGIES = ("auto", "default", "mirrored", "multi_worker")
+
+
+def cluster_workers():
+    """Number of training tasks (chief + workers) in TF_CONFIG; 1 without one."""
+    cluster = json.loads(os.environ.get("TF_CONFIG") or "{}").get("cluster", {})
+    return max(1, len(cluster.get("chief", [])) + len(cluster.get("worker", [])))
+
+def make_strategy(kind=None):
+    """A tf.distribute strategy by name (see STRATEGIES). Strategy objects are returned unchanged."""
+    if isinstance(kind, tf.distribute.Strategy):
+        return kind
+    kind = kind or TRAIN_STRATEGY
+    if kind not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {kind!r}; expected one of {', '.join(STRATEGIES)}.")
+    if kind == "auto":
+        if cluster_workers() > 1:
+            kind = "multi_worker"
+        elif len(tf.config.list_physical_devices("GPU")) > 1:
+            kind = "mirrored"
+        else:
+            kind = "default"
+    if kind == "multi_worker":
+        # Picks ring all-reduce over gRPC on CPU hosts, NCCL between GPUs
+        return tf.distribute.MultiWorkerMirroredStrategy()
+    if kind == "mirrored":
+        return tf.distribute.MirroredStrategy()
+    return tf.distribute.get_strategy()
+
+def num_workers(strategy):
+    """Input pipelines feeding the strategy: one per worker."""
+    if isinstance(strategy, tf.distribute.MultiWorkerMirroredStrategy):
+        return cluster_workers()
+    return 1
+
+def worker_index(strategy):
+    """This worker's index among num_workers(strategy), which is also its data shard."""
+    if not isinstance(strategy, tf.distribute.MultiWorkerMirroredStrategy):
+        return 0
+    resolver = strategy.cluster_resolver
+    cluster = resolver.cluster_spec().as_dict()
+    # The chief, if any, comes first, then the workers in TF_CONFIG order
+    offset = len(cluster.get("chief", [])) if resolver.task_type == "worker" else 0
+    return offset + (resolver.task_id or 0)
+
+def is_chief(strategy):
+    return worker_index(strategy) == 0
+
+def write_dir(directory, strategy):
+    """
+    Where this worker saves checkpoints: `directory` on the chief, a throwaway
+    temp dir elsewhere. Every worker still runs the save so that no collective
+    op inside it is left waiting.
+    """
+    if is_chief(strategy):
+        return directory
+    return tempfile.mkdtemp(prefix=f"worker-{worker_index(strategy)}-")
+
+# Traced once per list length, not on every call (the checkpoint callback sums every step)
+_replica_value = tf.function(tf.identity)
+
+def sum_over_replicas(strategy, values):
+    """
+    Sum a list of floats over all replicas; each replica contributes the value
+    its worker passed in. Ratios of sums (total / count) are therefore the
+    cross-worker average.
+    """
+    if strategy.num_replicas_in_sync == 1:
+        return list(values)
+    per_replica = strategy.run(_replica_value, args=(tf.constant(values, tf.float32),))
+    return strategy.reduce(tf.distribute.ReduceOp.SUM, per_replica, axis=None).numpy().tolist()
@@ -0,0 +1,268 @@
+"""
+Training telemetry streamed to an append-only JSONL file by a background thread,
+so the training loop never waits on disk writes, nvidia-smi or matplotlib.
+
+One JSON object per line, tagged by "type":
+    run        start of a training run (its parameters)
+    step       every `step_every` batches: loss and mean step time
+    epoch      end of an epoch: Keras logs (loss, token accuracy, ROUGE, ...),
+               wall time, steps and examples/sec
+    resources  every `resource_interval` seconds: CPU %, RAM %, per-GPU util %
+
+Plots are rendered offline, from a finished or still running job:
+    python -m app.models.training_telemetry plot app/models/saved_model/telemetry.jsonl [--out DIR]
+"""
+import os
+import sys
+import time
+import queue
+import shutil
+import argparse
+import threading
+import subprocess
+
+import psutil
+import tensorflow as tf
+
+from app import serialization
+
+STEP_EVERY = 50
+RESOURCE_INTERVAL = 30.0
+# Records waiting to be written; when full (disk stalled) new records are dropped
+# rather than blocking training
+QUEUE_SIZE = 10_000
+
+
+class TelemetryWriter:
+    """Appends records to a JSONL file from a background thread. write() never blocks."""
+
+    def __init__(self, path):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._thread.start()
+
+    def write(self, record_type, **fields):
+        fields.update(type=record_type, time=round(time.time(), 3))
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        with open(self.path, "ab") as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                lines = [record]
+                # Write whatever else is already queued in the same syscall
+                while True:
+                    try:
+                        lines.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                done = lines[-1] is None
+                f.write(b"".join(serialization.dumps(r) + b"\n" for r in lines if r is not None))
+                f.flush()
+                if done:
+                    break
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def gpu_utilization():
+    """Per-GPU utilization % from nvidia-smi, or [] without NVIDIA GPUs."""
+    if not shutil.which("nvidia-smi"):
+        return []
+    try:
+        raw = subprocess.check_output(
+            ["nvidia-smi", "--query-gpu=utilization.gpu", "--format=csv,noheader,nounits"], timeout=10)
+        return [float(line) for line in raw.decode().splitlines() if line.strip()]
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return []
+
+
+class ResourceMonitor:
+    """Samples CPU, RAM and GPU use every `interval` seconds on its own thread."""
+
+    def __init__(self, writer, interval=RESOURCE_INTERVAL):
+        self.writer = writer
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="telemetry-resources", daemon=True)
+
+    def start(self):
+        psutil.cpu_percent(None)  # the first call only sets the reference point
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.writer.write(
+                "resources",
+                cpu=psutil.cpu_percent(None),
+                ram=psutil.virtual_memory().percent,
+                gpu=gpu_utilization(),
+            )
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _floats(logs):
+    out = {}
+    for key, value in (logs or {}).items():
+        try:
+            out[key] = float(value)
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+class TelemetryCallback(tf.keras.callbacks.Callback):
+    """
+    Streams step and epoch metrics to `path`. Put it after callbacks that add
+    to the epoch logs (e.g. RougeCallback) so their values are recorded too.
+    """
+
+    def __init__(self, path, batch_size, step_every=STEP_EVERY, resource_interval=RESOURCE_INTERVAL, params=None):
+        super().__init__()
+        self.path = path
+        self.batch_size = batch_size
+        self.step_every = step_every
+        self.resource_interval = resource_interval
+        self.run_params = params or {}
+        self.writer = None
+        self.monitor = None
+
+    def on_train_begin(self, logs=None):
+        self.writer = TelemetryWriter(self.path)
+        self.writer.write("run", params=self.run_params, batch_size=self.batch_size)
+        self.monitor = ResourceMonitor(self.writer, self.resource_interval)
+        self.monitor.start()
+        self.epoch = 0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.epoch_start = self.last_step_time = time.perf_counter()
+        self.steps = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.steps += 1
+        if self.steps % self.step_every == 0:
+            now = time.perf_counter()
+            self.writer.write(
+                "step",
+                epoch=self.epoch,
+                step=self.steps,
+                step_ms=round((now - self.last_step_time) * 1000 / self.step_every, 2),
+                **_floats({"loss": (logs or {}).get("loss")}),
+            )
+            self.last_step_time = now
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self.epoch_start
+        self.writer.write(
+            "epoch",
+            epoch=epoch,
+            seconds=round(seconds, 3),
+            steps=self.steps,
+            examples_per_sec=round(self.steps * self.batch_size / seconds, 1) if seconds else None,
+            logs=_floats(logs),
+        )
+
+    def on_train_end(self, logs=None):
+        self.monitor.stop()
+        self.writer.close()
+        if self.writer.dropped:
+            print(f"[Error] Telemetry dropped {self.writer.dropped} records")
+
+
+# ---- offline plots ----
+
+def load_records(path, all_runs=False):
+    """Records of the last run in the file (or of every run)."""
+    records = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = serialization.loads(line)
+            except ValueError:
+                continue  # a line still being written
+            if record.get("type") == "run" and not all_runs:
+                records = []
+            records.append(record)
+    return records
+
+def plot(path, out_dir=None, all_runs=False):
+    """Render loss, accuracy, ROUGE, throughput and resource plots as PNGs. Returns the files written."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    out_dir = out_dir or os.path.join(os.path.dirname(path) or ".", "plots")
+    os.makedirs(out_dir, exist_ok=True)
+    records = load_records(path, all_runs)
+    epochs = [r for r in records if r["type"] == "epoch"]
+    resources = [r for r in records if r["type"] == "resources"]
+    written = []
+
+    def figure(name, title, ylabel, series, x=None, xlabel="Epoch"):
+        series = {label: values for label, values in series.items() if any(v is not None for v in values)}
+        if not series:
+            return
+        plt.figure()
+        for label, values in series.items():
+            plt.plot(x or range(1, len(values) + 1), values, label=label)
+        plt.xlabel(xlabel); plt.ylabel(ylabel)
+        plt.title(title); plt.legend()
+        plt.tight_layout()
+        file_path = os.path.join(out_dir, f"{name}.png")
+        plt.savefig(file_path)
+        plt.close()
+        written.append(file_path)
+
+    def logs(key):
+        return [r["logs"].get(key) for r in epochs]
+
+    figure("loss", "Training vs. Validation Loss", "Loss", {"Train loss": logs("loss"), "Val loss": logs("val_loss")})
+    figure("token_accuracy", "Token Accuracy", "Token Accuracy",
+           {"Train token-acc": logs("token_accuracy"), "Val token-acc": logs("val_token_accuracy")})
+    figure("rouge", "ROUGE", "F1 Score",
+           {"ROUGE-1": logs("val_rouge1"), "ROUGE-2": logs("val_rouge2"), "ROUGE-L": logs("val_rougeL")})
+    figure("throughput", "Throughput", "Examples/sec", {"examples/sec": [r["examples_per_sec"] for r in epochs]})
+    if resources:
+        start = resources[0]["time"]
+        minutes = [(r["time"] - start) / 60 for r in resources]
+        figure("cpu_ram", "CPU & RAM", "Percent",
+               {"CPU %": [r["cpu"] for r in resources], "RAM %": [r["ram"] for r in resources]},
+               x=minutes, xlabel="Minutes")
+        n_gpus = max(len(r["gpu"]) for r in resources)
+        figure("gpu", "GPU Utilization", "GPU Util %",
+               {f"GPU{i} %": [r["gpu"][i] if i < len(r["gpu"]) else None for r in resources] for i in range(n_gpus)},
+               x=minutes, xlabel="Minutes")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Training telemetry tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    plot_parser = sub.add_parser("plot", help="render PNG plots from a telemetry file")
+    plot_parser.add_argument("path")
+    plot_parser.add_argument("--out", default=None, help="output directory (default: plots/ next to the file)")
+    plot_parser.add_argument("--all-runs", action="store_true", help="plot every run in the file, not just the last")
+    args = parser.parse_args(argv)
+
+    if args.command == "plot":
+        for file_path in plot(args.path, args.out, args.all_runs):
+            print(f"[✔] {file_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
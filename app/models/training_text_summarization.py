@@ -3,11 +3,6 @@ os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 
 import tensorflow as tf
 
-from tensorflow.keras.mixed_precision import Policy, set_global_policy
-set_global_policy(Policy("mixed_float16"))
-
-
-
 gpus = tf.config.list_physical_devices("GPU")
 if gpus:
     for gpu in gpus:
@@ -21,18 +16,26 @@ if gpus:
     # make sure TensorFlow only “sees” those real GPUs
     tf.config.set_visible_devices(gpus, "GPU")
 
-print("Physical GPUs:", gpus)
-print("Logical GPUs:", tf.config.list_logical_devices("GPU"))
+# float16 compute only pays off on GPUs; on CPU it is emulated and much slower than float32
+TRAIN_PRECISION = os.environ.get("TRAIN_PRECISION") or ("mixed_float16" if gpus else "float32")
 
+from tensorflow.keras.mixed_precision import Policy, set_global_policy
+set_global_policy(Policy(TRAIN_PRECISION))
 
-# 3) Safe to do other TF operations
-print("TensorFlow version:", tf.__version__)
-with tf.device('/GPU:0' if gpus else '/CPU:0'):
-    a = tf.random.normal([1000, 1000])
-    b = tf.random.normal([1000, 1000])
-    c = tf.matmul(a, b)
-print("Operation result shape:", c.shape)
-os.system("nvidia-smi")
+
+def print_device_info():
+    print("Physical GPUs:", gpus)
+    print("Logical GPUs:", tf.config.list_logical_devices("GPU"))
+
+    # 3) Safe to do other TF operations
+    print("TensorFlow version:", tf.__version__)
+    with tf.device('/GPU:0' if gpus else '/CPU:0'):
+        a = tf.random.normal([1000, 1000])
+        b = tf.random.normal([1000, 1000])
+        c = tf.matmul(a, b)
+    print("Operation result shape:", c.shape)
+    if gpus:
+        os.system("nvidia-smi")
 
 from tensorflow.keras.models import Model, load_model
 from tensorflow.keras.layers import Input, Embedding, Dense, Concatenate, Attention, LSTMCell
@@ -43,11 +46,13 @@ from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.utils import plot_model 
 from tensorflow.keras.optimizers.schedules import ExponentialDecay  
 from rouge_score import rouge_scorer
-import psutil
-import subprocess
+from app.models.training_telemetry import TelemetryCallback
+from app.models.training_loop import CustomTrainer
+from app.models import training_distribute
+from app.models.training_checkpoint import CHECKPOINT_EVERY, CheckpointCallback, TrainingCheckpoint, read_tokenizers
 import json
+import shutil
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 
@@ -83,6 +88,14 @@ def load_tokenizer(path: str):
     with open(path, 'r', encoding='utf-8') as f:
         return tf.keras.preprocessing.text.tokenizer_from_json(f.read())
 
+def save_tokenizer(tokenizer, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(tokenizer.to_json())
+        f.flush()                # push Python buffer to OS
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 def preprocess_texts(texts, tokenizer, max_length, max_vocab):
     sequences = tokenizer.texts_to_sequences(texts)
     arr = pad_sequences(sequences, maxlen=max_length, padding='post',truncating='post')
@@ -99,23 +112,153 @@ def prepare_decoder_sequences(sequences):
         dec_tgt = np.pad(dec_tgt, ((0, 0), (0, pad_width)), mode='constant')
     return dec_in, dec_tgt
 
-def build_seq2seq_model(vocab_in, vocab_tgt, emb_dim, max_in, max_tgt):
+# Encoder lengths at which length buckets end; a batch is padded only to its bucket's length.
+# Opt-in (bucket_boundaries=BUCKET_BOUNDARIES, with mask_zero=True): epochs are ~40% faster,
+# but on tests/experiments/bench_convergence.py the masked model needs more of them.
+BUCKET_BOUNDARIES = (10, 20, 30, 40)
+
+def target_weights(dec_tgt):
+    """1.0 for real target tokens, 0.0 for padding: the loss and token accuracy ignore padded positions."""
+    return (dec_tgt != 0).astype("float32")
+
+def length_buckets(enc, dec_in, boundaries, min_size):
+    """
+    Split examples by encoder length. Returns [(indices, enc_len, dec_len)] where
+    every example in a bucket fits in enc_len / dec_len tokens. Buckets smaller
+    than min_size are merged into the next longer one.
+    """
+    enc_lengths = np.count_nonzero(enc, axis=1)
+    dec_lengths = np.count_nonzero(dec_in, axis=1)
+    edges = [b for b in sorted(boundaries) if b < enc.shape[1]] + [enc.shape[1]]
+    buckets, pending = [], np.array([], dtype=np.int64)
+    lower = -1
+    for edge in edges:
+        idx = np.concatenate([pending, np.nonzero((enc_lengths > lower) & (enc_lengths <= edge))[0]])
+        lower = edge
+        if len(idx) < min_size and edge != edges[-1]:
+            pending = idx
+            continue
+        pending = np.array([], dtype=np.int64)
+        if len(idx):
+            buckets.append((idx, edge, max(1, int(dec_lengths[idx].max()))))
+    return buckets
+
+def make_train_dataset(enc, dec_in, dec_tgt, batch_size, bucket_boundaries=None, seed=42,
+                       start_batch=0):
+    """
+    Endless dataset of ((enc, dec_in), dec_tgt, weights) batches and the
+    number of batches per epoch. With bucket_boundaries, each batch holds
+    examples of similar length trimmed to that length, so the RNNs don't step
+    through columns of padding.
+
+    Epoch e is shuffled with seed + e, so the stream is the same on every run
+    and start_batch resumes it exactly where a checkpoint left off.
+    """
+    weights = target_weights(dec_tgt)
+    if not bucket_boundaries:
+        examples = tf.data.Dataset.from_tensor_slices(((enc, dec_in), dec_tgt, weights))
+        steps_per_epoch = len(enc) // batch_size
+
+        def epoch_batches(epoch):
+            return examples.shuffle(len(enc), seed=seed + epoch).batch(batch_size, drop_remainder=True)
+    else:
+        buckets = []
+        for idx, enc_len, dec_len in length_buckets(enc, dec_in, bucket_boundaries, batch_size):
+            buckets.append((len(idx), tf.data.Dataset.from_tensor_slices((
+                (enc[idx, :enc_len], dec_in[idx, :dec_len]), dec_tgt[idx, :dec_len], weights[idx, :dec_len]))))
+        total = sum(n for n, _ in buckets)
+        steps_per_epoch = sum(n // batch_size for n, _ in buckets)
+
+        def epoch_batches(epoch):
+            return tf.data.Dataset.sample_from_datasets(
+                [ds.shuffle(n, seed=seed + epoch).batch(batch_size, drop_remainder=True) for n, ds in buckets],
+                weights=[n / total for n, _ in buckets],
+                seed=seed + epoch,
+                stop_on_empty_dataset=False,
+            )
+
+    if steps_per_epoch == 0:
+        raise ValueError(f"Need at least batch_size ({batch_size}) training examples, got {len(enc)}.")
+    ds = (
+        tf.data.Dataset.counter(start_batch // steps_per_epoch)
+        .flat_map(epoch_batches)
+        .skip(start_batch % steps_per_epoch)
+    )
+    return ds.prefetch(tf.data.AUTOTUNE), steps_per_epoch
+
+def make_val_dataset(enc, dec_in, dec_tgt, batch_size):
+    return (
+        tf.data.Dataset
+        .from_tensor_slices(((enc, dec_in), dec_tgt, target_weights(dec_tgt)))
+        .batch(batch_size, drop_remainder=False)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+def batches_per_epoch(enc, dec_in, batch_size, bucket_boundaries=None):
+    """Batches make_train_dataset yields per epoch for these examples."""
+    if not bucket_boundaries:
+        return len(enc) // batch_size
+    return sum(len(idx) // batch_size for idx, _, _ in length_buckets(enc, dec_in, bucket_boundaries, batch_size))
+
+def make_distributed_datasets(strategy, train, val, batch_size, bucket_boundaries=None, seed=42,
+                              start_step=0):
+    """
+    Training and validation input for a strategy with several replicas.
+    batch_size is the global batch; each worker's input pipeline reads only its
+    own shard of the examples (every n-th) in per-replica batches.
+    Returns (train_ds, steps_per_epoch, val_ds, val_steps), with step counts
+    equal on every worker so their collectives stay in step.
+    """
+    workers = training_distribute.num_workers(strategy)
+    replicas = strategy.num_replicas_in_sync
+    if batch_size % replicas:
+        raise ValueError(f"batch_size {batch_size} must divide evenly over {replicas} replicas.")
+    per_replica = batch_size // replicas
+    # Replicas on one worker take turns pulling batches from its pipeline
+    pulls_per_step = replicas // workers
+    shards = [slice(i, None, workers) for i in range(workers)]
+    enc, dec_in, dec_tgt = train
+    steps_per_epoch = min(
+        batches_per_epoch(enc[s], dec_in[s], per_replica, bucket_boundaries) for s in shards) // pulls_per_step
+    val_steps = max(1, -(-min(len(val[0][s]) for s in shards) // (per_replica * pulls_per_step)))
+
+    def train_fn(ctx):
+        s = shards[ctx.input_pipeline_id]
+        ds, _ = make_train_dataset(enc[s], dec_in[s], dec_tgt[s], per_replica, bucket_boundaries=bucket_boundaries,
+                                   seed=seed, start_batch=start_step * pulls_per_step)
+        return ds
+
+    def val_fn(ctx):
+        s = shards[ctx.input_pipeline_id]
+        # Repeats so that a worker with a slightly smaller shard still has val_steps batches
+        return make_val_dataset(*(a[s] for a in val), per_replica).repeat()
+
+    return (strategy.distribute_datasets_from_function(train_fn), steps_per_epoch,
+            strategy.distribute_datasets_from_function(val_fn), val_steps)
+
+def build_seq2seq_model(vocab_in, vocab_tgt, emb_dim, max_in, max_tgt, mask_zero=False, units=64):
+    """
+    max_in / max_tgt may be None for variable-length (length-bucketed) batches.
+    With mask_zero, padding (token 0) is masked through the RNNs and attention;
+    length-bucketed batches need it, so the encoder sees no padding either way.
+    `units` is the width of every LSTM layer.
+    """
     enc_inputs = Input(shape=(max_in,), name="enc_inputs")
-    enc_emb = Embedding(vocab_in, emb_dim, name="enc_emb")(enc_inputs)
-    enc_cell1 = LSTMCell(64, name="enc_cell1")
+    enc_emb = Embedding(vocab_in, emb_dim, mask_zero=mask_zero, name="enc_emb")(enc_inputs)
+    enc_cell1 = LSTMCell(units, name="enc_cell1")
     enc_rnn1 = tf.keras.layers.RNN(enc_cell1, return_sequences=True, return_state=True, name="enc_rnn1")
     out1, h1, c1 = enc_rnn1(enc_emb)
-    enc_cell2 = LSTMCell(64, name="enc_cell2")
+    enc_cell2 = LSTMCell(units, name="enc_cell2")
     enc_rnn2 = tf.keras.layers.RNN(enc_cell2, return_sequences=True, return_state=True, name="enc_rnn2")
     enc_outs, h2, c2 = enc_rnn2(out1)
     enc_states = [h2, c2]
 
     dec_inputs = Input(shape=(max_tgt,), name="dec_inputs")
-    dec_emb = Embedding(vocab_tgt, emb_dim, name="dec_emb")(dec_inputs)
-    dec_cell1 = LSTMCell(64, name="dec_cell1")
+    dec_emb = Embedding(vocab_tgt, emb_dim, mask_zero=mask_zero, name="dec_emb")(dec_inputs)
+    dec_cell1 = LSTMCell(units, name="dec_cell1")
     dec_rnn1 = tf.keras.layers.RNN(dec_cell1, return_sequences=True, return_state=True, name="dec_rnn1")
     dec_out1, _, _ = dec_rnn1(dec_emb, initial_state=enc_states)
-    dec_cell2 = LSTMCell(64, name="dec_cell2")
+    dec_cell2 = LSTMCell(units, name="dec_cell2")
     dec_rnn2 = tf.keras.layers.RNN(dec_cell2, return_sequences=True, return_state=True, name="dec_rnn2")
     dec_out2, _, _ = dec_rnn2(dec_out1)
 
@@ -127,140 +270,6 @@ def build_seq2seq_model(vocab_in, vocab_tgt, emb_dim, max_in, max_tgt):
    
     return model
     
-def plot_history(history, save_dir):
-    h = history.history
-    keys = h.keys()
-    epochs = range(1, len(h.get("loss", [])) + 1)
-
-    # 1) Loss
-    plt.figure()
-    plt.plot(epochs, h["loss"],     label="Train loss")
-    plt.plot(epochs, h["val_loss"], label="Val loss")
-    plt.xlabel("Epoch")
-    plt.ylabel("Loss")
-    plt.title("Training vs. Validation Loss")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_dir, "loss_full.png"))
-    plt.close()
-
-    # 2) Accuracy
-    acc_key     = "token_accuracy" if "token_accuracy" in keys else "sparse_categorical_accuracy"
-    val_acc_key = "val_" + acc_key
-
-    plt.figure()
-    plt.plot(epochs, h[acc_key],     label="Train acc")
-    plt.plot(epochs, h[val_acc_key], label="Val acc")
-    plt.xlabel("Epoch")
-    plt.ylabel("Accuracy")
-    plt.title("Training vs. Validation Accuracy")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_dir, "acc_full.png"))
-    plt.close()
-
-
-
-class SnapshotCallback(Callback):
-    def __init__(self, save_dir, interval_epochs=10):
-        super().__init__()
-        self.save_dir = save_dir
-        self.interval = interval_epochs
-        os.makedirs(self.save_dir, exist_ok=True)
-        self.cpu_usage = []
-        self.ram_usage = []
-        self.gpu_usage = {}
-
-    def _get_gpu_utils(self):
-        try:
-            raw = subprocess.check_output([
-                "nvidia-smi",
-                "--query-gpu=utilization.gpu",
-                "--format=csv,noheader,nounits"
-            ])
-            return [float(l) for l in raw.decode().splitlines() if l.strip()]
-        except Exception:
-            return []
-
-    def _plot_metrics(self, upto, suffix):
-        h = self.model.history.history
-        upto = min(upto, len(h["loss"]))
-        epochs = range(1, upto + 1)
-
-        # 1) Loss
-        plt.figure()
-        plt.plot(epochs, h["loss"][:upto],     label="Train loss")
-        plt.plot(epochs, h["val_loss"][:upto], label="Val loss")
-        plt.xlabel("Epoch"); plt.ylabel("Loss")
-        plt.title(f"Loss (1–{upto})"); plt.legend()
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.save_dir, f"loss_1to{upto}{suffix}.png"))
-        plt.close()
-
-        # 2) Token‐accuracy (your real metric)
-        plt.figure()
-        plt.plot(epochs, h["token_accuracy"][:upto],     label="Train token-acc")
-        plt.plot(epochs, h["val_token_accuracy"][:upto], label="Val token-acc")
-        plt.xlabel("Epoch"); plt.ylabel("Token Accuracy")
-        plt.title(f"Token Accuracy (1–{upto})"); plt.legend()
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.save_dir, f"token_acc_1to{upto}{suffix}.png"))
-        plt.close()
-
-        # 3) ROUGE
-        if "val_rouge1" in h:
-            plt.figure()
-            plt.plot(epochs, h["val_rouge1"][:upto], label="ROUGE-1")
-            plt.plot(epochs, h["val_rouge2"][:upto], label="ROUGE-2")
-            plt.plot(epochs, h["val_rougeL"][:upto], label="ROUGE-L")
-            plt.xlabel("Epoch"); plt.ylabel("F1 Score")
-            plt.title(f"ROUGE (1–{upto})"); plt.legend()
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.save_dir, f"rouge_1to{upto}{suffix}.png"))
-            plt.close()
-
-
-
-    def _plot_resources(self, upto, suffix):
-        epochs = range(1, upto + 1)
-
-        # CPU & RAM
-        plt.figure()
-        plt.plot(epochs, self.cpu_usage[:upto], label="CPU %")
-        plt.plot(epochs, self.ram_usage[:upto], label="RAM %")
-        plt.xlabel("Epoch"); plt.ylabel("Percent")
-        plt.title(f"CPU & RAM (1–{upto})"); plt.legend()
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.save_dir, f"cpu_ram_1to{upto}{suffix}.png"))
-        plt.close()
-
-        # Per-GPU
-        for i, util in self.gpu_usage.items():
-            plt.figure()
-            plt.plot(epochs, util[:upto], label=f"GPU{i} %")
-            plt.xlabel("Epoch"); plt.ylabel("GPU Util %")
-            plt.title(f"GPU {i} (1–{upto})"); plt.legend()
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.save_dir, f"gpu{i}_1to{upto}{suffix}.png"))
-            plt.close()
-
-    def on_epoch_end(self, epoch, logs=None):
-        # record resources
-        self.cpu_usage.append(psutil.cpu_percent())
-        self.ram_usage.append(psutil.virtual_memory().percent)
-        for idx, u in enumerate(self._get_gpu_utils()):
-            self.gpu_usage.setdefault(idx, []).append(u)
-
-        if (epoch + 1) % self.interval == 0:
-            suffix = f"_ep{epoch+1}"
-            self._plot_metrics(epoch+1, suffix)
-            self._plot_resources(epoch+1, suffix)
-
-    def on_train_end(self, logs=None):
-        total = len(self.model.history.history["loss"])
-        self._plot_metrics(total, "_final")
-        self._plot_resources(total, "_final")
-        
 class SamplePrediction(Callback):
     def __init__(self, val_ds, tokenizer, max_len, samples=1, save_path="sample_pred.png"):
         super().__init__()
@@ -302,6 +311,9 @@ class SamplePrediction(Callback):
             text = " ".join(words)
 
             
+            import matplotlib
+            matplotlib.use("Agg")
+            import matplotlib.pyplot as plt
             plt.figure(figsize=(8, 1.5))
             plt.text(0.5, 0.5, text, ha="center", va="center", wrap=True, fontsize=12)
             plt.axis("off")
@@ -313,8 +325,14 @@ class SamplePrediction(Callback):
             break
 
 class RougeCallback(Callback):
-    def __init__(self, val_ds, tgt_tokenizer, max_length_target, n_samples):
+    """
+    Greedy-decodes the first batch of val_ds and adds val_rouge1/2/L to the
+    logs. With a multi-replica `strategy`, each worker scores its own val_ds
+    and the scores are averaged over all of them.
+    """
+    def __init__(self, val_ds, tgt_tokenizer, max_length_target, n_samples, strategy=None):
         super().__init__()
+        self.strategy   = strategy
         self.val_ds     = val_ds
         self.tokenizer  = tgt_tokenizer
         self.start_id   = tgt_tokenizer.word_index.get('<start>', tgt_tokenizer.word_index[tgt_tokenizer.oov_token])
@@ -344,6 +362,10 @@ class RougeCallback(Callback):
    
         count = 0
         for ref_seq, pred_seq in zip(dec_tgt_batch.numpy(), result.numpy()):
+            # A masked model is never trained on what follows <end>; cut the prediction there
+            pred_seq = pred_seq.tolist()
+            if self.end_id in pred_seq:
+                pred_seq = pred_seq[:pred_seq.index(self.end_id)]
             ref_txt  = " ".join(
                 self.tokenizer.index_word[w]
                 for w in ref_seq 
@@ -359,6 +381,9 @@ class RougeCallback(Callback):
             total['rouge2'] += sc['rouge2'].fmeasure
             total['rougeL'] += sc['rougeL'].fmeasure
             count += 1
+        if self.strategy is not None:
+            *sums, count = training_distribute.sum_over_replicas(self.strategy, [*total.values(), count])
+            total = dict(zip(total, sums))
         avg = {k: (total[k] / count if count else 0.0) for k in total}
         logs.update({f'val_{k}': v for k, v in avg.items()})
     
@@ -404,51 +429,83 @@ class SaveOnAnyImprovement(tf.keras.callbacks.Callback):
         self.best_acc = max(self.best_acc, new_acc)
         self.best_rouges = [max(nr, br) for nr, br in zip(new_rouges, self.best_rouges)]
 
-class CustomEval(Callback):
-    def __init__(self, val_ds, strategy):
-        super().__init__()
-        self.val_ds = val_ds
-        self.strategy = strategy
-
-    @tf.function
-    def _eval_step(self, enc, dec_in, dec_tgt):
-        preds = self.model([enc, dec_in], training=False)
-        mask  = tf.cast(tf.not_equal(dec_tgt, 0), tf.float32)
-        acc   = tf.keras.metrics.sparse_categorical_accuracy(dec_tgt, preds)
-        return tf.reduce_sum(acc * mask), tf.reduce_sum(mask)
-
-    def on_epoch_end(self, epoch, logs=None):
-        total_correct = 0.0
-        total_count   = 0.0
-        for (enc, dec_in), dec_tgt in self.val_ds:
-            c, n = self._eval_step(enc, dec_in, dec_tgt)
-            total_correct += c
-            total_count   += n
-        token_acc = total_correct / total_count
-        logs = logs or {}
-        logs['val_token_accuracy'] = token_acc
-        print(f"Validation token accuracy: {token_acc:.4f}")
-
-
-def train_model(data_path, epochs=20, batch_size=240, emb_dim=50, train_from_scratch = False):
+def make_optimizer(learning_rate=5e-5):
+    lr_schedule = ExponentialDecay(
+        initial_learning_rate=learning_rate,
+        decay_steps=20_000,
+        decay_rate=0.98,
+        staircase=True
+        )
+    opt = Adam(learning_rate=lr_schedule)
+    if TRAIN_PRECISION == "mixed_float16":
+        opt = tf.keras.mixed_precision.LossScaleOptimizer(opt, dynamic=True)
+    return opt
+
+
+def train_model(data_path, epochs=20, batch_size=240, emb_dim=50, train_from_scratch = False,
+                loop="fit", accum_steps=1, steps_per_execution=1, jit_compile=True,
+                mask_zero=False, bucket_boundaries=None, checkpoint_every=CHECKPOINT_EVERY, strategy=None):
+    """
+    loop="custom" trains with CustomTrainer (app/models/training_loop.py): an
+    XLA-compiled step, gradients summed over `accum_steps` batches of
+    `batch_size` before each update, and `steps_per_execution` updates per
+    graph call. loop="fit" is plain model.fit.
+
+    mask_zero=True masks padding in the embeddings (see build_seq2seq_model);
+    with it, bucket_boundaries (e.g. BUCKET_BOUNDARIES) groups batches by
+    input length (see make_train_dataset). Both are off by default: on
+    tests/experiments/bench_convergence.py the unmasked model reaches the
+    target ROUGE in fewer seconds.
+
+    Training state is checkpointed every `checkpoint_every` batches (see
+    app/models/training_checkpoint.py) and a rerun resumes from the newest
+    checkpoint: same weights, optimizer state, tokenizers and position in the
+    data. train_from_scratch=True discards the checkpoints.
+
+    `strategy` is a tf.distribute strategy or its name (see
+    app/models/training_distribute.py; default TRAIN_STRATEGY). With several
+    workers, batch_size is the global batch and only the chief writes files.
+    """
+    # First: MultiWorkerMirroredStrategy has to exist before any other TF op runs
+    strategy = training_distribute.make_strategy(strategy)
+    chief = training_distribute.is_chief(strategy)
+    if loop == "fit" and isinstance(strategy, tf.distribute.MultiWorkerMirroredStrategy):
+        # Keras 3's fit all-reduces the first (integer) input batch across workers to
+        # build the model, which MultiWorkerMirroredStrategy rejects
+        print("[Info] model.fit can't run under MultiWorkerMirroredStrategy; using the custom loop")
+        loop = "custom"
+    if bucket_boundaries and not mask_zero:
+        raise ValueError("bucket_boundaries needs mask_zero=True: the encoder would otherwise see less "
+                         "padding in training than at inference.")
     inputs, targets = load_training_data(data_path)
     split = int(0.9 * len(inputs))
     save_dir     = "app/models/saved_model"
     tok_in_path  = f"{save_dir}/tokenizer_input.json"
     tok_tgt_path = f"{save_dir}/tokenizer_target.json"
     model_path   = f"{save_dir}/summarization_model.keras"
+    checkpoint_dir = f"{save_dir}/checkpoints"
     
     os.makedirs(save_dir, exist_ok=True)
+    if train_from_scratch and chief:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
     
     train_in, train_tgt = inputs[:split], targets[:split]
     val_in, val_tgt = inputs[split:], targets[split:]
     
-    if os.path.exists(tok_in_path) and os.path.exists(tok_tgt_path):
+    # A checkpoint's own tokenizers win: its weights were trained on their vocabulary
+    resume_tokenizers = None if train_from_scratch else read_tokenizers(checkpoint_dir)
+    if resume_tokenizers is not None:
+        tok_in, tok_tgt = resume_tokenizers
+    elif os.path.exists(tok_in_path) and os.path.exists(tok_tgt_path):
         tok_in = load_tokenizer(tok_in_path)
         tok_tgt = load_tokenizer(tok_tgt_path)
     else:
         tok_in = create_tokenizer(inputs, max_words=MAX_VOCAB, add_special_tokens=False)
         tok_tgt = create_tokenizer(targets, max_words=MAX_VOCAB, add_special_tokens=True)
+    # Written before training, so a model saved by any epoch has its tokenizers next to it
+    if chief:
+        save_tokenizer(tok_in, tok_in_path)
+        save_tokenizer(tok_tgt, tok_tgt_path)
 
     vs_in = min(len(tok_in.word_index) + 1, MAX_VOCAB + 1)
     vs_tgt = min(len(tok_tgt.word_index) + 1, MAX_VOCAB + 1)
@@ -462,32 +519,14 @@ def train_model(data_path, epochs=20, batch_size=240, emb_dim=50, train_from_scr
     val_dec_in, val_dec_tgt = prepare_decoder_sequences(val_dec)
 
 
-    num_train = len(train_enc)
-    steps_per_epoch = max(1, num_train // batch_size)
-    train_ds = (
-        tf.data.Dataset
-        .from_tensor_slices(((train_enc, train_dec_in), train_dec_tgt))
-        .shuffle(buffer_size=steps_per_epoch, seed=42)
-        .batch(batch_size, drop_remainder=True)
-        .repeat()
-        .prefetch(tf.data.AUTOTUNE)
-    )
-
-    val_ds = (
-        tf.data.Dataset
-          .from_tensor_slices(((val_enc, val_dec_in), val_dec_tgt))
-          .batch(batch_size, drop_remainder=False)
-          .prefetch(tf.data.AUTOTUNE)
-    )
-    val_steps = max(1, len(val_enc) // batch_size
-                   + (1 if len(val_enc) % batch_size else 0))
-    
     n_rouge = 100
+    # The same samples on every worker (fixed seed); each scores its own share of them
     rouge_ds = (
         tf.data.Dataset
         .from_tensor_slices(((val_enc, val_dec_in), val_dec_tgt))
-        .shuffle(len(val_enc))            
+        .shuffle(len(val_enc), seed=42, reshuffle_each_iteration=False)
         .take(n_rouge) 
+        .shard(training_distribute.num_workers(strategy), training_distribute.worker_index(strategy))
         .cache()
         .batch(n_rouge, drop_remainder=False) 
         .prefetch(tf.data.AUTOTUNE)
@@ -495,9 +534,11 @@ def train_model(data_path, epochs=20, batch_size=240, emb_dim=50, train_from_scr
     
     
     
-    strategy = tf.distribute.MirroredStrategy()
     with strategy.scope(): 
-        if (not train_from_scratch) and os.path.exists(model_path):
+        if resume_tokenizers is not None:
+            # Weights come from the checkpoint below
+            model = build_seq2seq_model(vs_in, vs_tgt, emb_dim, None, None, mask_zero=mask_zero)
+        elif (not train_from_scratch) and os.path.exists(model_path):
             print("Loading model from disk")
             model = tf.keras.models.load_model(
             model_path,
@@ -506,93 +547,171 @@ def train_model(data_path, epochs=20, batch_size=240, emb_dim=50, train_from_scr
                 'ExponentialDecay': ExponentialDecay,
             }
             )
+            if model.inputs[0].shape[1] is not None and bucket_boundaries:
+                # Saved with fixed-length inputs: every batch must be padded to max_length_input
+                print("[Info] Loaded model has fixed input lengths; length bucketing disabled")
+                bucket_boundaries = None
+            elif bucket_boundaries and not model.get_layer("enc_emb").mask_zero:
+                print("[Info] Loaded model doesn't mask padding; length bucketing disabled")
+                bucket_boundaries = None
         else:
+            # Variable-length inputs, so length-bucketed batches can be shorter than the maximum
             model = build_seq2seq_model(
             vs_in, vs_tgt, emb_dim,
-            max_length_input, max_length_target
-            )
-
-        lr_schedule = ExponentialDecay(
-            initial_learning_rate=5e-5,
-            decay_steps=20_000,
-            decay_rate=0.98,
-            staircase=True
+            None, None, mask_zero=mask_zero
             )
 
-        base_opt = Adam(learning_rate=lr_schedule)
-        opt = tf.keras.mixed_precision.LossScaleOptimizer(base_opt, dynamic=True)
+        opt = make_optimizer()
         model.compile(
             optimizer=opt,
+            # Weighted by target_weights(), so padding positions add nothing to either
             loss="sparse_categorical_crossentropy",
-            metrics=[
+            weighted_metrics=[
                 tf.keras.metrics.SparseCategoricalAccuracy(name="token_accuracy")
-                ]      
+                ]
             )
-        (enc_batch, dec_in_batch), dec_tgt_batch = next(iter(train_ds))
-        logits = model([enc_batch, dec_in_batch], training=False)
-        print("Output logits stats:",
-              tf.reduce_min(logits).numpy(),
-              tf.reduce_max(logits).numpy(),
-              "any NaN?", tf.reduce_any(tf.math.is_nan(logits)).numpy())
-        print(">>> Global policy:", tf.keras.mixed_precision.global_policy().name)
-        print(">>> Optimizer class:", type(model.optimizer).__name__)
-     
-        snap_cb = SnapshotCallback(
-            save_dir="app/models/saved_model/plots",
-            interval_epochs=10
-            )
-        rouge_cb = RougeCallback(
-            val_ds=rouge_ds,
-            tgt_tokenizer=tok_tgt,         
-            max_length_target=max_length_target,
-            n_samples=n_rouge
+    # Every worker saves (the save may run collectives) but only the chief's checkpoints are kept
+    ckpt_write_dir = training_distribute.write_dir(checkpoint_dir, strategy)
+    # Created outside the strategy scope: its counters and tokenizer strings are plain per-worker
+    # variables, not mirrored ones (string variables can't be broadcast between workers)
+    ckpt = TrainingCheckpoint(ckpt_write_dir, model, opt, tok_in, tok_tgt, strategy=strategy)
+    if resume_tokenizers is not None:
+        ckpt.restore(checkpoint_dir)
+
+    def make_datasets(start_batch):
+        """(train_ds, steps_per_epoch, val_ds, val_steps), the training stream starting at start_batch."""
+        if strategy.num_replicas_in_sync > 1:
+            return make_distributed_datasets(
+                strategy,
+                (train_enc, train_dec_in, train_dec_tgt),
+                (val_enc, val_dec_in, val_dec_tgt),
+                batch_size,
+                bucket_boundaries=bucket_boundaries,
+                start_step=start_batch,
+                )
+        train_ds, steps_per_epoch = make_train_dataset(
+            train_enc, train_dec_in, train_dec_tgt, batch_size,
+            bucket_boundaries=bucket_boundaries, start_batch=start_batch)
+        val_ds = make_val_dataset(val_enc, val_dec_in, val_dec_tgt, batch_size)
+        val_steps = max(1, len(val_enc) // batch_size
+                       + (1 if len(val_enc) % batch_size else 0))
+        return train_ds, steps_per_epoch, val_ds, val_steps
+
+    start_batch = int(ckpt.batch.numpy())
+    train_ds, steps_per_epoch, val_ds, val_steps = make_datasets(start_batch)
+    # A run stopped partway through an epoch resumes it with only its remaining batches,
+    # so every later epoch starts where the data stream's epoch does. (Stopped after an
+    # epoch's last batch but before it was counted: carry on with the next one.)
+    initial_epoch = max(int(ckpt.epoch.numpy()), start_batch // steps_per_epoch)
+    first_epoch_steps = steps_per_epoch - start_batch % steps_per_epoch
+
+    logits = model([val_enc[:8], val_dec_in[:8]], training=False)
+    print("Output logits stats:",
+          tf.reduce_min(logits).numpy(),
+          tf.reduce_max(logits).numpy(),
+          "any NaN?", tf.reduce_any(tf.math.is_nan(logits)).numpy())
+    print(">>> Global policy:", tf.keras.mixed_precision.global_policy().name)
+    print(">>> Optimizer class:", type(model.optimizer).__name__)
+ 
+    # Metrics go to an append-only file; render plots with
+    #   python -m app.models.training_telemetry plot app/models/saved_model/telemetry.jsonl
+    # One callback step is one execution of the custom loop
+    examples_per_step = batch_size * accum_steps * steps_per_execution if loop == "custom" else batch_size
+    telemetry_cb = TelemetryCallback(
+        path=f"{save_dir}/telemetry.jsonl",
+        batch_size=examples_per_step,
+        params={"epochs": epochs, "batch_size": batch_size, "emb_dim": emb_dim, "loop": loop,
+                "accum_steps": accum_steps, "steps_per_execution": steps_per_execution,
+                "jit_compile": jit_compile, "precision": TRAIN_PRECISION},
         )
+    rouge_cb = RougeCallback(
+        val_ds=rouge_ds,
+        tgt_tokenizer=tok_tgt,         
+        max_length_target=max_length_target,
+        n_samples=n_rouge,
+        strategy=strategy,
+    )
 
-        
+    
 
-        save_cb  = SaveOnAnyImprovement(model_path)
-        
+    save_cb  = SaveOnAnyImprovement(model_path)
+    checkpoint_cb = CheckpointCallback(
+        ckpt,
+        every_n_batches=checkpoint_every,
+        batches_per_step=accum_steps * steps_per_execution if loop == "custom" else 1,
+        strategy=strategy,
+        )
 
-        callbacks = [
-            rouge_cb,
-            EarlyStopping(
-                monitor='val_token_accuracy',   
-                mode='max',
-                patience=5,
-                restore_best_weights=True
-                ),
-                save_cb,
-                snap_cb,         
-        ]
-        history = model.fit(
+    callbacks = [
+        rouge_cb,
+        EarlyStopping(
+            monitor='val_token_accuracy',   
+            mode='max',
+            patience=5,
+            restore_best_weights=True
+            ),
+    ]
+    if chief:
+        callbacks += [save_cb, telemetry_cb]
+    callbacks.append(checkpoint_cb)
+    if loop == "custom":
+        trainer = CustomTrainer(
+            model, opt,
+            accum_steps=accum_steps,
+            steps_per_execution=steps_per_execution,
+            jit_compile=jit_compile,
+            strategy=strategy,
+            )
+        history = trainer.fit(
             train_ds,
             epochs=epochs,
-            verbose=2,
-            callbacks=callbacks,
             steps_per_epoch=steps_per_epoch,
             validation_data=val_ds,
-            validation_steps=val_steps
+            callbacks=callbacks,
+            initial_epoch=initial_epoch,
+            validation_steps=val_steps,
+            initial_epoch_steps=first_epoch_steps,
             )
+    else:
+        fit_args = dict(verbose=2, callbacks=callbacks, validation_data=val_ds, validation_steps=val_steps)
+        partial = None
+        if first_epoch_steps < steps_per_epoch and initial_epoch < epochs:
+            # model.fit gives every epoch steps_per_epoch batches: finish the interrupted one in its own fit
+            partial = model.fit(
+                train_ds,
+                epochs=initial_epoch + 1,
+                steps_per_epoch=first_epoch_steps,
+                initial_epoch=initial_epoch,
+                **fit_args,
+                )
+            initial_epoch += 1
+            # The next fit reads the dataset from its start again: begin it at the next epoch
+            train_ds = make_datasets(start_batch + first_epoch_steps)[0]
+        if partial is None or not checkpoint_cb.interrupted:
+            history = model.fit(
+                train_ds,
+                epochs=epochs,
+                steps_per_epoch=steps_per_epoch,
+                initial_epoch=initial_epoch,
+                **fit_args,
+                )
+            if partial is not None:
+                for key, values in history.history.items():
+                    partial.history.setdefault(key, []).extend(values)
+        if partial is not None:
+            history = partial
 
 
-
-    # after training: save tokenizers, plot history, return model
-    with open(tok_in_path, 'w', encoding='utf-8') as f:
-        f.write(tok_in.to_json())
-        f.flush()                # push Python buffer to OS
-        os.fsync(f.fileno()) 
-    with open(tok_tgt_path, 'w', encoding='utf-8') as f:
-        f.write(tok_tgt.to_json())
-        f.flush()                # push Python buffer to OS
-        os.fsync(f.fileno()) 
-
-    plot_history(history, os.path.dirname(model_path))
+    if ckpt_write_dir != checkpoint_dir:
+        shutil.rmtree(ckpt_write_dir, ignore_errors=True)
     return model
 
 if __name__ == "__main__":
     import sys
+    strategy = training_distribute.make_strategy()
+    print_device_info()
     data_path = sys.argv[1] if len(sys.argv) > 1 else "app/models/data/text/training_data.json"
-    model = train_model(data_path)
+    model = train_model(data_path, loop=os.environ.get("TRAIN_LOOP", "fit"), strategy=strategy)
     print("Training complete.")
     print("Model saved to:", "app/models/saved_model/summarization_model.keras")
     print("Input tokenizer saved to:", "app/models/saved_model/tokenizer_input.json") 
\ No newline at end of file
@@ -0,0 +1,158 @@
+# JSON encoding for storage and API responses.
+# Uses orjson when installed, stdlib json otherwise; both accept NumPy values.
+import os
+import json
+import tempfile
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def encode_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj, indent=False, sort_keys=False):
+        """Encode to UTF-8 bytes."""
+        option = _OPTIONS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=encode_default, option=option)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps(obj, indent=False, sort_keys=False):
+        """Encode to UTF-8 bytes."""
+        return json.dumps(
+            obj,
+            default=encode_default,
+            indent=2 if indent else None,
+            sort_keys=sort_keys,
+            separators=None if indent else (",", ":"),
+        ).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dump_file(path, obj, indent=False, atomic=False):
+    """
+    Write obj as JSON. With atomic=True the data goes to a temp file in the
+    same directory which is fsynced and renamed over path, so readers never
+    see a partial file. Returns the number of bytes written.
+    """
+    data = dumps(obj, indent=indent)
+    if not atomic:
+        with open(path, "wb") as f:
+            f.write(data)
+        return len(data)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(data)
+
+def load_file(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def validate_graph(graph):
+    """
+    Check the shape run_simulation relies on: nodes with id/type, edges whose
+    endpoints exist. Returns the graph unchanged so it can wrap a load.
+    """
+    if not isinstance(graph, dict):
+        raise SchemaError("Graph must be an object")
+    nodes = graph.get("nodes")
+    edges = graph.get("edges", [])
+    if not isinstance(nodes, list) or not isinstance(edges, list):
+        raise SchemaError("Graph needs a 'nodes' list and an 'edges' list")
+
+    ids = set()
+    for node in nodes:
+        if not isinstance(node, dict) or "id" not in node or not isinstance(node.get("type"), str):
+            raise SchemaError("Every node needs an 'id' and a string 'type'")
+        if not isinstance(node.get("params", {}), dict):
+            raise SchemaError(f"Node {node['id']} has non-object params")
+        ids.add(node["id"])
+    for edge in edges:
+        if not isinstance(edge, dict) or edge.get("from") not in ids or edge.get("to") not in ids:
+            raise SchemaError("Every edge needs 'from' and 'to' that name existing nodes")
+    return graph
+
+def validate_log(log):
+    """
+    Check a stored training log: a run_simulation result (a list of timestep
+    records) or a compiled run's {"mode": "compiled", "history": {...}}.
+    """
+    if isinstance(log, dict) and log.get("mode") == "compiled":
+        if not isinstance(log.get("history"), dict):
+            raise SchemaError("Compiled training log needs a 'history' object")
+        return log
+    if not isinstance(log, dict) or not isinstance(log.get("logs"), list):
+        raise SchemaError("Simulation log needs a 'logs' list")
+    for record in log["logs"]:
+        if not isinstance(record, dict) or "timestep" not in record or not isinstance(record.get("node_logs"), dict):
+            raise SchemaError("Each log record needs 'timestep' and 'node_logs'")
+    return log
+
+def load_graph(path):
+    return validate_graph(load_file(path))
+
+def load_log(path):
+    return validate_log(load_file(path))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumps/loads above."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or "cls" in kwargs:
+            kwargs.setdefault("default", self._default_with_numpy)
+            return super().dumps(obj, **kwargs)
+        # Let Flask's default() format dates the way it always has
+        option = _OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self._default_with_numpy, option=option).decode("utf-8")
+
+    def _default_with_numpy(self, obj):
+        if isinstance(obj, (np.generic, np.ndarray)):
+            return encode_default(obj)
+        return self.default(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
@@ -1,13 +1,11 @@
 # app/services/ai_registry.py
 
 import os
-import json
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, current_app
 
-STORAGE_PATH = "./models"
-NODE_LIBRARY_PATH = os.path.join(os.path.dirname(__file__), "node_library.json")
+from app.services import model_registry
 
-os.makedirs(STORAGE_PATH, exist_ok=True)
+NODE_LIBRARY_PATH = os.path.join(os.path.dirname(__file__), "node_library.json")
 
 ai_registry_bp = Blueprint("ai_registry", __name__)
 
@@ -15,30 +13,35 @@ ai_registry_bp = Blueprint("ai_registry", __name__)
 def get_node_library():
     if not os.path.exists(NODE_LIBRARY_PATH):
         return jsonify([]), 200
-    with open(NODE_LIBRARY_PATH, "r", encoding="utf-8") as f:
-        return jsonify(json.load(f))
+    # Already JSON on disk; send it as-is instead of decoding and re-encoding
+    with open(NODE_LIBRARY_PATH, "rb") as f:
+        return current_app.response_class(f.read(), mimetype="application/json")
 
-def save_ai_model(model_id, data):
-    path = os.path.join(STORAGE_PATH, f"{model_id}.json")
-    with open(path, "w") as f:
-        json.dump(data, f)
+def save_ai_model(model_id, data, owner=None):
+    model_registry.save_model(model_id, data, owner=owner)
 
 def load_ai_model(model_id):
-    path = os.path.join(STORAGE_PATH, f"{model_id}.json")
-    with open(path, "r") as f:
-        return json.load(f)
+    return model_registry.load_model(model_id)
 
-def list_user_models():
-    files = os.listdir(STORAGE_PATH)
-    return [f.replace(".json", "") for f in files if f.endswith(".json") and not f.endswith("_logs.json")]
+def list_user_models(owner=None, limit=model_registry.DEFAULT_PAGE_SIZE, cursor=None):
+    rows, _ = model_registry.list_models(owner=owner, limit=limit, cursor=cursor)
+    return [row.id for row in rows]
 
 def delete_ai_model(model_id):
-    path = os.path.join(STORAGE_PATH, f"{model_id}.json")
-    if os.path.exists(path):
-        os.remove(path)
-        return True
-    return False
+    return model_registry.delete_model(model_id)
+
 @ai_registry_bp.route("/models", methods=["GET"])
 def list_models():
-    models = list_user_models()
-    return jsonify(models), 200
\ No newline at end of file
+    try:
+        rows, next_cursor = model_registry.list_models(
+            owner=request.args.get("owner"),
+            graph_hash=request.args.get("graph_hash"),
+            limit=request.args.get("limit", model_registry.DEFAULT_PAGE_SIZE, type=int),
+            cursor=request.args.get("cursor"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify([row.id for row in rows])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
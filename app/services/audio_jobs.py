@@ -0,0 +1,146 @@
+import os
+import re
+import uuid
+import shutil
+import threading
+import traceback
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from app import serialization
+from app.services import enrichment, metrics
+
+# Uploaded audio and job status files: <AUDIO_JOB_DIR>/<job_id>/{audio,status.json,transcript.txt}
+AUDIO_JOB_DIR = os.environ.get("AUDIO_JOB_DIR", "./audio_jobs")
+# Background ASR jobs run at a time in this process, and jobs allowed to wait behind them.
+# Keep AUDIO_WORKERS small: each job saturates the CPU threads given to the ASR model.
+AUDIO_WORKERS = int(os.environ.get("AUDIO_WORKERS", 1))
+AUDIO_MAX_PENDING = int(os.environ.get("AUDIO_MAX_PENDING", 8))
+# CPU threads the ASR model may use; the rest stay free for text summarization requests
+ASR_THREADS = int(os.environ.get("ASR_THREADS", max(1, (os.cpu_count() or 2) // 2)))
+
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+os.makedirs(AUDIO_JOB_DIR, exist_ok=True)
+
+
+class QueueFull(Exception):
+    pass
+
+
+_lock = threading.Lock()
+_pending = 0
+_executor = None
+
+
+def _job_dir(job_id):
+    # Job ids come from URLs; never let one point outside AUDIO_JOB_DIR
+    return os.path.join(AUDIO_JOB_DIR, re.sub(r"[^A-Za-z0-9-]", "", job_id))
+
+def _status_path(job_id):
+    return os.path.join(_job_dir(job_id), "status.json")
+
+def _write_status(job_id, **fields):
+    # Status lives on disk so any worker process behind the load balancer can answer a poll
+    path = _status_path(job_id)
+    status = serialization.load_file(path) if os.path.exists(path) else {"job_id": job_id}
+    status.update(fields, updated_at=datetime.utcnow().isoformat())
+    serialization.dump_file(path, status, atomic=True)
+    return status
+
+def get_status(job_id):
+    """Job status dict, or None for an unknown job."""
+    path = _status_path(job_id)
+    if not job_id or not os.path.exists(path):
+        return None
+    return serialization.load_file(path)
+
+
+def save_upload(stream, filename=None):
+    """
+    Copy an upload to a new job directory block by block, so the audio is never
+    held in memory. Returns (job_id, audio_path).
+    """
+    job_id = str(uuid.uuid4())
+    os.makedirs(_job_dir(job_id))
+    ext = os.path.splitext(filename or "")[1].lower()
+    audio_path = os.path.join(_job_dir(job_id), "audio" + (ext if re.fullmatch(r"\.[a-z0-9]{1,5}", ext) else ""))
+    with open(audio_path, "wb") as f:
+        shutil.copyfileobj(stream, f, UPLOAD_BLOCK_SIZE)
+    return job_id, audio_path
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AUDIO_WORKERS, thread_name_prefix="audio-job")
+        return _executor
+
+def submit(app, job_id, audio_path, summarize):
+    """
+    Queue transcription + summarization of an uploaded file. `summarize(text)`
+    runs inside an app context. Raises QueueFull when AUDIO_MAX_PENDING jobs
+    are already waiting or running.
+    """
+    global _pending
+    with _lock:
+        if _pending >= AUDIO_MAX_PENDING:
+            raise QueueFull("Too many audio jobs in progress")
+        _pending += 1
+        metrics.QUEUE_DEPTH.labels("audio_jobs").set(_pending)
+    try:
+        _write_status(job_id, status="queued", created_at=datetime.utcnow().isoformat())
+        _get_executor().submit(_run_job, app, job_id, audio_path, summarize)
+    except Exception:
+        _release()
+        raise
+    return get_status(job_id)
+
+def _release():
+    global _pending
+    with _lock:
+        _pending -= 1
+        metrics.QUEUE_DEPTH.labels("audio_jobs").set(_pending)
+
+def pending_jobs():
+    return _pending
+
+
+def _limit_asr_threads():
+    # The wav2vec2 pipeline runs on torch; capping its threads leaves cores for the TF summarizer
+    try:
+        import torch
+        torch.set_num_threads(ASR_THREADS)
+    except ImportError:
+        pass
+
+def _run_job(app, job_id, audio_path, summarize):
+    try:
+        with app.app_context():
+            _write_status(job_id, status="running", started_at=datetime.utcnow().isoformat())
+            _limit_asr_threads()
+            from app.models import speech_to_text_and_enhance as speech
+
+            parts = []
+            for part in speech.transcribe_stream(audio_path):
+                if part["text"]:
+                    parts.append(part["text"])
+                _write_status(job_id, progress={"chunks": part["index"] + 1, "audio_seconds": part["end"]})
+            transcript = " ".join(parts)
+            speech.save_transcript(transcript, os.path.join(_job_dir(job_id), "transcript.txt"))
+
+            summary = summarize(transcript) if transcript else ""
+            keywords = enrichment.enrich(transcript)["keywords"] if transcript else []
+            _write_status(job_id, status="done", finished_at=datetime.utcnow().isoformat(),
+                          result={"transcription": transcript, "summary": summary, "keywords": keywords})
+    except Exception as e:
+        app.logger.error("Audio job %s failed: %s\n%s", job_id, e, traceback.format_exc())
+        _write_status(job_id, status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+    finally:
+        # The transcript is kept; the upload isn't needed any more
+        try:
+            os.remove(audio_path)
+        except OSError:
+            pass
+        _release()
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import tempfile
+
+from app import serialization
+
+# Shared content-addressed store for graphs and simulation results
+BLOB_DIR = os.environ.get("BLOB_STORE_PATH", "./blob_store")
+
+# Blobs younger than this are never collected, so a blob written just before
+# its manifest is committed can't be swept in between
+GC_GRACE_SECONDS = 3600
+
+os.makedirs(BLOB_DIR, exist_ok=True)
+
+
+def canonical_json(obj):
+    """
+    Serialization that content keys are computed over (same as generate_preset_id).
+    Kept on stdlib json so keys stay stable whichever fast backend is installed.
+    """
+    return json.dumps(obj, sort_keys=True, default=serialization.encode_default)
+
+def content_key(obj):
+    return hashlib.sha256(canonical_json(obj).encode("utf-8")).hexdigest()
+
+def _blob_path(key):
+    # Fan out by prefix so no single directory gets huge
+    return os.path.join(BLOB_DIR, key[:2], f"{key[2:]}.json.z")
+
+
+def put(obj):
+    """
+    Store obj once and return its key. Writing content that already exists
+    only refreshes its mtime.
+    """
+    raw = canonical_json(obj).encode("utf-8")
+    key = hashlib.sha256(raw).hexdigest()
+    path = _blob_path(key)
+    if os.path.exists(path):
+        os.utime(path)
+        return key
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(zlib.compress(raw, 6))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return key
+
+def get(key):
+    with open(_blob_path(key), "rb") as f:
+        return serialization.loads(zlib.decompress(f.read()))
+
+def exists(key):
+    return os.path.exists(_blob_path(key))
+
+def size(key):
+    """Compressed size on disk."""
+    return os.path.getsize(_blob_path(key))
+
+
+def iter_keys():
+    for prefix in os.listdir(BLOB_DIR):
+        subdir = os.path.join(BLOB_DIR, prefix)
+        if not os.path.isdir(subdir):
+            continue
+        for fname in os.listdir(subdir):
+            if fname.endswith(".json.z"):
+                yield prefix + fname[:-len(".json.z")]
+
+def collect_garbage(live_keys, grace_seconds=GC_GRACE_SECONDS):
+    """
+    Delete blobs that no manifest references. Returns the number removed.
+    """
+    live = set(live_keys)
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for key in list(iter_keys()):
+        if key in live:
+            continue
+        path = _blob_path(key)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,268 @@
+import os
+import csv
+import io
+import mmap
+import queue
+import threading
+
+import numpy as np
+
+from app import serialization
+
+# Local datasets for simulations: <name>.npy, <name>.csv or <name>.jsonl
+DATASET_DIR = os.environ.get("DATASET_DIR", "./datasets")
+# Rows read from disk per chunk, and chunks buffered ahead of the simulator
+CHUNK_ROWS = 4096
+PREFETCH_CHUNKS = 4
+
+FORMATS = (".npy", ".csv", ".jsonl")
+
+_registered = {}
+
+
+def register_dataset(name, path):
+    """Make a file outside DATASET_DIR available under `name`."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Unsupported dataset format: {ext}")
+    _registered[name] = path
+
+def resolve_path(name):
+    """Path for a dataset name, or None if there is no such dataset."""
+    if name in _registered:
+        return _registered[name]
+    base = os.path.basename(str(name))
+    for ext in FORMATS:
+        path = os.path.join(DATASET_DIR, base + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+def list_datasets():
+    names = set(_registered)
+    if os.path.isdir(DATASET_DIR):
+        for fname in os.listdir(DATASET_DIR):
+            stem, ext = os.path.splitext(fname)
+            if ext in FORMATS:
+                names.add(stem)
+    return sorted(names)
+
+def fingerprint(name):
+    """Changes whenever the dataset file changes; None for unknown datasets."""
+    path = resolve_path(name)
+    if path is None:
+        return None
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# Row counts by (path, size, mtime): a file is counted once per version, not on every run
+_row_counts = {}
+_row_counts_lock = threading.Lock()
+
+
+class _LineReader:
+    """Row-per-line text file read through mmap, so only touched pages are loaded."""
+
+    skip_header = False
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._body_start = 0
+        self.columns = []
+        self._rows = None
+        if self._mm is not None:
+            first_end = self._mm.find(b"\n")
+            first = self._mm[:first_end if first_end != -1 else len(self._mm)]
+            self._init_columns(first.decode("utf-8"))
+            if self.skip_header:
+                self._body_start = first_end + 1 if first_end != -1 else len(self._mm)
+
+    def __len__(self):
+        """Rows iter_chunks() yields, so blank lines don't count. Counted on first use."""
+        if self._rows is None:
+            st = os.fstat(self._file.fileno())
+            key = (os.path.abspath(self.path), st.st_size, st.st_mtime_ns)
+            with _row_counts_lock:
+                rows = _row_counts.get(key)
+            if rows is None:
+                rows = sum(1 for _ in self._iter_lines())
+                with _row_counts_lock:
+                    _row_counts[key] = rows
+            self._rows = rows
+        return self._rows
+
+    def _iter_lines(self):
+        pos = self._body_start
+        mm = self._mm
+        while mm is not None and pos < len(mm):
+            end = mm.find(b"\n", pos)
+            if end == -1:
+                end = len(mm)
+            line = mm[pos:end]
+            pos = end + 1
+            if line.strip():
+                yield line
+
+    def iter_chunks(self, chunk_rows=CHUNK_ROWS):
+        buf = []
+        for line in self._iter_lines():
+            buf.append(self._parse(line))
+            if len(buf) == chunk_rows:
+                yield np.array(buf, dtype="float64")
+                buf = []
+        if buf:
+            yield np.array(buf, dtype="float64")
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+
+class CsvReader(_LineReader):
+    skip_header = True
+
+    def _init_columns(self, header):
+        self.columns = next(csv.reader(io.StringIO(header)))
+
+    def _parse(self, line):
+        return [_to_float(v) for v in next(csv.reader(io.StringIO(line.decode("utf-8"))))]
+
+
+class JsonlReader(_LineReader):
+
+    def _init_columns(self, first_line):
+        first = serialization.loads(first_line)
+        self.columns = list(first) if isinstance(first, dict) else [str(i) for i in range(len(first))]
+
+    def _parse(self, line):
+        record = serialization.loads(line)
+        if isinstance(record, dict):
+            return [_to_float(record.get(c)) for c in self.columns]
+        return [_to_float(v) for v in record]
+
+
+class NpyReader:
+    def __init__(self, path):
+        self.path = path
+        self._arr = np.load(path, mmap_mode="r")
+        if self._arr.ndim == 1:
+            self._arr = self._arr.reshape(-1, 1)
+        self.columns = [str(i) for i in range(self._arr.shape[1])]
+
+    def __len__(self):
+        return self._arr.shape[0]
+
+    def iter_chunks(self, chunk_rows=CHUNK_ROWS):
+        for start in range(0, len(self), chunk_rows):
+            yield np.asarray(self._arr[start:start + chunk_rows], dtype="float64")
+
+    def close(self):
+        self._arr = None
+
+
+def open_dataset(name):
+    path = resolve_path(name)
+    if path is None:
+        raise FileNotFoundError(f"Dataset not found: {name}")
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return NpyReader(path)
+    if ext == ".csv":
+        return CsvReader(path)
+    return JsonlReader(path)
+
+def num_rows(name):
+    reader = open_dataset(name)
+    try:
+        return len(reader)
+    finally:
+        reader.close()
+
+
+_DONE = object()
+
+class DatasetFeed:
+    """
+    Yields one [batch_size, n_columns] array per timestep. Chunks are read by a
+    background thread into a bounded queue, so the simulator rarely waits on disk.
+    """
+
+    def __init__(self, name, batch_size=1, prefetch=PREFETCH_CHUNKS, chunk_rows=CHUNK_ROWS):
+        self.reader = open_dataset(name)
+        self.batch_size = max(1, int(batch_size))
+        self.columns = self.reader.columns
+        # Keep chunks a whole number of batches
+        self.chunk_rows = max(self.batch_size, chunk_rows - chunk_rows % self.batch_size)
+        self._queue = queue.Queue(maxsize=max(1, prefetch))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name="dataset-prefetch", daemon=True)
+        self._thread.start()
+
+    @property
+    def timesteps(self):
+        return len(self.reader) // self.batch_size
+
+    def column_index(self, column):
+        if column is None:
+            return 0
+        if isinstance(column, int):
+            if not 0 <= column < len(self.columns):
+                raise ValueError(f"Dataset has no column {column} (it has {len(self.columns)})")
+            return column
+        if str(column) not in self.columns:
+            raise ValueError(f"Dataset has no column {column!r} (columns: {', '.join(self.columns)})")
+        return self.columns.index(str(column))
+
+    def _produce(self):
+        try:
+            for chunk in self.reader.iter_chunks(self.chunk_rows):
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(chunk, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop.is_set():
+                    return
+        except Exception as e:
+            self._queue.put(e)
+        self._queue.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            for start in range(0, len(chunk) - self.batch_size + 1, self.batch_size):
+                yield chunk[start:start + self.batch_size]
+
+    def close(self):
+        self._stop.set()
+        # Unblock the producer if it's waiting on a full queue
+        while not self._queue.empty():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join(timeout=1.0)
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,211 @@
+import os
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app import serialization
+from app.config import Config
+from app.services import metrics
+
+# Keyword enrichment: keywords are always extracted locally, and optionally
+# replaced by keywords from a web search when it answers within the budget.
+ENRICH_TIMEOUT = float(os.environ.get("ENRICH_TIMEOUT", 2.0))    # per HTTP request
+ENRICH_BUDGET = float(os.environ.get("ENRICH_BUDGET", 0.3))      # how long a caller waits for the search
+ENRICH_CONCURRENCY = int(os.environ.get("ENRICH_CONCURRENCY", 4))
+# Searches queued or running at once; past this, callers skip the search and use local keywords
+ENRICH_MAX_PENDING = int(os.environ.get("ENRICH_MAX_PENDING", 2 * ENRICH_CONCURRENCY))
+ENRICH_CACHE_DIR = os.environ.get("ENRICH_CACHE_DIR", "./enrich_cache")
+ENRICH_CACHE_TTL = float(os.environ.get("ENRICH_CACHE_TTL", 7 * 24 * 3600))
+KEYWORD_EXTRACTOR = os.environ.get("KEYWORD_EXTRACTOR", "tfidf")
+# The search query is built from the top local keywords, not the whole transcript
+QUERY_TERMS = 8
+
+os.makedirs(ENRICH_CACHE_DIR, exist_ok=True)
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers herself him himself his how i if in into is it its itself just like me more most my myself
+no nor not now of off on once only or other our ours ourselves out over own really same she should so some
+such than that the their theirs them themselves then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your yours yourself
+yourselves going know okay right thing things think um uh yeah well get got one two say said see
+""".split())
+
+_WORD_RE = re.compile(r"[a-z][a-z'-]{2,}")
+
+
+def tokenize(text):
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+
+
+class TfidfExtractor:
+    """
+    Ranks words by TF-IDF, with document frequencies taken from the summarizer's
+    input tokenizer (Keras keeps word_docs/document_count from the training
+    corpus). Without the tokenizer it falls back to plain term frequency.
+    """
+
+    def __init__(self, tokenizer_path=Config.TOKENIZER_INPUT_PATH):
+        self.tokenizer_path = tokenizer_path
+        self._idf = None
+        self._default_idf = 1.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._idf is not None:
+                return
+            idf = {}
+            try:
+                config = serialization.load_file(self.tokenizer_path)["config"]
+                word_docs = serialization.loads(config["word_docs"])
+                n_docs = int(config.get("document_count") or max(word_docs.values(), default=1))
+                idf = {w: math.log((1 + n_docs) / (1 + df)) + 1 for w, df in word_docs.items()}
+                # Words never seen in training are treated as rare
+                self._default_idf = math.log(1 + n_docs) + 1
+            except (OSError, KeyError, ValueError) as e:
+                print(f"[Info] No corpus statistics for keyword extraction ({e}); using term frequency")
+            self._idf = idf
+
+    def __call__(self, text, top_k=10):
+        self._load()
+        counts = Counter(tokenize(text))
+        scored = sorted(
+            counts.items(),
+            key=lambda item: (-item[1] * self._idf.get(item[0], self._default_idf), item[0]),
+        )
+        return [w for w, _ in scored[:top_k]]
+
+
+_extractors = {"tfidf": TfidfExtractor()}
+
+
+def register_extractor(name, extractor):
+    """Add a local keyword extractor: a callable (text, top_k) -> [keywords]."""
+    _extractors[name] = extractor
+
+def extract_local(text, top_k=10, extractor=None):
+    return _extractors[extractor or KEYWORD_EXTRACTOR](text, top_k)
+
+
+def _cache_path(query):
+    return os.path.join(ENRICH_CACHE_DIR, hashlib.sha256(query.encode("utf-8")).hexdigest()[:32] + ".json")
+
+def cache_get(query):
+    path = _cache_path(query)
+    try:
+        if time.time() - os.path.getmtime(path) > ENRICH_CACHE_TTL:
+            keywords = None
+        else:
+            keywords = serialization.load_file(path)["keywords"]
+    except (OSError, ValueError, KeyError):
+        keywords = None
+    metrics.cache_lookup("enrichment", keywords is not None)
+    return keywords
+
+def cache_put(query, keywords):
+    serialization.dump_file(_cache_path(query), {"query": query, "keywords": keywords}, atomic=True)
+
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+_in_flight = {}  # query -> Future, so concurrent callers share one request
+_pending = threading.BoundedSemaphore(ENRICH_MAX_PENDING)
+
+
+def _get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=ENRICH_CONCURRENCY)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def search_keywords(query):
+    """
+    Keywords from the titles of the top Bing results for `query`. Blocking;
+    raises on HTTP errors and timeouts. Results are cached.
+    """
+    api_key = os.environ.get("BING_API_KEY")
+    endpoint = os.environ.get("BING_ENDPOINT", "https://api.bing.microsoft.com/v7.0/search")
+    if not api_key:
+        raise ValueError("BING_API_KEY is not set in environment variables.")
+
+    response = _get_session().get(
+        endpoint,
+        headers={"Ocp-Apim-Subscription-Key": api_key},
+        params={"q": query, "textDecorations": False, "textFormat": "Raw", "count": 5},
+        timeout=ENRICH_TIMEOUT,
+    )
+    response.raise_for_status()
+
+    keywords = []
+    for item in response.json().get("webPages", {}).get("value", []):
+        for word in item.get("name", "").split():
+            if len(word) > 3 and word.lower() not in keywords:
+                keywords.append(word.lower())
+    cache_put(query, keywords)
+    return keywords
+
+def search_async(query):
+    """
+    Start (or join) a background search. At most ENRICH_CONCURRENCY run at once;
+    returns None without searching when ENRICH_MAX_PENDING are already queued.
+    """
+    global _executor
+    with _lock:
+        future = _in_flight.get(query)
+        if future is not None:
+            return future
+        if not _pending.acquire(blocking=False):
+            return None
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ENRICH_CONCURRENCY, thread_name_prefix="enrich")
+        future = _executor.submit(search_keywords, query)
+        _in_flight[query] = future
+
+    def _done(_):
+        with _lock:
+            _in_flight.pop(query, None)
+        _pending.release()
+    future.add_done_callback(_done)
+    return future
+
+
+def enrich(text, budget=ENRICH_BUDGET, top_k=10):
+    """
+    Keywords for a transcript: {"keywords": [...], "source": "search"|"cache"|"local"}.
+    Never waits more than `budget` seconds on the network; a search that is still
+    running keeps going in the background and fills the cache for next time.
+    When too many searches are already pending, the local keywords are used.
+    """
+    local = extract_local(text, top_k)
+    if not os.environ.get("BING_API_KEY") or not local:
+        return {"keywords": local, "source": "local"}
+
+    query = " ".join(local[:QUERY_TERMS])
+    cached = cache_get(query)
+    if cached is not None:
+        return {"keywords": cached, "source": "cache"}
+
+    future = search_async(query)
+    if future is None:
+        return {"keywords": local, "source": "local"}
+    try:
+        return {"keywords": future.result(timeout=budget), "source": "search"}
+    except FutureTimeout:
+        return {"keywords": local, "source": "local"}
+    except Exception as e:
+        print(f"[Error] Keyword search failed: {e}")
+        return {"keywords": local, "source": "local"}
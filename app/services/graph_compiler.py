@@ -0,0 +1,235 @@
+import os
+import re
+import itertools
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import tensorflow as tf
+
+from app.services.graph_simulator import topological_sort
+from app.services.plugin_loader import PLUGIN_REGISTRY
+from app.services.preset_manager import generate_preset_id
+
+# Trained weights for compiled graphs, one file per graph hash
+COMPILED_DIR = os.environ.get("COMPILED_GRAPH_DIR", "./ai_models/compiled")
+# Number of compiled graphs kept in memory per process
+COMPILED_CACHE_SIZE = int(os.environ.get("COMPILED_CACHE_SIZE", 16))
+
+os.makedirs(COMPILED_DIR, exist_ok=True)
+
+_COMPILED = OrderedDict()
+_compiled_lock = threading.Lock()
+# One lock per graph hash: requests for the same graph build, train and save
+# its cached model one at a time; other graphs don't wait
+_key_locks = defaultdict(threading.Lock)
+
+
+def _safe_name(text):
+    return re.sub(r"[^A-Za-z0-9_]", "_", str(text))
+
+
+_call_ids = itertools.count()
+
+
+def _fallback_kernel(run, timesteps):
+    """
+    Wrap a plain-Python run() in tf.py_function. The node runs row by row on the
+    host and is not differentiable, but the rest of the graph still compiles.
+    Row states are kept per model call (keyed by its call id) and dropped after
+    the last timestep, so concurrent calls don't share them.
+    """
+    calls = {}
+
+    def kernel(inputs, state, params, weights, t=0, call_id=0):
+        ports = sorted(inputs)
+
+        def _call(call_value, t_value, *values):
+            key, t_value = int(call_value), int(t_value)
+            rows_state = calls.setdefault(key, [])
+            arrays = [np.atleast_1d(v.numpy()) for v in values]
+            n = max((len(a) for a in arrays), default=1)
+            while len(rows_state) < n:
+                rows_state.append({})
+            out = np.zeros(n, dtype="float32")
+            try:
+                for i in range(n):
+                    row_inputs = {p: {"value": float(a[i % len(a)])} for p, a in zip(ports, arrays)}
+                    outputs, rows_state[i] = run(row_inputs, rows_state[i], params)
+                    out[i] = float(outputs.get("value", 0.0))
+            except Exception:
+                calls.pop(key, None)
+                raise
+            if t_value >= timesteps - 1:
+                calls.pop(key, None)
+            return out
+
+        value = tf.py_function(
+            _call, [call_id, t] + [tf.cast(inputs[p], tf.float32) for p in ports], Tout=tf.float32)
+        # Keep the tape from trying to differentiate through host code
+        return {"value": tf.stop_gradient(value)}, state
+
+    return kernel
+
+
+class CompiledGraph(tf.keras.Model):
+    """
+    A node graph lowered to a Keras model.
+
+    Inputs are a dict of {input_node_id: [batch, timesteps]} tensors; each input
+    node receives its column one timestep at a time as inputs["feed"]. The output
+    is the "value" of every sink node stacked over time, [batch, timesteps] for a
+    single sink or a dict keyed by node id otherwise. Plugins provide tf_kernel()
+    and optionally tf_weights(); anything else falls back to tf.py_function.
+    """
+
+    def __init__(self, graph, timesteps, **kwargs):
+        super().__init__(**kwargs)
+        self.graph_nodes = {n["id"]: n for n in graph["nodes"]}
+        self.graph_edges = graph["edges"]
+        self.timesteps = int(timesteps)
+        self.order = topological_sort(self.graph_nodes, self.graph_edges)
+
+        # Build plain containers first; Keras wraps dicts assigned to the model
+        incoming = defaultdict(list)
+        has_outgoing = set()
+        for edge in graph["edges"]:
+            incoming[edge["to"]].append(edge)
+            has_outgoing.add(edge["from"])
+        self.incoming = {nid: incoming[nid] for nid in self.order}
+        self.sinks = [nid for nid in self.order if nid not in has_outgoing]
+
+        self.kernels = {}
+        self.fallback_nodes = []
+        self.node_weights = {}
+        for nid in self.order:
+            node = self.graph_nodes[nid]
+            mod = PLUGIN_REGISTRY.get_module(node["type"])
+            params = node.get("params", {})
+            if hasattr(mod, "tf_kernel"):
+                self.kernels[nid] = mod.tf_kernel
+            else:
+                self.kernels[nid] = _fallback_kernel(PLUGIN_REGISTRY.get_handler(node["type"]), self.timesteps)
+                self.fallback_nodes.append(nid)
+
+            weights = {}
+            if hasattr(mod, "tf_weights"):
+                for name, init in mod.tf_weights(params).items():
+                    weights[name] = self.add_weight(
+                        name=f"{_safe_name(nid)}_{name}",
+                        shape=np.shape(init),
+                        initializer=tf.keras.initializers.Constant(init),
+                        trainable=True,
+                    )
+            self.node_weights[nid] = weights
+
+    def call(self, feeds):
+        state = {nid: {} for nid in self.order}
+        outputs = {}
+        series = {nid: [] for nid in self.sinks}
+        batch = None
+        for feed in feeds.values():
+            batch = tf.shape(feed)[0]
+        if self.fallback_nodes:
+            # Evaluated on every call, also inside a traced graph
+            call_id = tf.py_function(lambda: next(_call_ids), [], Tout=tf.int64)
+
+        for t in range(self.timesteps):
+            for nid in self.order:
+                node = self.graph_nodes[nid]
+                inputs = {}
+                for edge in self.incoming[nid]:
+                    upstream = outputs[edge["from"]]
+                    from_port = edge.get("from_port", "value")
+                    inputs[edge.get("to_port", edge["from"])] = upstream.get(from_port, upstream.get("value"))
+                if nid in feeds:
+                    inputs["feed"] = tf.cast(feeds[nid][:, t], tf.float32)
+
+                if nid in self.fallback_nodes:
+                    out, state[nid] = self.kernels[nid](inputs, state[nid], node.get("params", {}), self.node_weights[nid],
+                                                        t=t, call_id=call_id)
+                else:
+                    out, state[nid] = self.kernels[nid](inputs, state[nid], node.get("params", {}), self.node_weights[nid])
+                outputs[nid] = out
+
+            for nid in self.sinks:
+                value = tf.cast(outputs[nid]["value"], tf.float32)
+                if batch is not None:
+                    value = tf.broadcast_to(value, [batch])
+                series[nid].append(value)
+
+        stacked = {nid: tf.stack(values, axis=-1) for nid, values in series.items()}
+        if len(stacked) == 1:
+            return next(iter(stacked.values()))
+        return stacked
+
+
+def graph_cache_key(graph, timesteps):
+    """Graph hash + timesteps + plugin versions, so editing a plugin recompiles."""
+    types = sorted({n["type"] for n in graph["nodes"]})
+    versions = PLUGIN_REGISTRY.code_hashes(types)
+    return generate_preset_id({"graph": graph, "timesteps": timesteps, "plugins": versions})
+
+
+def _weights_path(key):
+    return os.path.join(COMPILED_DIR, f"{key}.weights.h5")
+
+
+def _key_lock(key):
+    with _compiled_lock:
+        return _key_locks[key]
+
+
+def compile_graph(graph, timesteps=10):
+    """
+    Lower a graph to a CompiledGraph, reusing a cached instance for the same
+    graph hash. Previously trained weights for that hash are restored.
+    """
+    PLUGIN_REGISTRY.maybe_refresh()
+    key = graph_cache_key(graph, timesteps)
+    with _key_lock(key):
+        return _cached_model(graph, timesteps, key)
+
+
+def _cached_model(graph, timesteps, key):
+    """compile_graph with the lock for `key` held."""
+    with _compiled_lock:
+        if key in _COMPILED:
+            _COMPILED.move_to_end(key)
+            return _COMPILED[key]
+
+    model = CompiledGraph(graph, timesteps, name=f"graph_{key}")
+    model.cache_key = key
+    if model.weights and os.path.exists(_weights_path(key)):
+        # Build variables with a dummy batch before restoring
+        input_ids = [nid for nid in model.order if not model.incoming[nid]]
+        model({nid: tf.zeros([1, model.timesteps]) for nid in input_ids})
+        model.load_weights(_weights_path(key))
+
+    with _compiled_lock:
+        _COMPILED[key] = model
+        while len(_COMPILED) > COMPILED_CACHE_SIZE:
+            _COMPILED.popitem(last=False)
+    return model
+
+
+def train_graph(graph, feeds, targets, timesteps=10, epochs=5, batch_size=32, learning_rate=1e-2):
+    """
+    Fit a compiled graph on arrays: feeds is {input_node_id: [N, timesteps]},
+    targets is [N, timesteps] for a single sink node. Returns the Keras history dict.
+    Concurrent calls for the same graph run one after the other on its cached model.
+    """
+    PLUGIN_REGISTRY.maybe_refresh()
+    key = graph_cache_key(graph, timesteps)
+    with _key_lock(key):
+        model = _cached_model(graph, timesteps, key)
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+            loss="mse",
+            # py_function nodes can't be lowered by XLA
+            jit_compile=not model.fallback_nodes,
+        )
+        history = model.fit(feeds, targets, epochs=epochs, batch_size=batch_size, verbose=0)
+        if model.weights:
+            model.save_weights(_weights_path(key))
+    return history.history
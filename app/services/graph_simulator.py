@@ -1,5 +1,7 @@
+import time
 import numpy as np
-from app.services.plugin_loader import get_node_handler
+from app.services import sim_cache, preset_manager, datasets, metrics, profiler
+from app.services.plugin_loader import PLUGIN_REGISTRY
 from collections import defaultdict, deque
 
 def topological_sort(nodes, edges):
@@ -26,58 +28,195 @@ def topological_sort(nodes, edges):
 
     return ordered
 
-def run_simulation(graph, dataset_name, timesteps=10, autosave=False, preset_name=None):
+def topological_levels(nodes, edges):
+    """
+    Group nodes into levels where every node only depends on earlier levels,
+    so the nodes of one level can be executed as a single batch.
+    """
+    order = topological_sort(nodes, edges)
+    level = {nid: 0 for nid in nodes}
+    parents = defaultdict(list)
+    for edge in edges:
+        parents[edge["to"]].append(edge["from"])
+    for nid in order:
+        if parents[nid]:
+            level[nid] = 1 + max(level[p] for p in parents[nid])
+
+    levels = defaultdict(list)
+    for nid in order:
+        levels[level[nid]].append(nid)
+    return [levels[i] for i in sorted(levels)]
+
+def _gather_inputs(node_id, edges, state):
+    """Gather inputs for a node from previous outputs."""
+    inputs = {}
+    for edge in edges:
+        if edge["to"] == node_id:
+            from_node = edge["from"]
+            # Same port resolution as the compiled path (graph_compiler.CompiledGraph)
+            from_port = edge.get("from_port", "value")
+            to_port = edge.get("to_port", from_node)
+            outputs = state[from_node]["outputs"]
+            inputs[to_port] = outputs.get(from_port, outputs.get("value"))
+    return inputs
+
+# Timesteps to run when there is no dataset to take the length from
+DEFAULT_TIMESTEPS = 10
+
+def run_simulation(graph, dataset_name, timesteps=None, autosave=False, preset_name=None, executor=None,
+                   use_cache=True, batch_size=1):
+    """
+    Run the graph for `timesteps` steps. Plugins run inline by default; pass a
+    SandboxedExecutor to run each level of independent nodes as one batch in
+    isolated worker processes.
+
+    If `dataset_name` is a registered dataset (see app.services.datasets), each
+    timestep feeds the next `batch_size` rows to the graph's input nodes, and
+    timesteps defaults to the number of batches in the dataset. Raises
+    ValueError for a dataset shorter than one batch or an input node reading a
+    column the dataset doesn't have.
+
+    Results are deterministic for a given graph, dataset, timesteps and plugin
+    code, so they are memoized in sim_cache. Sandboxed runs where a node failed
+    are not cached, since the failure may be a timeout. With autosave, the result is also
+    saved as a new version of the preset `preset_name` (default: graph id).
+    """
+    PLUGIN_REGISTRY.maybe_refresh()
+    has_dataset = datasets.resolve_path(dataset_name) is not None
+    if has_dataset:
+        rows = datasets.num_rows(dataset_name)
+        if rows < max(1, int(batch_size)):
+            raise ValueError(f"Dataset {dataset_name} has {rows} rows, fewer than batch_size {batch_size}")
+    if timesteps is None:
+        timesteps = DEFAULT_TIMESTEPS
+        if has_dataset:
+            timesteps = rows // max(1, int(batch_size))
+
+    key = sim_cache.cache_key(graph, dataset_name, timesteps, batch_size) if use_cache else None
+    result = sim_cache.get(key) if key else None
+
+    if result is None:
+        metrics.BATCH_SIZE.labels("simulation").observe(batch_size)
+        feed = datasets.DatasetFeed(dataset_name, batch_size) if has_dataset else None
+        try:
+            with metrics.timed("simulation", "sandboxed" if executor is not None else "inline"), \
+                    profiler.profile(f"run_simulation {graph.get('id')}", profiler.PROFILE_SIMULATION_RATE):
+                result = _simulate(graph, dataset_name, timesteps, executor, feed)
+        finally:
+            if feed is not None:
+                feed.close()
+        deterministic = executor is None or all(
+            entry["success"] for record in result["logs"] for entry in record["node_logs"].values()
+        )
+        if key and deterministic:
+            sim_cache.put(key, result)
+
+    if autosave:
+        name = preset_name or graph.get("id") or preset_manager.generate_preset_id(graph)
+        versions = preset_manager.list_versions(name)
+        # Skip only an identical version: the same graph can give a different result
+        # with another dataset, timesteps, batch size or plugin code
+        latest = versions[-1] if versions else {}
+        if (latest.get("graph_hash") != preset_manager.generate_preset_id(graph)
+                or latest.get("result_hash") != preset_manager.generate_preset_id(result)):
+            preset_manager.save_preset(graph, result, name)
+
+    return result
+
+def _input_feeds(columns, batch, batch_size):
+    """Per input node slice of the current batch: a float, or a list when batch_size > 1."""
+    if batch_size == 1:
+        return {node_id: float(batch[0, col]) for node_id, col in columns.items()}
+    return {node_id: batch[:, col].tolist() for node_id, col in columns.items()}
+
+def _simulate(graph, dataset_name, timesteps, executor, feed=None):
     nodes = {n["id"]: n for n in graph["nodes"]}
     edges = graph["edges"]
-    execution_order = topological_sort(nodes, edges)
+    levels = topological_levels(nodes, edges)
+
+    # Plugin edits were picked up by the refresh in run_simulation; pin one version of each handler
+    node_types = {n["type"] for n in nodes.values()}
+    if executor is None:
+        handlers = PLUGIN_REGISTRY.resolve(node_types)
+    else:
+        # Don't import untrusted plugins into this process, just check they exist
+        missing = node_types - set(PLUGIN_REGISTRY.names())
+        if missing:
+            raise ValueError(f"No handler for node type: {sorted(missing)[0]}")
 
     # Init state and logs
     state = {nid: {"mem": {}, "outputs": {}} for nid in nodes}
     logs = []
+    # Plugin time per node type, recorded once at the end (inline runs only)
+    node_seconds = defaultdict(float)
+    node_calls = defaultdict(int)
+    # When this thread is being profiled, samples taken while a node runs are attributed to its plugin
+    prof = profiler.current()
+    batches = iter(feed) if feed is not None else None
+    # Dataset column read by each input node (params["column"], default the first)
+    columns = {
+        nid: feed.column_index(n.get("params", {}).get("column"))
+        for nid, n in nodes.items() if n["type"] == "input"
+    } if feed is not None else {}
 
     # Simulate T timesteps
     for t in range(timesteps):
         timestep_log = {"timestep": t, "node_logs": {}}
-
-        for node_id in execution_order:
-            node = nodes[node_id]
-            handler = get_node_handler(node["type"])
-
-            # Gather inputs from previous outputs
-            inputs = {}
-            for edge in edges:
-                if edge["to"] == node_id:
-                    from_node = edge["from"]
-                    from_port = edge.get("from_port", "default")
-                    to_port = edge.get("to_port", from_node)
-                    val = state[from_node]["outputs"].get(from_port, None)
-                    inputs[to_port] = val
+        # Once the dataset runs out, input nodes fall back to their constant value
+        batch = next(batches, None) if batches is not None else None
+        feeds = _input_feeds(columns, batch, feed.batch_size) if batch is not None else {}
+
+        for level in levels:
+            calls = []
+            for node_id in level:
+                node = nodes[node_id]
+                inputs = _gather_inputs(node_id, edges, state)
+                if node_id in feeds:
+                    inputs["feed"] = feeds[node_id]
+                calls.append((node["type"], inputs, state[node_id]["mem"], node.get("params", {})))
 
             # Run node logic
-            prev_state = state[node_id]["mem"]
-            params = node.get("params", {})
-
-            try:
-                outputs, new_mem = handler(inputs, prev_state, params)
-                success = True
-            except Exception as e:
-                outputs, new_mem = {"error": str(e)}, prev_state
-                success = False
-
-            # Save new state and output
-            state[node_id]["mem"] = new_mem
-            state[node_id]["outputs"] = outputs
-
-            # Log it
-            timestep_log["node_logs"][node_id] = {
-                "inputs": inputs,
-                "outputs": outputs,
-                "state": new_mem,
-                "success": success
-            }
+            if executor is not None:
+                if prof is not None:
+                    prof.set_tag("sandbox:" + ",".join(sorted({c[0] for c in calls})), _simulate.__code__)
+                results = executor.run_batch(calls)
+                if prof is not None:
+                    prof.set_tag(None)
+            else:
+                results = []
+                for node_type, inputs, prev_state, params in calls:
+                    if prof is not None:
+                        prof.set_tag("plugin:" + node_type, _simulate.__code__)
+                    started = time.perf_counter()
+                    try:
+                        outputs, new_mem = handlers[node_type](inputs, prev_state, params)
+                        results.append((True, outputs, new_mem))
+                    except Exception as e:
+                        results.append((False, str(e), None))
+                    node_seconds[node_type] += time.perf_counter() - started
+                    node_calls[node_type] += 1
+                    if prof is not None:
+                        prof.set_tag(None)
+
+            for node_id, (_, inputs, prev_state, _), (success, outputs, new_mem) in zip(level, calls, results):
+                if not success:
+                    outputs, new_mem = {"error": outputs}, prev_state
+
+                # Save new state and output
+                state[node_id]["mem"] = new_mem
+                state[node_id]["outputs"] = outputs
+
+                # Log it
+                timestep_log["node_logs"][node_id] = {
+                    "inputs": inputs,
+                    "outputs": outputs,
+                    "state": new_mem,
+                    "success": success
+                }
 
         logs.append(timestep_log)
 
+    metrics.record_node_times(node_seconds, node_calls)
     return {
         "graph_id": graph.get("id"),
         "dataset_name": dataset_name,
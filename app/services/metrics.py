@@ -0,0 +1,102 @@
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Prometheus metrics served at /metrics.
+#
+# Under gunicorn each worker is a separate process; set PROMETHEUS_MULTIPROC_DIR
+# (gunicorn.conf.py does) and every worker writes its samples to mmap'd files in
+# that directory, which /metrics aggregates no matter which worker answers.
+# Recording a sample is a lock + a float add, cheap enough to leave on.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Time spent in each stage of a pipeline (e.g. summarize: tokenize/pad/predict/decode)",
+    ["pipeline", "stage"], buckets=LATENCY_BUCKETS,
+)
+MODEL_LOAD = Histogram(
+    "model_load_seconds", "Time to load a model handle", ["model"], buckets=LATENCY_BUCKETS,
+)
+# Node timings are summed per simulation and recorded once per node type, so a
+# 1000-node graph doesn't pay for thousands of histogram updates per timestep
+NODE_SECONDS = Counter(
+    "simulation_node_seconds", "Total plugin execution time by node type", ["node_type"],
+)
+NODE_CALLS = Counter(
+    "simulation_node_calls", "Plugin executions by node type", ["node_type"],
+)
+BATCH_SIZE = Histogram(
+    "batch_size", "Items per model call or simulation step", ["pipeline"], buckets=BATCH_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests", "Cache lookups by cache and result (hit/miss)", ["cache", "result"],
+)
+QUEUE_DEPTH = Gauge(
+    "queue_depth", "Jobs waiting or running", ["queue"], multiprocess_mode="livesum",
+)
+
+
+@contextmanager
+def timed(pipeline, stage):
+    """Record the duration of the with-block as one stage of a pipeline."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(pipeline, stage).observe(time.perf_counter() - start)
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_node_times(seconds_by_type, calls_by_type):
+    for node_type, seconds in seconds_by_type.items():
+        NODE_SECONDS.labels(node_type).inc(seconds)
+        NODE_CALLS.labels(node_type).inc(calls_by_type[node_type])
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+
+def _after_request(response):
+    start = g.pop("_metrics_start", None)
+    if start is not None:
+        # The URL rule, not the path, so /ai/<model_id>/logs is one series
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_LATENCY.labels(request.method, route, str(response.status_code)).observe(
+            time.perf_counter() - start)
+    return response
+
+def render():
+    """All metrics in the Prometheus text format, summed over worker processes in multiprocess mode."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+def init_app(app):
+    """Time every request and serve the metrics at /metrics."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE_LATEST)
+
+def mark_process_dead(pid):
+    """Called by gunicorn when a worker exits, so its live gauges stop counting."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+
+from app.config import Config
+from app.services import metrics
+
+# Heavy models (ASR pipeline, summarizer) are loaded on first use and cached per
+# process. Handles that set idle_seconds are unloaded after that long without use.
+ASR_MODEL = os.environ.get("ASR_MODEL", "facebook/wav2vec2-base-960h")
+ASR_IDLE_SECONDS = float(os.environ.get("ASR_IDLE_SECONDS", 600))
+SUMMARIZER_IDLE_SECONDS = float(os.environ.get("SUMMARIZER_IDLE_SECONDS", 0))
+# How often the background reaper looks for idle handles
+REAP_INTERVAL = 30.0
+
+
+class ModelHandle:
+    """A lazily loaded model. get() loads it once; concurrent callers wait for the same load."""
+
+    def __init__(self, name, loader, idle_seconds=0):
+        self.name = name
+        self.loader = loader
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._value = None
+        self.last_used = 0.0
+        self.load_seconds = None
+
+    @property
+    def loaded(self):
+        return self._value is not None
+
+    def get(self):
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    start = time.perf_counter()
+                    self._value = self.loader()
+                    self.load_seconds = time.perf_counter() - start
+                    metrics.MODEL_LOAD.labels(self.name).observe(self.load_seconds)
+                    print(f"[✔] Loaded {self.name} in {self.load_seconds:.1f}s")
+                value = self._value
+        self.last_used = time.monotonic()
+        return value
+
+    def unload(self):
+        with self._lock:
+            was_loaded = self._value is not None
+            # Callers still holding the model keep it alive until they finish
+            self._value = None
+        return was_loaded
+
+    def is_idle(self, now=None):
+        if not self.idle_seconds or self._value is None:
+            return False
+        return (now or time.monotonic()) - self.last_used > self.idle_seconds
+
+
+class HandleRegistry:
+    def __init__(self):
+        self._handles = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def register(self, name, loader, idle_seconds=0):
+        """Register (or replace) a loader. Replacing drops any model loaded by the old one."""
+        with self._lock:
+            old = self._handles.get(name)
+            self._handles[name] = ModelHandle(name, loader, idle_seconds)
+        if old is not None:
+            old.unload()
+
+    def handle(self, name):
+        try:
+            return self._handles[name]
+        except KeyError:
+            raise KeyError(f"No model handle registered as {name!r}") from None
+
+    def get(self, name):
+        return self.handle(name).get()
+
+    def warm_up(self, names=None):
+        """Load the given (or all) models now instead of on the first request."""
+        for name in names if names is not None else list(self._handles):
+            self.get(name)
+
+    def unload(self, name):
+        return self.handle(name).unload()
+
+    def evict_idle(self):
+        """Unload every handle that has been idle longer than its idle_seconds."""
+        now = time.monotonic()
+        evicted = [name for name, h in list(self._handles.items()) if h.is_idle(now) and h.unload()]
+        for name in evicted:
+            print(f"[Info] Unloaded idle model {name}")
+        return evicted
+
+    def status(self):
+        return {
+            name: {"loaded": h.loaded, "load_seconds": h.load_seconds, "idle_seconds": h.idle_seconds}
+            for name, h in self._handles.items()
+        }
+
+    def start_reaper(self, interval=REAP_INTERVAL):
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._stop.clear()
+
+        def _reap():
+            while not self._stop.wait(interval):
+                self.evict_idle()
+
+        self._reaper = threading.Thread(target=_reap, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join(timeout=1.0)
+            self._reaper = None
+
+
+MODEL_HANDLES = HandleRegistry()
+
+
+def _load_asr():
+    from transformers import pipeline
+    return pipeline("automatic-speech-recognition", model=ASR_MODEL)
+
+def _summarizer_loader(model_path, tok_in_path, tok_out_path):
+    def _load():
+        import tensorflow as tf
+        from app import load_tokenizer
+
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Summarizer model not found: {model_path}")
+        tok_target = load_tokenizer(tok_out_path)
+        widx = tok_target.word_index
+        return {
+            "model": tf.keras.models.load_model(model_path),
+            "tok_input": load_tokenizer(tok_in_path),
+            "tok_target": tok_target,
+            "start_index": widx.get("<start>", widx.get("start")),
+            "end_index": widx.get("<end>", widx.get("end")),
+        }
+    return _load
+
+def register_defaults(config):
+    """Register the ASR and summarizer handles using paths from a Flask config (or Config)."""
+    get = config.get if hasattr(config, "get") else lambda key: getattr(config, key)
+    MODEL_HANDLES.register("asr", _load_asr, idle_seconds=ASR_IDLE_SECONDS)
+    MODEL_HANDLES.register(
+        "summarizer",
+        _summarizer_loader(get("MODEL_PATH"), get("TOKENIZER_INPUT_PATH"), get("TOKENIZER_TARGET_PATH")),
+        idle_seconds=SUMMARIZER_IDLE_SECONDS,
+    )
+
+
+# Usable without an app (scripts, the speech module's __main__); create_app re-registers with its config
+register_defaults(Config)
@@ -0,0 +1,235 @@
+import os
+import shutil
+import threading
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app import serialization
+from app.extensions import db
+from app.services import blob_store, preset_manager
+from app.services.preset_manager import generate_preset_id
+
+try:
+    import fcntl
+except ImportError:  # Windows: startup is serialized within the process only
+    fcntl = None
+
+# Single storage root for training logs (and graph files from before the blob store)
+STORAGE_PATH = os.environ.get("MODEL_STORAGE_PATH", "./ai_models")
+# Where ai_registry kept graphs before this module; imported by reindex_storage()
+LEGACY_STORAGE_PATH = os.environ.get("LEGACY_MODEL_STORAGE_PATH", "./models")
+
+os.makedirs(STORAGE_PATH, exist_ok=True)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class AIModel(db.Model):
+    """Index row for a visual AI model; the graph itself lives in the blob store."""
+    __tablename__ = "ai_models"
+    __table_args__ = (
+        # Serves "newest models for this owner" with keyset pagination
+        db.Index("ix_ai_models_owner_created", "owner", "created_at", "id"),
+        db.Index("ix_ai_models_created", "created_at", "id"),
+    )
+
+    id = db.Column(db.String(36), primary_key=True)
+    owner = db.Column(db.String(64), nullable=True)
+    name = db.Column(db.String(255), nullable=True)
+    graph_hash = db.Column(db.String(12), index=True, nullable=False)
+    blob_key = db.Column(db.String(64), nullable=True)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def model_path(model_id):
+    return os.path.join(STORAGE_PATH, f"{model_id}.json")
+
+def logs_path(model_id):
+    return os.path.join(STORAGE_PATH, f"{model_id}_logs.json")
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file in the same directory and rename it into place."""
+    return serialization.dump_file(path, data, atomic=True)
+
+
+def save_model(model_id, graph, owner=None, name=None):
+    """
+    Store the graph in the blob store (identical graphs share one blob) and
+    upsert its index row. The row commit is the only step that makes the
+    model visible; an orphaned blob is reclaimed by collect_garbage().
+    """
+    key = blob_store.put(graph)
+
+    row = AIModel.query.get(model_id)
+    if row is None:
+        row = AIModel(id=model_id)
+        db.session.add(row)
+    row.owner = owner if owner is not None else row.owner
+    row.name = name or graph.get("name") or row.name
+    row.graph_hash = generate_preset_id(graph)
+    row.blob_key = key
+    row.size_bytes = blob_store.size(key)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return row
+
+def load_model(model_id):
+    row = AIModel.query.get(model_id)
+    if row is not None and row.blob_key:
+        return blob_store.get(row.blob_key)
+    return serialization.load_graph(model_path(model_id))
+
+def get_model(model_id):
+    return AIModel.query.get(model_id)
+
+def delete_model(model_id):
+    row = AIModel.query.get(model_id)
+    path = model_path(model_id)
+    if row is None and not os.path.exists(path):
+        return False
+    if row is not None:
+        db.session.delete(row)
+        db.session.commit()
+    # A legacy file left behind would be imported again on the next start
+    legacy = [os.path.join(LEGACY_STORAGE_PATH, f"{model_id}{suffix}") for suffix in (".json", "_logs.json")]
+    for p in [path, logs_path(model_id), *legacy]:
+        if os.path.exists(p):
+            os.remove(p)
+    return True
+
+def live_blob_keys():
+    return {key for (key,) in db.session.query(AIModel.blob_key).filter(AIModel.blob_key.isnot(None))}
+
+def collect_garbage():
+    """Drop blobs that neither a registered model nor a preset refers to."""
+    return preset_manager.collect_garbage(extra_live_keys=live_blob_keys())
+
+
+def _encode_cursor(row):
+    return f"{row.created_at.isoformat()}|{row.id}"
+
+def _decode_cursor(cursor):
+    """(created_at, id) from a cursor made by _encode_cursor; ValueError if it wasn't."""
+    created, sep, model_id = cursor.partition("|")
+    try:
+        if not sep or not model_id:
+            raise ValueError
+        return datetime.fromisoformat(created), model_id
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from None
+
+def list_models(owner=None, graph_hash=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Newest-first page of models, optionally filtered by owner and graph hash.
+    Uses keyset pagination on (created_at, id) so deep pages stay index lookups.
+    Returns (rows, next_cursor); ValueError for a malformed cursor.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query = AIModel.query
+    if owner is not None:
+        query = query.filter(AIModel.owner == owner)
+    if graph_hash is not None:
+        query = query.filter(AIModel.graph_hash == graph_hash)
+    if cursor:
+        created, model_id = _decode_cursor(cursor)
+        query = query.filter(
+            db.or_(
+                AIModel.created_at < created,
+                db.and_(AIModel.created_at == created, AIModel.id < model_id),
+            )
+        )
+
+    rows = query.order_by(AIModel.created_at.desc(), AIModel.id.desc()).limit(limit + 1).all()
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _graph_files(directory):
+    if not os.path.isdir(directory):
+        return
+    for fname in sorted(os.listdir(directory)):
+        if fname.endswith(".json") and not fname.endswith("_logs.json"):
+            yield fname[:-5], os.path.join(directory, fname)
+
+def reindex_storage():
+    """
+    Import graph files written before the registry existed, from STORAGE_PATH
+    and LEGACY_STORAGE_PATH; legacy training logs are copied next to the
+    others. Models already indexed are skipped, so this is safe to rerun.
+    Returns the number of models added.
+    """
+    known = {model_id for (model_id,) in db.session.query(AIModel.id)}
+    added = 0
+    for directory in (STORAGE_PATH, LEGACY_STORAGE_PATH):
+        for model_id, path in _graph_files(directory):
+            if model_id in known:
+                continue
+            try:
+                graph = serialization.load_file(path)
+            except (OSError, ValueError):
+                continue
+            legacy_logs = os.path.join(directory, f"{model_id}_logs.json")
+            if directory != STORAGE_PATH and os.path.exists(legacy_logs) and not os.path.exists(logs_path(model_id)):
+                shutil.copyfile(legacy_logs, logs_path(model_id))
+            mtime = datetime.utcfromtimestamp(os.path.getmtime(path))
+            db.session.add(AIModel(
+                id=model_id,
+                owner=graph.get("owner") if isinstance(graph, dict) else None,
+                name=graph.get("name") if isinstance(graph, dict) else None,
+                graph_hash=generate_preset_id(graph),
+                blob_key=blob_store.put(graph),
+                size_bytes=os.path.getsize(path),
+                created_at=mtime,
+                updated_at=mtime,
+            ))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Indexed concurrently (or already saved under this id)
+                db.session.rollback()
+                continue
+            known.add(model_id)
+            added += 1
+    return added
+
+
+# Columns added after the table was first created: name -> DDL type.
+# create_all() never alters an existing table, so these are added by _migrate().
+_ADDED_COLUMNS = {
+    "blob_key": "VARCHAR(64)",
+}
+
+def _migrate():
+    existing = {col["name"] for col in inspect(db.engine).get_columns(AIModel.__tablename__)}
+    for name, ddl_type in _ADDED_COLUMNS.items():
+        if name not in existing:
+            db.session.execute(text(f"ALTER TABLE {AIModel.__tablename__} ADD COLUMN {name} {ddl_type}"))
+    db.session.commit()
+
+
+_init_lock = threading.Lock()
+
+def init_registry():
+    """
+    Create (or migrate) the index table and import unindexed graph files. Every gunicorn
+    worker calls this at startup; a lock file makes them take turns, so the
+    later ones find the work done.
+    """
+    with _init_lock, open(os.path.join(STORAGE_PATH, ".registry.lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            db.create_all()
+            _migrate()
+            return reindex_storage()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
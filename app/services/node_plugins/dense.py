@@ -1,5 +1,35 @@
+import numpy as np
+
+def _plain(x):
+    # Back to JSON types: a float, or a list of floats for a batched run
+    return float(x) if np.ndim(x) == 0 else np.asarray(x, dtype=float).tolist()
+
+def _value(inp):
+    # An upstream port's value: a float, a list of floats, or (older graphs) {"value": ...}
+    if isinstance(inp, dict):
+        inp = inp.get("value", 0.0)
+    return np.asarray(0.0 if inp is None else inp, dtype=float)
+
 def run(inputs, state, params):
-    x = sum(inp.get("value", 0.0) for inp in inputs.values())
+    # Values are floats, or lists (one per row) when the simulation feeds batches
+    x = sum((_value(inp) for inp in inputs.values()), 0.0)
     weight = params.get("weight", 1.0)
     bias = params.get("bias", 0.0)
-    return {"value": weight * x + bias}, state
\ No newline at end of file
+    return {"value": _plain(weight * x + bias)}, state
+
+def tf_weights(params):
+    """Trainable variables (name -> initial value) for the compiled graph."""
+    return {"weight": params.get("weight", 1.0), "bias": params.get("bias", 0.0)}
+
+def tf_kernel(inputs, state, params, weights):
+    import tensorflow as tf
+    values = [tf.cast(v, tf.float32) for v in inputs.values()]
+    if not values:
+        x = tf.constant(0.0)
+    else:
+        # Unfed inputs are scalars, fed ones [batch]; add_n needs one shape
+        shape = tf.shape(values[0])
+        for v in values[1:]:
+            shape = tf.broadcast_dynamic_shape(shape, tf.shape(v))
+        x = tf.add_n([tf.broadcast_to(v, shape) for v in values])
+    return {"value": weights["weight"] * x + weights["bias"]}, state
@@ -1,12 +1,23 @@
 def run(inputs, state, params):
+    # "feed" is this node's column of the current dataset batch, if the simulation has a dataset
+    if "feed" in inputs:
+        return {"value": inputs["feed"]}, state
     return {"value": params.get("value", 1)}, state
 
+def tf_kernel(inputs, state, params, weights):
+    import tensorflow as tf
+    # "feed" is the per-timestep slice of the dataset column for this node, if any
+    if "feed" in inputs:
+        return {"value": inputs["feed"]}, state
+    return {"value": tf.constant(float(params.get("value", 1)))}, state
+
 def metadata():
     return {
         "label": "Input Node",
         "category": "developer",
-        "description": "Provides a fixed numeric input",
+        "description": "Provides a dataset column, or a fixed numeric input without a dataset",
         "params": {
-            "value": {"type": "float", "default": 1.0}
+            "value": {"type": "float", "default": 1.0},
+            "column": {"type": "string", "default": None}
         }
     }
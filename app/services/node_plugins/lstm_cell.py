@@ -1,14 +1,36 @@
 import numpy as np
 
+def _plain(x):
+    # Back to JSON types: a float, or a list of floats for a batched run
+    return float(x) if np.ndim(x) == 0 else np.asarray(x, dtype=float).tolist()
+
+def _value(inp):
+    # An upstream port's value: a float, a list of floats, or (older graphs) {"value": ...}
+    if isinstance(inp, dict):
+        inp = inp.get("value", 0.0)
+    return np.asarray(0.0 if inp is None else inp, dtype=float)
+
 def run(inputs, state, params):
-    # Simplified LSTM logic
-    x_t = list(inputs.values())[0].get("value", 0.0)
+    # Simplified LSTM logic; values are floats, or lists (one per row) for a batched run
+    x_t = _value(next(iter(inputs.values()), None))
     h_prev = state.get("h_t", 0.0)
-    c_prev = state.get("c_t", 0.0)
+    c_prev = np.asarray(state.get("c_t", 0.0), dtype=float)
 
     f_t, i_t, o_t = 0.8, 0.7, 0.6  # dummy gates
 
     c_t = f_t * c_prev + i_t * x_t
     h_t = o_t * np.tanh(c_t)
 
-    return {"value": h_t}, {"h_t": h_t, "c_t": c_t}
\ No newline at end of file
+    return {"value": _plain(h_t)}, {"h_t": _plain(h_t), "c_t": _plain(c_t)}
+
+def tf_kernel(inputs, state, params, weights):
+    import tensorflow as tf
+    x_t = list(inputs.values())[0]
+    c_prev = state.get("c_t", 0.0)
+
+    f_t, i_t, o_t = 0.8, 0.7, 0.6  # dummy gates, same as run()
+
+    c_t = f_t * c_prev + i_t * x_t
+    h_t = o_t * tf.tanh(c_t)
+
+    return {"value": h_t}, {"h_t": h_t, "c_t": c_t}
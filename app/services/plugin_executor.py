@@ -0,0 +1,197 @@
+import os
+import signal
+import threading
+import multiprocessing as mp
+
+from app.services.plugin_loader import PLUGIN_REGISTRY
+
+try:
+    import resource
+except ImportError:  # Windows has no rlimits; memory caps are skipped there
+    resource = None
+
+# Defaults for the sandboxed executor (overridable via env)
+PLUGIN_WORKERS = int(os.environ.get("PLUGIN_WORKERS", 2))
+PLUGIN_TIMEOUT = float(os.environ.get("PLUGIN_TIMEOUT", 1.0))
+PLUGIN_MEMORY_LIMIT_MB = int(os.environ.get("PLUGIN_MEMORY_LIMIT_MB", 512))
+
+# Extra time the parent allows on top of the per-call budget before it kills a worker
+KILL_GRACE = 1.0
+
+
+class PluginTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise PluginTimeout("Plugin call timed out")
+
+
+def _worker_main(conn, timeout, memory_limit_mb):
+    """
+    Worker loop: receive a batch of node calls, run them one by one and send all
+    results back in a single message. Each call gets its own SIGALRM budget so a
+    slow plugin only fails its own call.
+    """
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+    use_alarm = hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+    # Ctrl+C is handled by the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    while True:
+        try:
+            batch = conn.recv()
+        except (EOFError, OSError):
+            break
+        if batch is None:
+            break
+
+        PLUGIN_REGISTRY.maybe_refresh()
+        results = []
+        for node_type, inputs, state, params in batch:
+            try:
+                handler = PLUGIN_REGISTRY.get_handler(node_type)
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, timeout)
+                try:
+                    outputs, new_mem = handler(inputs, state, params)
+                finally:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+                results.append((True, outputs, new_mem))
+            except MemoryError:
+                results.append((False, "Plugin exceeded memory limit", None))
+            except Exception as e:
+                results.append((False, str(e), None))
+        conn.send(results)
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, ctx, timeout, memory_limit_mb):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, timeout, memory_limit_mb),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1.0)
+        self.conn.close()
+
+
+class SandboxedExecutor:
+    """
+    Run node plugin calls in a pool of long-lived worker processes.
+
+    Calls are shipped in batches (one message per worker per batch) rather than
+    one round trip per call. A call that overruns its timeout or memory limit
+    fails on its own; a worker stuck in native code is killed and replaced.
+    Batches from concurrent requests run one at a time, since they share the
+    workers' pipes.
+    """
+
+    def __init__(self, workers=PLUGIN_WORKERS, timeout=PLUGIN_TIMEOUT, memory_limit_mb=PLUGIN_MEMORY_LIMIT_MB):
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        # Workers are started (and replaced after a timeout) from a process that already
+        # runs threads and TensorFlow; a forked copy could inherit a held lock and hang
+        method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        self._ctx = mp.get_context(method)
+        self._lock = threading.Lock()
+        self._workers = [self._spawn() for _ in range(max(1, workers))]
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.timeout, self.memory_limit_mb)
+
+    def run_batch(self, calls):
+        """
+        Execute a list of (node_type, inputs, state, params) calls and return a
+        list of (success, outputs_or_error, new_state) in the same order.
+        """
+        if not calls:
+            return []
+        with self._lock:
+            return self._run_batch(calls)
+
+    def _run_batch(self, calls):
+        n_workers = min(len(self._workers), len(calls))
+        chunks = [calls[i::n_workers] for i in range(n_workers)]
+        sent = []
+        for worker, chunk in zip(self._workers, chunks):
+            try:
+                worker.conn.send(chunk)
+                sent.append(True)
+            except OSError:
+                # Died since the last batch (e.g. killed at its memory limit)
+                sent.append(False)
+
+        chunk_results = []
+        for i, chunk in enumerate(chunks):
+            worker = self._workers[i]
+            deadline = self.timeout * len(chunk) + KILL_GRACE
+            result = None
+            try:
+                if sent[i] and worker.conn.poll(deadline):
+                    result = worker.conn.recv()
+            except (EOFError, OSError):
+                result = None
+
+            if result is None:
+                # Hung or crashed worker: replace it and fail the whole chunk
+                exitcode = worker.process.exitcode
+                worker.kill()
+                self._workers[i] = self._spawn()
+                reason = "Plugin worker timed out" if exitcode is None else f"Plugin worker died (exit code {exitcode})"
+                result = [(False, reason, None)] * len(chunk)
+            chunk_results.append(result)
+
+        # Undo the round-robin split
+        ordered = [None] * len(calls)
+        for i, result in enumerate(chunk_results):
+            ordered[i::n_workers] = result
+        return ordered
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown()
+
+    def _shutdown(self):
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            worker.process.join(timeout=1.0)
+            worker.kill()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Process-wide executor, created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = SandboxedExecutor()
+        return _executor
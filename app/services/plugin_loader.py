@@ -1,47 +1,237 @@
 import os
+import sys
+import time
+import hashlib
 import importlib
+import importlib.util
+import threading
+from importlib import metadata as importlib_metadata
 
 # Location of the plugin module (should match your package structure)
 PLUGIN_DIR = "app.services.node_plugins"
+PLUGIN_PATH = os.path.join(os.path.dirname(__file__), "node_plugins")
 
-def load_node_registry():
-    registry = {}
-    metadata_registry = {}
-    base_path = os.path.dirname(__file__)
+# External packages can ship node types by declaring an entry point in this group, e.g.
+#   [project.entry-points."ai_notes.node_plugins"]
+#   conv2d = "my_pkg.nodes.conv2d"
+ENTRY_POINT_GROUP = "ai_notes.node_plugins"
 
-    plugin_path = os.path.join(base_path, "node_plugins")
+# How often the background watcher rescans the plugin directory (seconds)
+WATCH_INTERVAL = float(os.environ.get("PLUGIN_WATCH_INTERVAL", 2.0))
+# Without the watcher, callers on the request path rescan at most this often (seconds)
+REFRESH_TTL = float(os.environ.get("PLUGIN_REFRESH_TTL", 5.0))
 
-    for fname in os.listdir(plugin_path):
-        if fname.endswith(".py") and not fname.startswith("_"):
-            module_name = f"{PLUGIN_DIR}.{fname[:-3]}"
-            try:
-                mod = importlib.import_module(module_name)
 
-                # Register run() function
-                if hasattr(mod, "run"):
-                    registry[fname[:-3]] = mod.run
-                else:
-                    print(f"[Warning] Plugin {fname} is missing 'run()' function.")
+class PluginRegistry:
+    """
+    Index of node plugins that only imports a plugin the first time it is used.
 
-                # Register metadata if available
-                if hasattr(mod, "metadata"):
-                    metadata_registry[fname[:-3]] = mod.metadata()
+    Local plugins are indexed by file name and mtime with a cheap directory scan;
+    external plugins are indexed from entry points. Imported modules are cached and
+    loaded again, as a new module object, when their file changes; a handler that
+    has already been handed out keeps running the old code, so a simulation in
+    flight is never affected.
+    """
 
-            except Exception as e:
-                print(f"[Error] Failed to load plugin {fname}: {e}")
+    def __init__(self, plugin_path=PLUGIN_PATH, package=PLUGIN_DIR, entry_point_group=ENTRY_POINT_GROUP):
+        self.plugin_path = plugin_path
+        self.package = package
+        self.entry_point_group = entry_point_group
+        self._lock = threading.RLock()
+        self._index = {}    # name -> {"source": "file"|"entry_point", "target": path|EntryPoint, "mtime": float}
+        self._modules = {}  # name -> (mtime, module)
+        self._hashes = {}   # name -> (mtime, sha256 of source)
+        self._watcher = None
+        self._stop = threading.Event()
+        self._refreshed = 0.0
+        self.refresh()
 
-    return registry, metadata_registry
+    def _scan_files(self):
+        index = {}
+        try:
+            entries = list(os.scandir(self.plugin_path))
+        except FileNotFoundError:
+            return index
+        for entry in entries:
+            fname = entry.name
+            if fname.endswith(".py") and not fname.startswith("_") and entry.is_file():
+                index[fname[:-3]] = {"source": "file", "target": entry.path, "mtime": entry.stat().st_mtime}
+        return index
+
+    def _scan_entry_points(self):
+        index = {}
+        try:
+            eps = importlib_metadata.entry_points(group=self.entry_point_group)
+        except Exception as e:
+            print(f"[Error] Failed to read plugin entry points: {e}")
+            return index
+        for ep in eps:
+            index[ep.name] = {"source": "entry_point", "target": ep, "mtime": 0.0}
+        return index
+
+    def refresh(self):
+        """
+        Rescan plugin sources without importing anything.
+        Cached modules whose file changed or disappeared are dropped so the next
+        lookup re-imports them. Returns the set of plugin names that changed.
+        """
+        self._refreshed = time.monotonic()
+        index = self._scan_entry_points()
+        # Local plugins win over external ones with the same name
+        index.update(self._scan_files())
+
+        with self._lock:
+            changed = {
+                name for name in set(index) | set(self._index)
+                if index.get(name, {}).get("mtime") != self._index.get(name, {}).get("mtime")
+            }
+            for name in changed:
+                if name in self._modules and (name not in index or self._modules[name][0] != index[name]["mtime"]):
+                    del self._modules[name]
+            self._index = index
+        return changed
+
+    def maybe_refresh(self, ttl=REFRESH_TTL):
+        """
+        refresh() for the request path: skipped while the watcher keeps the index
+        current, or when the last scan is less than `ttl` seconds old.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return set()
+        if time.monotonic() - self._refreshed < ttl:
+            return set()
+        return self.refresh()
+
+    def _import(self, name, info):
+        if info["source"] == "entry_point":
+            return info["target"].load()
+
+        module_name = f"{self.package}.{name}"
+        if module_name not in sys.modules:
+            return importlib.import_module(module_name)
+        # Stale module from a previous version of the file. importlib.reload would
+        # update its globals in place, under the handlers already handed out; load
+        # the new version as a separate module instead
+        importlib.invalidate_caches()
+        spec = importlib.util.spec_from_file_location(module_name, info["target"])
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        sys.modules[module_name] = mod
+        return mod
+
+    def get_module(self, node_type):
+        with self._lock:
+            cached = self._modules.get(node_type)
+            if cached is not None:
+                return cached[1]
+            info = self._index.get(node_type)
+            if info is None:
+                raise ValueError(f"No handler for node type: {node_type}")
+            mod = self._import(node_type, info)
+            self._modules[node_type] = (info["mtime"], mod)
+            return mod
+
+    def get_handler(self, node_type):
+        mod = self.get_module(node_type)
+        # Entry points may point straight at a run() callable instead of a module
+        handler = getattr(mod, "run", None) if not callable(mod) else mod
+        if handler is None:
+            raise ValueError(f"Plugin {node_type} is missing 'run()' function.")
+        return handler
+
+    def get_metadata(self, node_type):
+        try:
+            mod = self.get_module(node_type)
+        except Exception:
+            return {}
+        if hasattr(mod, "metadata"):
+            return mod.metadata()
+        return {}
+
+    def resolve(self, node_types):
+        """
+        Look up handlers for all node types up front so a running simulation
+        holds on to one consistent version of every plugin.
+        """
+        return {node_type: self.get_handler(node_type) for node_type in set(node_types)}
+
+    def versions(self, node_types=None):
+        """Return {name: mtime} for the given (or all) plugins, without importing them."""
+        with self._lock:
+            names = self._index if node_types is None else node_types
+            return {name: self._index[name]["mtime"] for name in names if name in self._index}
 
-# Two registries: one for running nodes, one for metadata
-NODE_REGISTRY, NODE_METADATA = load_node_registry()
+    def code_hashes(self, node_types):
+        """
+        Return {name: fingerprint} of the plugin code, without importing it.
+        File plugins hash their source (cached per mtime, so touching a file
+        doesn't count as a change); entry points use the distribution version.
+        """
+        out = {}
+        with self._lock:
+            for name in node_types:
+                info = self._index.get(name)
+                if info is None:
+                    continue
+                if info["source"] == "entry_point":
+                    dist = getattr(info["target"], "dist", None)
+                    out[name] = f"{info['target'].value}@{getattr(dist, 'version', '')}"
+                    continue
+                cached = self._hashes.get(name)
+                if cached is None or cached[0] != info["mtime"]:
+                    with open(info["target"], "rb") as f:
+                        cached = (info["mtime"], hashlib.sha256(f.read()).hexdigest()[:16])
+                    self._hashes[name] = cached
+                out[name] = cached[1]
+        return out
+
+    def names(self):
+        with self._lock:
+            return list(self._index.keys())
+
+    def start_watching(self, interval=WATCH_INTERVAL):
+        """Poll the plugin directory in a daemon thread and pick up new or edited plugins."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+
+        def _watch():
+            while not self._stop.wait(interval):
+                changed = self.refresh()
+                if changed:
+                    print(f"[Info] Reloaded node plugins: {', '.join(sorted(changed))}")
+
+        self._watcher = threading.Thread(target=_watch, name="plugin-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=1.0)
+            self._watcher = None
+
+
+PLUGIN_REGISTRY = PluginRegistry()
+
+
+def load_node_registry():
+    """Eagerly import every plugin; kept for callers that want the full dicts."""
+    registry = {}
+    metadata_registry = {}
+    for name in PLUGIN_REGISTRY.names():
+        try:
+            registry[name] = PLUGIN_REGISTRY.get_handler(name)
+            metadata_registry[name] = PLUGIN_REGISTRY.get_metadata(name)
+        except Exception as e:
+            print(f"[Error] Failed to load plugin {name}: {e}")
+    return registry, metadata_registry
 
 def get_node_handler(node_type):
-    if node_type not in NODE_REGISTRY:
-        raise ValueError(f"No handler for node type: {node_type}")
-    return NODE_REGISTRY[node_type]
+    return PLUGIN_REGISTRY.get_handler(node_type)
 
 def get_node_metadata(node_type):
-    return NODE_METADATA.get(node_type, {})
+    return PLUGIN_REGISTRY.get_metadata(node_type)
+
 def list_node_types():
     """List all available node types."""
-    return list(NODE_REGISTRY.keys())
\ No newline at end of file
+    return PLUGIN_REGISTRY.names()
@@ -0,0 +1,131 @@
+import copy
+
+# Structural deltas between two versions of a preset.
+#
+# Graphs are diffed by node id (added / removed / changed params etc.) and by
+# edge; everything else, including simulation results, uses a generic nested
+# diff. make_delta() always checks that apply_delta() reproduces the target
+# exactly and falls back to storing the value whole when it wouldn't.
+
+
+def diff_value(old, new):
+    """
+    Nested diff of two JSON values. Returns None when they are equal, otherwise
+    {"set": value} or, for dicts/equal-length lists, {"dict"/"list": {...}}.
+    """
+    if old == new:
+        return None
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = {}
+        removed = [k for k in old if k not in new]
+        for k, v in new.items():
+            if k not in old:
+                changes[k] = {"set": v}
+            else:
+                d = diff_value(old[k], v)
+                if d is not None:
+                    changes[k] = d
+        return {"dict": changes, "del": removed} if removed else {"dict": changes}
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        changes = {}
+        for i, (a, b) in enumerate(zip(old, new)):
+            d = diff_value(a, b)
+            if d is not None:
+                changes[str(i)] = d
+        return {"list": changes}
+    return {"set": new}
+
+def apply_value(old, delta):
+    if delta is None:
+        return copy.deepcopy(old)
+    if "set" in delta:
+        return copy.deepcopy(delta["set"])
+    if "dict" in delta:
+        out = {k: v for k, v in old.items() if k not in delta.get("del", ())}
+        for k, d in delta["dict"].items():
+            out[k] = apply_value(out.get(k), d)
+        return out
+    if "list" in delta:
+        out = list(old)
+        for i, d in delta["list"].items():
+            out[int(i)] = apply_value(out[int(i)], d)
+        return out
+    raise ValueError(f"Unknown delta op: {sorted(delta)}")
+
+
+def diff_graph(old, new):
+    """Node/edge level diff keyed by node id."""
+    old_nodes = {n["id"]: n for n in old.get("nodes", [])}
+    new_nodes = {n["id"]: n for n in new.get("nodes", [])}
+
+    nodes = {
+        "add": [n for nid, n in new_nodes.items() if nid not in old_nodes],
+        "remove": [nid for nid in old_nodes if nid not in new_nodes],
+        "change": {},
+    }
+    for nid, node in new_nodes.items():
+        if nid in old_nodes:
+            d = diff_value(old_nodes[nid], node)
+            if d is not None:
+                nodes["change"][nid] = d
+
+    old_edges = list(old.get("edges", []))
+    new_edges = list(new.get("edges", []))
+    remaining = list(old_edges)
+    added = []
+    for e in new_edges:
+        if e in remaining:
+            remaining.remove(e)
+        else:
+            added.append(e)
+    edges = {"add": added, "remove": remaining}
+
+    other_old = {k: v for k, v in old.items() if k not in ("nodes", "edges")}
+    other_new = {k: v for k, v in new.items() if k not in ("nodes", "edges")}
+    return {"nodes": nodes, "edges": edges, "meta": diff_value(other_old, other_new)}
+
+def apply_graph(old, delta):
+    removed = set(delta["nodes"]["remove"])
+    changes = delta["nodes"]["change"]
+    nodes = [
+        apply_value(n, changes.get(n["id"]))
+        for n in old.get("nodes", []) if n["id"] not in removed
+    ]
+    nodes.extend(copy.deepcopy(delta["nodes"]["add"]))
+
+    edges = list(old.get("edges", []))
+    for e in delta["edges"]["remove"]:
+        edges.remove(e)
+    edges.extend(copy.deepcopy(delta["edges"]["add"]))
+
+    meta = apply_value({k: v for k, v in old.items() if k not in ("nodes", "edges")}, delta["meta"])
+    graph = dict(meta)
+    if "nodes" in old or nodes:
+        graph["nodes"] = nodes
+    if "edges" in old or edges:
+        graph["edges"] = copy.deepcopy(edges)
+    return graph
+
+
+def make_delta(old_graph, new_graph, old_result, new_result):
+    """
+    Delta from one preset version to the next. Parts that can't be replayed
+    exactly (e.g. reordered nodes) are stored whole.
+    """
+    graph_delta = {"structural": diff_graph(old_graph, new_graph)}
+    try:
+        ok = apply_graph(old_graph, graph_delta["structural"]) == new_graph
+    except (KeyError, ValueError, TypeError):
+        ok = False
+    if not ok:
+        graph_delta = {"set": new_graph}
+
+    return {"graph": graph_delta, "result": diff_value(old_result, new_result)}
+
+def apply_delta(old_graph, old_result, delta):
+    graph_delta = delta["graph"]
+    if "set" in graph_delta:
+        graph = copy.deepcopy(graph_delta["set"])
+    else:
+        graph = apply_graph(old_graph, graph_delta["structural"])
+    return graph, apply_value(old_result, delta["result"])
@@ -1,54 +1,277 @@
 import os
-import json
+import re
+import copy
+import shutil
+import threading
+from collections import Counter, OrderedDict
 from datetime import datetime
 import hashlib
 
+from app import serialization
+from app.services import blob_store
+from app.services.preset_delta import make_delta, apply_delta, diff_graph
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
 # Directory to store presets
 PRESET_DIR = "app/presets"
 
+# A full snapshot is written after this many deltas in a row, bounding how many
+# deltas a load has to replay
+REBASE_EVERY = int(os.environ.get("PRESET_REBASE_EVERY", 8))
+# ...or as soon as a delta stops being much smaller than a snapshot
+REBASE_SIZE_RATIO = 0.5
+
 # Ensure the directory exists
 os.makedirs(PRESET_DIR, exist_ok=True)
 
+_lock = threading.Lock()
+# Latest reconstructed version per preset, so saving a new version doesn't replay deltas
+_latest = OrderedDict()
+_LATEST_CACHE_SIZE = 32
+
 def generate_preset_id(graph):
     """
     Generate a unique hash ID based on the graph content.
     Useful when no 'id' field is provided.
     """
-    raw = json.dumps(graph, sort_keys=True).encode("utf-8")
+    raw = blob_store.canonical_json(graph).encode("utf-8")
     return hashlib.sha256(raw).hexdigest()[:12]
 
+def _preset_dir(preset_name):
+    return os.path.join(PRESET_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", preset_name))
+
+def _index_path(preset_name):
+    return os.path.join(_preset_dir(preset_name), "index.json")
+
+def load_index(preset_name):
+    path = _index_path(preset_name)
+    if not os.path.exists(path):
+        return None
+    return serialization.load_file(path)
+
+class _PresetLock:
+    """Serialize writers to one preset across threads and processes."""
+
+    def __init__(self, preset_name):
+        self.path = os.path.join(_preset_dir(preset_name), ".lock")
+
+    def __enter__(self):
+        _lock.acquire()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.f = open(self.path, "w")
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+        _lock.release()
+
+def _remember(preset_name, entry, graph, result):
+    _latest[preset_name] = (entry, graph, result)
+    _latest.move_to_end(preset_name)
+    while len(_latest) > _LATEST_CACHE_SIZE:
+        _latest.popitem(last=False)
+
 def save_preset(graph, simulation_result, preset_name=None):
     """
-    Save the graph and its simulation result to a versioned JSON file.
+    Save the graph and its simulation result as the next version of a preset.
+    Versions are stored as a snapshot followed by compact deltas; returns the
+    new version's index entry.
     """
     graph_id = graph.get("id") or generate_preset_id(graph)
+    preset_name = preset_name or graph_id
     timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
-    filename = f"{preset_name or graph_id}_{timestamp}.json"
-    path = os.path.join(PRESET_DIR, filename)
 
-    preset_data = {
+    with _PresetLock(preset_name):
+        index = load_index(preset_name) or {"preset_name": preset_name, "graph_id": graph_id, "versions": []}
+        versions = index["versions"]
+        entry = {
+            "version": versions[-1]["version"] + 1 if versions else 1,
+            "timestamp": timestamp,
+            "graph_hash": generate_preset_id(graph),
+            "result_hash": generate_preset_id(simulation_result),
+        }
+
+        since_base = 0
+        for v in reversed(versions):
+            if v["kind"] == "base":
+                break
+            since_base += 1
+
+        if versions and since_base < REBASE_EVERY:
+            prev_graph, prev_result = _reconstruct(preset_name, index, versions[-1]["version"], use_cache=True)
+            delta = make_delta(prev_graph, graph, prev_result, simulation_result)
+            graph_delta_key = blob_store.put(delta["graph"])
+            result_delta_key = blob_store.put(delta["result"])
+
+            base = versions[-1 - since_base]
+            delta_size = blob_store.size(graph_delta_key) + blob_store.size(result_delta_key)
+            base_size = blob_store.size(base["graph_key"]) + blob_store.size(base["result_key"])
+            if delta_size < REBASE_SIZE_RATIO * base_size:
+                entry.update(kind="delta", graph_delta_key=graph_delta_key, result_delta_key=result_delta_key)
+
+        if "kind" not in entry:
+            entry.update(kind="base", graph_key=blob_store.put(graph), result_key=blob_store.put(simulation_result))
+
+        versions.append(entry)
+        serialization.dump_file(_index_path(preset_name), index, atomic=True)
+        # Copy so later edits by the caller can't corrupt the next diff
+        _remember(preset_name, entry, copy.deepcopy(graph), copy.deepcopy(simulation_result))
+
+    print(f"[✔] Preset saved: {preset_name} v{entry['version']} ({entry['kind']})")
+    return dict(entry, preset_name=preset_name)
+
+def _reconstruct(preset_name, index, version, include_result=True, use_cache=False):
+    versions = index["versions"]
+    pos = next((i for i, v in enumerate(versions) if v["version"] == version), None)
+    if pos is None:
+        raise KeyError(f"Preset {preset_name} has no version {version}")
+
+    # The cache is only used for diffing on save; loads get their own copies.
+    # It must match the index entry itself (hash, blob keys, timestamp), not just
+    # the version number: another process may have deleted and recreated the preset
+    cached = _latest.get(preset_name) if use_cache else None
+    if cached is not None and cached[0] == versions[pos]:
+        return cached[1], cached[2]
+    start = pos
+    while versions[start]["kind"] != "base":
+        start -= 1
+
+    base = versions[start]
+    graph = blob_store.get(base["graph_key"])
+    result = blob_store.get(base["result_key"]) if include_result else None
+    for v in versions[start + 1:pos + 1]:
+        if include_result:
+            graph, result = apply_delta(graph, result, {
+                "graph": blob_store.get(v["graph_delta_key"]),
+                "result": blob_store.get(v["result_delta_key"]),
+            })
+        else:
+            graph, _ = apply_delta(graph, None, {"graph": blob_store.get(v["graph_delta_key"]), "result": None})
+    return graph, result
+
+def load_preset(preset, version=None, include_result=True):
+    """
+    Load a preset by name (latest version unless one is given). Only the blobs
+    that are needed are read, so pass include_result=False when only the graph
+    is needed. A path to a pre-versioning preset file is also accepted.
+    """
+    if os.path.isfile(preset):
+        return _load_legacy(preset, include_result)
+
+    index = load_index(preset)
+    if index is None:
+        raise FileNotFoundError(f"No preset named {preset}")
+    entry = index["versions"][-1] if version is None else next(
+        (v for v in index["versions"] if v["version"] == version), None)
+    if entry is None:
+        raise KeyError(f"Preset {preset} has no version {version}")
+
+    graph, result = _reconstruct(preset, index, entry["version"], include_result)
+    loaded = {
         "graph": graph,
-        "result": simulation_result,
-        "graph_id": graph_id,
-        "timestamp": timestamp,
-        "preset_name": preset_name or "untitled"
+        "graph_id": index["graph_id"],
+        "preset_name": index["preset_name"],
+        "version": entry["version"],
+        "timestamp": entry["timestamp"],
     }
+    if include_result:
+        loaded["result"] = result
+    return loaded
+
+def _load_legacy(filepath, include_result):
+    preset = serialization.load_file(filepath)
 
-    with open(path, "w") as f:
-        json.dump(preset_data, f, indent=2)
+    # Presets written before the blob store hold everything inline
+    if "graph_key" not in preset:
+        if not include_result:
+            preset.pop("result", None)
+        return preset
 
-    print(f"[✔] Preset saved: {filename}")
-    return path
+    preset["graph"] = blob_store.get(preset["graph_key"])
+    if include_result:
+        preset["result"] = blob_store.get(preset["result_key"])
+    return preset
 
-def load_preset(filepath):
+def list_presets():
     """
-    Load a preset JSON file from disk.
+    List saved presets by name (one entry per preset, not per version).
     """
-    with open(filepath, "r") as f:
-        return json.load(f)
+    return [
+        d for d in os.listdir(PRESET_DIR)
+        if os.path.exists(os.path.join(PRESET_DIR, d, "index.json"))
+    ]
 
-def list_presets():
+def list_versions(preset_name):
+    index = load_index(preset_name)
+    return index["versions"] if index else []
+
+def graph_changes(preset_name, from_version, to_version):
+    """Node/edge diff between two versions of a preset's graph."""
+    old = load_preset(preset_name, from_version, include_result=False)["graph"]
+    new = load_preset(preset_name, to_version, include_result=False)["graph"]
+    return diff_graph(old, new)
+
+def delete_preset(preset_name):
+    """Remove a preset and all its versions; its blobs are freed by collect_garbage()."""
+    _latest.pop(preset_name, None)
+    path = _preset_dir(preset_name)
+    if os.path.exists(_index_path(preset_name)):
+        # Not while a save is writing its index. The lock file stays, so a save
+        # waiting on it still locks the same file; without index.json the
+        # directory is no longer listed as a preset
+        with _PresetLock(preset_name) as lock:
+            for name in os.listdir(path):
+                entry = os.path.join(path, name)
+                if entry == lock.path:
+                    continue
+                if os.path.isdir(entry):
+                    shutil.rmtree(entry)
+                else:
+                    os.remove(entry)
+        return True
+    legacy = os.path.join(PRESET_DIR, os.path.basename(preset_name))
+    if os.path.isfile(legacy):
+        os.remove(legacy)
+        return True
+    return False
+
+_KEY_FIELDS = ("graph_key", "result_key", "graph_delta_key", "result_delta_key")
+
+def reference_counts():
+    """
+    Number of preset versions referencing each blob key.
+    """
+    counts = Counter()
+    entries = []
+    for name in list_presets():
+        try:
+            entries.extend(load_index(name)["versions"])
+        except (OSError, ValueError):
+            continue
+    for fname in os.listdir(PRESET_DIR):
+        if fname.endswith(".json"):
+            try:
+                entries.append(serialization.load_file(os.path.join(PRESET_DIR, fname)))
+            except (OSError, ValueError):
+                continue
+    for entry in entries:
+        for field in _KEY_FIELDS:
+            if field in entry:
+                counts[entry[field]] += 1
+    return counts
+
+def collect_garbage(extra_live_keys=(), grace_seconds=blob_store.GC_GRACE_SECONDS):
     """
-    List all saved preset files in the preset directory.
+    Delete blobs referenced by no preset version and not in extra_live_keys
+    (e.g. graphs owned by the model registry). Returns the number removed.
     """
-    return [f for f in os.listdir(PRESET_DIR) if f.endswith(".json")]
+    live = set(reference_counts()) | set(extra_live_keys)
+    return blob_store.collect_garbage(live, grace_seconds=grace_seconds)
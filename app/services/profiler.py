@@ -0,0 +1,298 @@
+import os
+import re
+import sys
+import time
+import hmac
+import uuid
+import random
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import Blueprint, abort, current_app, g, jsonify, request, Response
+
+from app import serialization
+
+# Statistical profiles of single requests / simulations, stored as collapsed stacks:
+#   <PROFILE_DIR>/<profile_id>.collapsed   "frame;frame;frame <samples>" per line
+#   <PROFILE_DIR>/<profile_id>.json        route, duration, sample count, ...
+# A single sampler thread wakes every PROFILE_INTERVAL_MS and records the stack
+# of each profiled thread. The profiled code itself runs untouched, so the cost
+# is bounded by the sampling rate and PROFILE_MAX_ACTIVE, not by what it does.
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "./profiles")
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 10))
+# Profiles running at once in this process; requests over the limit are not profiled
+PROFILE_MAX_ACTIVE = int(os.environ.get("PROFILE_MAX_ACTIVE", 2))
+# Profiles kept on disk; the oldest are deleted
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 200))
+# Fraction of run_simulation calls profiled when not already inside a profiled request
+PROFILE_SIMULATION_RATE = float(os.environ.get("PROFILE_SIMULATION_RATE", 0.0))
+MAX_STACK_DEPTH = 128
+
+PROFILE_HEADER = "X-Profile"
+
+os.makedirs(PROFILE_DIR, exist_ok=True)
+
+
+class Profile:
+    def __init__(self, name):
+        self.id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        # Set by instrumented code (e.g. "plugin:dense" while a node runs); shown as
+        # a frame under the function that set it, see sample()
+        self.tag = None
+        self.tag_code = None
+        self.started = time.perf_counter()
+        self.sampler_seconds = 0.0
+
+    def set_tag(self, tag, code=None):
+        self.tag = tag
+        self.tag_code = code
+
+    def sample(self, frame):
+        frames = []
+        while frame is not None and len(frames) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            if self.tag is not None and code is self.tag_code:
+                frames[-1:] = [f"[{self.tag}]", frames[-1]]
+            frame = frame.f_back
+        frames.append(self.name)
+        self.stacks[";".join(reversed(frames))] += 1
+
+
+class _Sampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}   # thread id -> Profile
+        self._thread = None
+        self._wake = threading.Event()
+
+    def current(self):
+        return self._active.get(threading.get_ident())
+
+    def start(self, name):
+        """Start profiling the calling thread. None if it already is, or too many profiles are running."""
+        with self._lock:
+            tid = threading.get_ident()
+            if tid in self._active or len(self._active) >= PROFILE_MAX_ACTIVE:
+                return None
+            prof = self._active[tid] = Profile(name)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+            self._wake.set()
+            return prof
+
+    def stop(self, prof):
+        with self._lock:
+            self._active.pop(prof.thread_id, None)
+        prof.duration = time.perf_counter() - prof.started
+        return prof
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while True:
+            with self._lock:
+                idle = not self._active
+                if idle:
+                    self._wake.clear()
+            if idle:
+                # Sleep until the next profile starts
+                self._wake.wait()
+                continue
+            time.sleep(interval)
+            started = time.perf_counter()
+            frames = sys._current_frames()
+            for tid, prof in list(self._active.items()):
+                frame = frames.get(tid)
+                if frame is not None:
+                    prof.sample(frame)
+            spent = time.perf_counter() - started
+            for prof in list(self._active.values()):
+                prof.sampler_seconds += spent
+
+
+_sampler = _Sampler()
+
+
+def current():
+    """The profile of the calling thread, or None."""
+    return _sampler.current()
+
+def start(name):
+    return _sampler.start(name)
+
+def stop(prof, **meta):
+    """Stop a profile and save it. Returns its metadata."""
+    _sampler.stop(prof)
+    info = dict(
+        meta,
+        id=prof.id,
+        name=prof.name,
+        duration_ms=round(prof.duration * 1000, 2),
+        samples=sum(prof.stacks.values()),
+        interval_ms=PROFILE_INTERVAL_MS,
+        sampler_ms=round(prof.sampler_seconds * 1000, 2),
+    )
+    save(prof, info)
+    return info
+
+@contextmanager
+def profile(name, sample_rate):
+    """Profile the with-block with probability sample_rate, unless the thread is already being profiled."""
+    prof = None
+    if current() is None and sample_rate > 0 and random.random() < sample_rate:
+        prof = start(name)
+    try:
+        yield prof
+    finally:
+        if prof is not None:
+            stop(prof)
+
+
+# ---- storage ----
+
+def _path(profile_id, ext):
+    # Profile ids come from URLs; never let one point outside PROFILE_DIR
+    return os.path.join(PROFILE_DIR, re.sub(r"[^A-Za-z0-9-]", "", profile_id) + ext)
+
+def save(prof, info):
+    lines = "".join(f"{stack} {count}\n" for stack, count in prof.stacks.most_common())
+    tmp_path = _path(prof.id, ".collapsed") + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(lines)
+    os.replace(tmp_path, _path(prof.id, ".collapsed"))
+    serialization.dump_file(_path(prof.id, ".json"), info, atomic=True)
+    prune()
+
+def prune(keep=None):
+    keep = PROFILE_KEEP if keep is None else keep
+    ids = sorted(e.name[:-5] for e in os.scandir(PROFILE_DIR) if e.name.endswith(".json"))
+    for profile_id in ids[:max(0, len(ids) - keep)]:
+        for ext in (".json", ".collapsed"):
+            try:
+                os.remove(_path(profile_id, ext))
+            except OSError:
+                pass
+
+def list_profiles(limit=50):
+    """Metadata of the most recent profiles, newest first."""
+    ids = sorted((e.name[:-5] for e in os.scandir(PROFILE_DIR) if e.name.endswith(".json")), reverse=True)
+    out = []
+    for profile_id in ids[:limit]:
+        try:
+            out.append(serialization.load_file(_path(profile_id, ".json")))
+        except (OSError, ValueError):
+            continue
+    return out
+
+def load_collapsed(profile_id):
+    """The collapsed stacks text of a profile, or None if it doesn't exist."""
+    try:
+        with open(_path(profile_id, ".collapsed"), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def to_speedscope(collapsed, name):
+    """Convert collapsed stacks to a speedscope "sampled" profile (https://www.speedscope.app)."""
+    frames, index = [], {}
+    samples, weights = [], []
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        ids = []
+        for frame in stack.split(";"):
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame})
+            ids.append(index[frame])
+        samples.append(ids)
+        weights.append(int(count))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "none",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "name": name,
+        "exporter": "ai-notes profiler",
+    }
+
+
+# ---- Flask integration ----
+
+def _token_matches():
+    token = current_app.config.get("PROFILE_TOKEN")
+    sent = request.headers.get(PROFILE_HEADER)
+    return bool(token) and sent is not None and hmac.compare_digest(sent.encode(), token.encode())
+
+def _wants_profile():
+    # Reading profiles sends the token too; don't profile (and evict real profiles for) that
+    if request.blueprint == profiles_bp.name:
+        return False
+    if _token_matches():
+        return True
+    rate = current_app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+    return rate > 0 and random.random() < rate
+
+def _before_request():
+    if _wants_profile():
+        g._profile = start(f"{request.method} {request.path}")
+
+def _after_request(response):
+    prof = g.get("_profile")
+    if prof is not None:
+        response.headers["X-Profile-Id"] = prof.id
+    return response
+
+def _teardown_request(exc):
+    prof = g.pop("_profile", None)
+    if prof is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else None
+        stop(prof, method=request.method, path=request.path, route=rule, error=str(exc) if exc else None)
+
+
+profiles_bp = Blueprint("profiles", __name__)
+
+@profiles_bp.before_request
+def _require_token():
+    token = current_app.config.get("PROFILE_TOKEN")
+    if not token:
+        abort(404)
+    if not _token_matches():
+        abort(403, "Missing or wrong profiling token")
+
+@profiles_bp.route("", methods=["GET"])
+def get_profiles():
+    limit = request.args.get("limit", default=50, type=int)
+    return jsonify({"status": "success", "data": list_profiles(limit)}), 200
+
+@profiles_bp.route("/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """?format=collapsed (default, for flamegraph.pl / speedscope import) or ?format=speedscope."""
+    collapsed = load_collapsed(profile_id)
+    if collapsed is None:
+        abort(404, "Profile not found")
+    if request.args.get("format") == "speedscope":
+        return jsonify(to_speedscope(collapsed, profile_id)), 200
+    return Response(collapsed, mimetype="text/plain")
+
+
+def init_app(app):
+    """Profile sampled requests (PROFILE_SAMPLE_RATE, or the X-Profile header) and serve them under /admin/profiles."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.register_blueprint(profiles_bp, url_prefix="/admin/profiles")
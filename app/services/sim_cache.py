@@ -0,0 +1,96 @@
+import os
+import zlib
+import threading
+
+from app import serialization
+from app.services import datasets, metrics
+from app.services.plugin_loader import PLUGIN_REGISTRY
+from app.services.preset_manager import generate_preset_id
+
+# On-disk cache of run_simulation results
+SIM_CACHE_DIR = os.environ.get("SIM_CACHE_DIR", "./sim_cache")
+SIM_CACHE_MAX_BYTES = int(os.environ.get("SIM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+os.makedirs(SIM_CACHE_DIR, exist_ok=True)
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def cache_key(graph, dataset_name, timesteps, batch_size=1):
+    """
+    Graph hash + dataset (name and file fingerprint) + timesteps + a fingerprint
+    of each plugin the graph uses, so editing one plugin only invalidates graphs
+    that contain it, and editing a dataset only the runs that read it.
+    """
+    types = sorted({n["type"] for n in graph["nodes"]})
+    return generate_preset_id({
+        "graph": generate_preset_id(graph),
+        "dataset": dataset_name,
+        "dataset_version": datasets.fingerprint(dataset_name),
+        "timesteps": timesteps,
+        "batch_size": batch_size,
+        "plugins": PLUGIN_REGISTRY.code_hashes(types),
+    })
+
+def _path(key):
+    return os.path.join(SIM_CACHE_DIR, f"{key}.json.z")
+
+
+def get(key):
+    """Return the cached result or None. A hit marks the entry as recently used."""
+    path = _path(key)
+    try:
+        with open(path, "rb") as f:
+            result = serialization.loads(zlib.decompress(f.read()))
+        os.utime(path)
+    except (FileNotFoundError, zlib.error, ValueError):
+        _stats["misses"] += 1
+        metrics.cache_lookup("simulation", False)
+        return None
+    _stats["hits"] += 1
+    metrics.cache_lookup("simulation", True)
+    return result
+
+def put(key, result):
+    data = zlib.compress(serialization.dumps(result), 6)
+    path = _path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    evict()
+
+def evict(max_bytes=None):
+    """Drop least recently used entries until the cache fits in max_bytes."""
+    max_bytes = SIM_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _lock:
+        entries = []
+        total = 0
+        for entry in os.scandir(SIM_CACHE_DIR):
+            if entry.name.endswith(".json.z"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total <= max_bytes:
+            return 0
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+def clear():
+    for entry in os.scandir(SIM_CACHE_DIR):
+        if entry.name.endswith(".json.z"):
+            os.remove(entry.path)
+
+def stats():
+    return dict(_stats)
@@ -0,0 +1,17 @@
+# Gunicorn settings; picked up automatically when gunicorn runs from this directory.
+import os
+import shutil
+
+# Workers share Prometheus metrics through files in this directory (see app/services/metrics.py).
+# It must be set before the app is imported in the workers, and be empty when the server starts.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def on_starting(server):
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def child_exit(server, worker):
+    from app.services import metrics
+    metrics.mark_process_dead(worker.pid)
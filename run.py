@@ -1,7 +1,9 @@
 # run.py
 from app import create_app
 
-app = create_app()
+# Plugin sandbox workers (spawn/forkserver) re-import this file as __mp_main__; they don't need an app
+if __name__ != "__mp_main__":
+    app = create_app()
 
 
 
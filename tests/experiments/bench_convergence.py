@@ -0,0 +1,161 @@
+"""
+Convergence with and without padding masks: epochs (and seconds) until greedy
+decoding reaches a target ROUGE-1 on a fixed synthetic corpus.
+
+    unmasked        padding embedded and scored like any token (the old pipeline)
+    masked          mask_zero embeddings, loss and token accuracy over real tokens only
+    masked+buckets  masked, with length-bucketed batches trimmed to their bucket's length
+
+Run from the repo root:
+    python tests/experiments/bench_convergence.py [--epochs 30] [--target 0.6] [--out results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, "..", "..")))
+sys.path.insert(0, HERE)
+
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback
+from tensorflow.keras.optimizers import Adam
+
+from app.models import training_text_summarization as training
+from bench_training import make_arrays, make_corpus
+from payloads import SEED
+
+# (name, mask_zero, bucket_boundaries)
+CONFIGS = [
+    ("unmasked", False, None),
+    ("masked", True, None),
+    ("masked+buckets", True, training.BUCKET_BOUNDARIES),
+]
+
+
+def make_varied_corpus(n, vocab, seed=SEED):
+    """make_corpus notes cut to random lengths, so batches mix short and long inputs."""
+    rng = random.Random(seed)
+    texts, _ = make_corpus(n, vocab, seed)
+    texts = [" ".join(t.split()[:rng.randint(6, training.max_length_input)]) for t in texts]
+    summaries = [f"<start> {' '.join(t.split()[:8])} <end>" for t in texts]
+    return texts, summaries
+
+
+class EpochLog(Callback):
+    """
+    Collects per-epoch training seconds (up to the last batch, so not the ROUGE
+    decoding) and logs; stops once val_rouge1 reaches the target.
+    """
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = self.last_batch = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.last_batch = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        self.epochs.append({
+            "seconds": self.last_batch - self.start,
+            "loss": float(logs.get("loss", 0.0)),
+            "rouge1": float(logs.get("val_rouge1", 0.0)),
+        })
+        if logs.get("val_rouge1", 0.0) >= self.target:
+            self.model.stop_training = True
+
+
+def run(mask_zero, buckets, train, val, vs_in, vs_tgt, tok_tgt, args):
+    enc, dec_in, dec_tgt = train
+    tf.keras.utils.set_random_seed(args.seed)
+    if mask_zero:
+        train_ds, steps = training.make_train_dataset(
+            enc, dec_in, dec_tgt, args.batch_size, bucket_boundaries=buckets, seed=args.seed)
+        if buckets:
+            model = training.build_seq2seq_model(vs_in, vs_tgt, args.emb_dim, None, None, mask_zero=True)
+        else:
+            model = training.build_seq2seq_model(
+                vs_in, vs_tgt, args.emb_dim, training.max_length_input, training.max_length_target, mask_zero=True)
+    else:
+        train_ds = (
+            tf.data.Dataset.from_tensor_slices(((enc, dec_in), dec_tgt))
+            .shuffle(len(enc), seed=args.seed)
+            .batch(args.batch_size, drop_remainder=True)
+            .repeat()
+            .prefetch(tf.data.AUTOTUNE)
+        )
+        steps = len(enc) // args.batch_size
+        model = training.build_seq2seq_model(
+            vs_in, vs_tgt, args.emb_dim, training.max_length_input, training.max_length_target, mask_zero=False)
+    model.compile(optimizer=Adam(args.lr), loss="sparse_categorical_crossentropy")
+
+    val_enc, val_dec_in, val_dec_tgt = val
+    rouge_ds = tf.data.Dataset.from_tensor_slices(((val_enc, val_dec_in), val_dec_tgt)).batch(len(val_enc))
+    rouge_cb = training.RougeCallback(rouge_ds, tok_tgt, training.max_length_target, len(val_enc))
+    log_cb = EpochLog(args.target)
+    model.fit(train_ds, epochs=args.epochs, steps_per_epoch=steps, callbacks=[rouge_cb, log_cb], verbose=0)
+
+    reached = next((i + 1 for i, e in enumerate(log_cb.epochs) if e["rouge1"] >= args.target), None)
+    # Epoch 1 includes tracing; the rest is the steady-state cost of an epoch
+    steady = [e["seconds"] for e in log_cb.epochs[1:]] or [log_cb.epochs[0]["seconds"]]
+    return {
+        "epochs_to_target": reached,
+        "seconds_to_target": sum(e["seconds"] for e in log_cb.epochs[:reached]) if reached else None,
+        "seconds_per_epoch": sum(steady) / len(steady),
+        "best_rouge1": max(e["rouge1"] for e in log_cb.epochs),
+        "epochs": log_cb.epochs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--examples", type=int, default=2000)
+    parser.add_argument("--val-examples", type=int, default=200)
+    parser.add_argument("--vocab", type=int, default=100,
+                        help="synthetic terms mixed into the notes; small enough that the copy task is learnable")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--emb-dim", type=int, default=50)
+    parser.add_argument("--lr", type=float, default=3e-3,
+                        help="higher than train_model's 5e-5 so runs finish in minutes")
+    parser.add_argument("--epochs", type=int, default=30, help="give up after this many epochs")
+    parser.add_argument("--target", type=float, default=0.6, help="validation ROUGE-1 F1 to reach")
+    parser.add_argument("--seed", type=int, default=SEED, help="corpus and initialization seed")
+    parser.add_argument("--only", default=None, help="run configurations whose name contains this string")
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    texts, summaries = make_varied_corpus(args.examples + args.val_examples, args.vocab, args.seed)
+    (enc, dec_in, dec_tgt), vs_in, vs_tgt = make_arrays(texts, summaries)
+    tok_tgt = training.create_tokenizer(summaries, add_special_tokens=True)
+    split = args.examples
+    train = (enc[:split], dec_in[:split], dec_tgt[:split])
+    val = (enc[split:], dec_in[split:], dec_tgt[split:])
+    print(f"examples={args.examples}, vocab={vs_in}/{vs_tgt}, target ROUGE-1={args.target}")
+
+    results = {"target_rouge1": args.target, "lr": args.lr, "seed": args.seed, "batch_size": args.batch_size, "configs": {}}
+    for name, mask_zero, buckets in CONFIGS:
+        if args.only and args.only not in name:
+            continue
+        stats = run(mask_zero, buckets, train, val, vs_in, vs_tgt, tok_tgt, args)
+        results["configs"][name] = stats
+        reached = stats["epochs_to_target"] or f">{args.epochs}"
+        print(f"{name:<16} epochs to target: {reached:>4}  best ROUGE-1: {stats['best_rouge1']:.3f}  "
+              f"{stats['seconds_per_epoch']:.1f}s/epoch")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Multi-worker scaling: training throughput with 1, 2 and 4 local worker
+processes under MultiWorkerMirroredStrategy (one TF_CONFIG per process, ports
+on localhost), same global batch and seeded synthetic corpus. The CPU cores
+are split evenly between the workers, so on one host this measures the
+all-reduce and sharding overhead; on separate hosts the same script's worker
+mode is what each node runs.
+
+Run from the repo root:
+    python tests/experiments/bench_distributed.py [--workers 1,2,4] [--steps 30] [--out results.json]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, "..", ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+
+def free_ports(n):
+    socks = [socket.socket() for _ in range(n)]
+    for s in socks:
+        s.bind(("localhost", 0))
+    ports = [s.getsockname()[1] for s in socks]
+    for s in socks:
+        s.close()
+    return ports
+
+
+def run_worker(args):
+    """One worker process: TF_CONFIG is already set by the launcher."""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+    tf.config.threading.set_inter_op_parallelism_threads(args.threads)
+
+    from app.models import training_distribute
+    from app.models import training_text_summarization as training
+    from app.models.training_loop import CustomTrainer
+    from bench_training import make_arrays, make_corpus
+    from payloads import SEED
+
+    strategy = training_distribute.make_strategy("multi_worker")
+    (enc, dec_in, dec_tgt), vs_in, vs_tgt = make_arrays(*make_corpus(args.examples, args.vocab))
+    train_ds, _, _, _ = training.make_distributed_datasets(
+        strategy, (enc, dec_in, dec_tgt), (enc[:64], dec_in[:64], dec_tgt[:64]), args.batch_size)
+    with strategy.scope():
+        tf.keras.utils.set_random_seed(SEED)
+        model = training.build_seq2seq_model(vs_in, vs_tgt, args.emb_dim, None, None)
+        optimizer = training.make_optimizer()
+    trainer = CustomTrainer(model, optimizer, strategy=strategy)
+
+    iterator = iter(trainer._distribute(train_ds))
+    for _ in range(args.warmup):
+        trainer._execution_fn(iterator)
+    float(trainer._loss_sum.read_value())  # all-reduced: waits for every worker
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        trainer._execution_fn(iterator)
+    float(trainer._loss_sum.read_value())
+    seconds = time.perf_counter() - start
+
+    if training_distribute.is_chief(strategy):
+        with open(args.result, "w") as f:
+            json.dump({"seconds": seconds, "steps": args.steps,
+                       "examples_per_sec": args.steps * args.batch_size / seconds}, f)
+
+
+def launch(workers, args):
+    """Run `workers` local worker processes to completion; returns the chief's result."""
+    ports = free_ports(workers)
+    cluster = {"worker": [f"localhost:{p}" for p in ports]}
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    result = os.path.join(tempfile.mkdtemp(), "result.json")
+    procs = []
+    for index in range(workers):
+        env = dict(os.environ, TF_CONFIG=json.dumps({"cluster": cluster, "task": {"type": "worker", "index": index}}))
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--threads", str(threads), "--result", result,
+               "--examples", str(args.examples), "--vocab", str(args.vocab), "--batch-size", str(args.batch_size),
+               "--emb-dim", str(args.emb_dim), "--steps", str(args.steps), "--warmup", str(args.warmup)]
+        procs.append(subprocess.Popen(cmd, env=env, cwd=ROOT))
+    codes = [p.wait() for p in procs]
+    if any(codes):
+        raise RuntimeError(f"{workers} workers: exit codes {codes}")
+    with open(result) as f:
+        return dict(json.load(f), threads_per_worker=threads)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--examples", type=int, default=4000)
+    parser.add_argument("--vocab", type=int, default=5000, help="synthetic terms mixed into the notes")
+    parser.add_argument("--batch-size", type=int, default=64, help="global batch, split over the workers")
+    parser.add_argument("--emb-dim", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=30, help="timed steps per configuration")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed steps (tracing, XLA compilation)")
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    # Internal: set by the launcher for each worker process
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--threads", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = {"batch_size": args.batch_size, "cpus": os.cpu_count(), "workers": {}}
+    for workers in (int(w) for w in args.workers.split(",")):
+        stats = launch(workers, args)
+        results["workers"][workers] = stats
+        print(f"{workers} worker(s) x {stats['threads_per_worker']} threads: "
+              f"{stats['examples_per_sec']:9.1f} examples/sec")
+
+    base = results["workers"].get(1)
+    if base:
+        for workers, stats in results["workers"].items():
+            speedup = stats["examples_per_sec"] / base["examples_per_sec"]
+            print(f"{workers} worker(s): {speedup:5.2f}x speedup, {speedup / workers:6.1%} scaling efficiency")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
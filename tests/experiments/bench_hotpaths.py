@@ -0,0 +1,246 @@
+"""
+Micro-benchmarks for the hot paths: summarize_lstm, run_simulation,
+topological_sort, preprocess_texts and clean_text.
+
+Every fixture is synthetic and seeded (a randomly initialized small
+build_seq2seq_model, random DAGs of 10 to 10k nodes, generated note corpora),
+so the suite runs offline on CPU and two runs on the same machine are
+comparable. Each benchmark reports the best and median time per call, plus the
+peak Python heap (tracemalloc) and RSS growth of one extra call.
+
+Run from the repo root:
+    python tests/experiments/bench_hotpaths.py [--only simulation] [--out bench_hotpaths.json]
+                                               [--baseline previous.json] [--tolerance 0.15]
+
+With --baseline, benchmarks more than --tolerance slower than the baseline are
+listed and the exit status is 1, so the script can gate a CI job.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from datetime import datetime
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.abspath(os.path.join(HERE, "..", ".."))
+sys.path.insert(0, REPO)
+sys.path.insert(0, HERE)
+
+import psutil
+
+from payloads import SEED, make_graph, make_note
+
+GRAPH_SIZES = (10, 100, 1000, 10000)
+# run_simulation gathers inputs by scanning every edge for every node, so very
+# large graphs take minutes per call; raise --sim-max-nodes to include them
+SIM_MAX_NODES = 1000
+SIM_TIMESTEPS = 5
+CORPUS_SIZE = 200
+MAX_INPUT_LEN = 50
+MAX_TARGET_LEN = 20
+VOCAB_SIZE = 2000
+EMB_DIM = 32
+
+
+# ---- fixtures ----
+
+def make_corpus(n_notes, seed=SEED):
+    rng = random.Random(seed)
+    return [make_note(rng) for _ in range(n_notes)]
+
+def make_graphs(sizes, seed=SEED):
+    return {n: make_graph(random.Random(seed + n), n) for n in sizes}
+
+def make_tokenizer(corpus):
+    from tensorflow.keras.preprocessing.text import Tokenizer
+    tok = Tokenizer(num_words=VOCAB_SIZE, oov_token="<OOV>")
+    tok.fit_on_texts([f"<start> {t} <end>" for t in corpus])
+    return tok
+
+def make_summarizer(tokenizer):
+    """A small build_seq2seq_model with random weights, wrapped to take only the encoder input like the served model."""
+    import tensorflow as tf
+    from tensorflow.keras.mixed_precision import set_global_policy
+    from app.models import training_text_summarization as training
+    # Importing the training module switches Keras to mixed_float16 for GPU training; serve in float32
+    set_global_policy("float32")
+
+    tf.keras.utils.set_random_seed(SEED)
+    seq2seq = training.build_seq2seq_model(VOCAB_SIZE, VOCAB_SIZE, EMB_DIM, MAX_INPUT_LEN, MAX_TARGET_LEN)
+    enc = tf.keras.Input(shape=(MAX_INPUT_LEN,), name="enc_only")
+    dec = tf.keras.layers.Lambda(lambda x: tf.zeros_like(x[:, :MAX_TARGET_LEN]), name="empty_decoder")(enc)
+    model = tf.keras.Model(enc, seq2seq([enc, dec]))
+    return {"model": model, "tok_input": tokenizer, "tok_target": tokenizer}
+
+
+# ---- measurement ----
+
+def _rss():
+    return psutil.Process().memory_info().rss
+
+def measure(fn, repeat, min_seconds):
+    """Time fn, then call it once more under tracemalloc for its memory peak."""
+    fn()  # warm-up: first calls build TF functions and fill caches
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_seconds / 0.2))
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+    gc.collect()
+    rss_before = _rss()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "best_s": min(times),
+        "median_s": statistics.median(times),
+        "calls": number * repeat,
+        "peak_python_kb": round(peak / 1024, 1),
+        "rss_growth_kb": round(max(0, _rss() - rss_before) / 1024, 1),
+    }
+
+
+# ---- benchmarks ----
+
+def bench_clean_text(corpus):
+    from app.models.generate_training_data import clean_text
+    return {"clean_text[corpus]": lambda: [clean_text(t) for t in corpus]}
+
+def bench_preprocess_texts(corpus, tokenizer):
+    from app.models.training_text_summarization import preprocess_texts
+    return {
+        "preprocess_texts[1]": lambda: preprocess_texts(corpus[:1], tokenizer, MAX_INPUT_LEN, VOCAB_SIZE),
+        "preprocess_texts[corpus]": lambda: preprocess_texts(corpus, tokenizer, MAX_INPUT_LEN, VOCAB_SIZE),
+    }
+
+def bench_topological_sort(graphs):
+    from app.services.graph_simulator import topological_sort
+    out = {}
+    for n, graph in graphs.items():
+        nodes = {node["id"]: node for node in graph["nodes"]}
+        out[f"topological_sort[{n}]"] = lambda nodes=nodes, edges=graph["edges"]: topological_sort(nodes, edges)
+    return out
+
+def bench_run_simulation(graphs, max_nodes):
+    from app.services.graph_simulator import run_simulation
+    out = {}
+    for n, graph in graphs.items():
+        if n <= max_nodes:
+            # No dataset (input nodes use their constant) and no cache, so every call simulates
+            out[f"run_simulation[{n}x{SIM_TIMESTEPS}]"] = lambda graph=graph: run_simulation(
+                graph, "bench-no-dataset", timesteps=SIM_TIMESTEPS, use_cache=False)
+    return out
+
+def bench_summarize_lstm(corpus, summarizer):
+    from flask import Flask
+    from app.blueprints.notes import summarize_lstm
+    from app.services.model_handles import MODEL_HANDLES
+
+    app = Flask("bench")
+    app.config.update(MAX_INPUT_LEN=MAX_INPUT_LEN, MAX_TARGET_LEN=MAX_TARGET_LEN)
+    MODEL_HANDLES.register("summarizer", lambda: summarizer)
+    note = corpus[0]
+
+    def run():
+        with app.app_context():
+            return summarize_lstm(note)
+    return {"summarize_lstm[1]": run}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, tolerance):
+    """Print a comparison table; return the names of benchmarks slower than the baseline by more than tolerance."""
+    regressions = []
+    print(f"\n{'benchmark':<36} {'best ms':>10} {'was':>10} {'change':>8}")
+    for name, stats in results.items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if not old:
+            print(f"{name:<36} {stats['best_s'] * 1e3:>10.3f} {'-':>10} {'new':>8}")
+            continue
+        change = stats["best_s"] / old["best_s"] - 1
+        flag = " !" if change > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<36} {stats['best_s'] * 1e3:>10.3f} {old['best_s'] * 1e3:>10.3f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", default=None, help="run benchmarks whose name contains this string")
+    parser.add_argument("--sim-max-nodes", type=int, default=SIM_MAX_NODES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="minimum time per repeat")
+    parser.add_argument("--out", default="bench_hotpaths.json", help="write results as JSON to this path")
+    parser.add_argument("--baseline", default=None, help="previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    # Keep simulator storage (sim cache, presets) out of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="bench-"))
+
+    corpus = make_corpus(CORPUS_SIZE)
+    graphs = make_graphs(GRAPH_SIZES)
+    tokenizer = make_tokenizer(corpus)
+
+    suites = {
+        "clean_text": lambda: bench_clean_text(corpus),
+        "preprocess_texts": lambda: bench_preprocess_texts(corpus, tokenizer),
+        "topological_sort": lambda: bench_topological_sort(graphs),
+        "run_simulation": lambda: bench_run_simulation(graphs, args.sim_max_nodes),
+        "summarize_lstm": lambda: bench_summarize_lstm(corpus, make_summarizer(tokenizer)),
+    }
+    results = {}
+    for suite, build in suites.items():
+        if args.only and args.only not in suite:
+            continue
+        for name, fn in build().items():
+            stats = measure(fn, args.repeat, args.min_seconds)
+            results[name] = stats
+            print(f"{name:<36} {stats['best_s'] * 1e3:10.3f} ms  (median {stats['median_s'] * 1e3:.3f})  "
+                  f"peak {stats['peak_python_kb']:.0f} KiB")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().strftime("%Y%m%dT%H%M%S"),
+            "commit": git_commit(),
+            "seed": SEED,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "benchmarks": results,
+    }
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"[✔] Results written to {out}")
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"[Error] {len(regressions)} benchmark(s) slower than baseline by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Round-trip benchmark: stdlib json (the previous code paths) vs app.serialization.
+
+Run from the repo root:
+    python tests/experiments/bench_serialization.py [--nodes 200] [--timesteps 10] [--out results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app import serialization
+
+
+def make_graph(n_nodes):
+    nodes = [{"id": "in0", "type": "input", "params": {"value": 1.0}}]
+    edges = []
+    for i in range(1, n_nodes):
+        nodes.append({"id": f"n{i}", "type": "dense", "params": {"weight": 0.5, "bias": 0.1}})
+        edges.append({"from": nodes[i - 1]["id"], "to": f"n{i}"})
+    return {"id": "bench", "nodes": nodes, "edges": edges}
+
+def make_log(graph, timesteps):
+    logs = []
+    for t in range(timesteps):
+        node_logs = {
+            n["id"]: {
+                "inputs": {"x": {"value": t * 0.5}},
+                "outputs": {"value": t * 0.25 + i},
+                "state": {"h_t": 0.1 * i, "c_t": 0.2 * i},
+                "success": True,
+            }
+            for i, n in enumerate(graph["nodes"])
+        }
+        logs.append({"timestep": t, "node_logs": node_logs})
+    return {"graph_id": graph["id"], "dataset_name": "bench", "timesteps": timesteps, "logs": logs}
+
+
+def bench(label, fn, number):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"{label:<40} {seconds * 1e3:9.3f} ms")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--timesteps", type=int, default=10)
+    parser.add_argument("--number", type=int, default=20)
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    graph = make_graph(args.nodes)
+    log = make_log(graph, args.timesteps)
+    preset = {"graph": graph, "result": log, "graph_id": "bench", "timestamp": "20250101T000000", "preset_name": "bench"}
+
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "roundtrip.json")
+
+    def stdlib_log():
+        with open(path, "w") as f:
+            json.dump(log, f)
+        with open(path, "r") as f:
+            json.load(f)
+
+    def stdlib_preset():
+        # save_preset used indent=2 before this change
+        with open(path, "w") as f:
+            json.dump(preset, f, indent=2)
+        with open(path, "r") as f:
+            json.load(f)
+
+    def fast_log():
+        serialization.dump_file(path, log)
+        serialization.load_log(path)
+
+    def fast_preset():
+        serialization.dump_file(path, preset)
+        serialization.load_file(path)
+
+    print(f"backend: {serialization.BACKEND}, nodes={args.nodes}, timesteps={args.timesteps}")
+    results = {
+        "backend": serialization.BACKEND,
+        "nodes": args.nodes,
+        "timesteps": args.timesteps,
+        "log_stdlib_s": bench("log round-trip (stdlib json)", stdlib_log, args.number),
+        "log_fast_s": bench(f"log round-trip ({serialization.BACKEND}, validated)", fast_log, args.number),
+        "preset_stdlib_s": bench("preset round-trip (stdlib json, indent=2)", stdlib_preset, args.number),
+        "preset_fast_s": bench(f"preset round-trip ({serialization.BACKEND})", fast_preset, args.number),
+    }
+    print(f"log speedup:    {results['log_stdlib_s'] / results['log_fast_s']:.1f}x")
+    print(f"preset speedup: {results['preset_stdlib_s'] / results['preset_fast_s']:.1f}x")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
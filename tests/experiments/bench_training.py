@@ -0,0 +1,145 @@
+"""
+Training throughput: model.fit (as train_model runs it) vs the custom loop in
+app/models/training_loop.py with XLA, steps-per-execution and gradient
+accumulation, on a seeded synthetic corpus.
+
+Run from the repo root:
+    python tests/experiments/bench_training.py [--batch-size 64] [--steps 40] [--out results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, "..", "..")))
+sys.path.insert(0, HERE)
+
+import tensorflow as tf
+
+from app.models import training_text_summarization as training
+from app.models.training_loop import CustomTrainer
+from payloads import SEED, make_note
+
+# (name, loop, options)
+CONFIGS = [
+    ("fit", "fit", {}),
+    ("custom", "custom", {"jit_compile": False}),
+    ("custom+xla", "custom", {"jit_compile": True}),
+    ("custom+xla+spe8", "custom", {"jit_compile": True, "steps_per_execution": 8}),
+    ("custom+xla+accum4", "custom", {"jit_compile": True, "accum_steps": 4}),
+]
+
+
+def make_corpus(n, vocab=5000, seed=SEED):
+    """
+    Notes whose summary is their first words, so the task is learnable. A third
+    of the words are replaced by log-uniformly drawn terms, giving a vocabulary
+    (and softmax) closer to the real corpus than the notes' own few dozen words.
+    """
+    rng = random.Random(seed)
+
+    def word(w):
+        return f"term{int(vocab ** rng.random())}" if rng.random() < 0.33 else w
+    texts = [" ".join(word(w) for w in make_note(rng).split()[:training.max_length_input]) for _ in range(n)]
+    summaries = [f"<start> {' '.join(t.split()[:8])} <end>" for t in texts]
+    return texts, summaries
+
+def make_arrays(texts, summaries):
+    tok_in = training.create_tokenizer(texts, add_special_tokens=False)
+    tok_tgt = training.create_tokenizer(summaries, add_special_tokens=True)
+    vs_in = len(tok_in.word_index) + 1
+    vs_tgt = len(tok_tgt.word_index) + 1
+    enc = training.preprocess_texts(texts, tok_in, training.max_length_input, vs_in)
+    dec = training.preprocess_texts(summaries, tok_tgt, training.max_length_target, vs_tgt)
+    dec_in, dec_tgt = training.prepare_decoder_sequences(dec)
+    return (enc, dec_in, dec_tgt), vs_in, vs_tgt
+
+def make_dataset(arrays, batch_size):
+    enc, dec_in, dec_tgt = arrays
+    return (
+        tf.data.Dataset.from_tensor_slices(((enc, dec_in), dec_tgt))
+        .shuffle(len(enc), seed=SEED)
+        .batch(batch_size, drop_remainder=True)
+        .repeat()
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+def new_model(vs_in, vs_tgt, emb_dim):
+    tf.keras.utils.set_random_seed(SEED)
+    return training.build_seq2seq_model(vs_in, vs_tgt, emb_dim, training.max_length_input, training.max_length_target)
+
+
+def bench_fit(ds, model, steps, warmup):
+    model.compile(
+        optimizer=training.make_optimizer(),
+        loss="sparse_categorical_crossentropy",
+        metrics=[tf.keras.metrics.SparseCategoricalAccuracy(name="token_accuracy")],
+    )
+    model.fit(ds, epochs=1, steps_per_epoch=warmup, verbose=0)
+    start = time.perf_counter()
+    model.fit(ds, epochs=1, steps_per_epoch=steps, verbose=0)
+    return steps, time.perf_counter() - start
+
+def bench_custom(ds, model, steps, warmup, **options):
+    trainer = CustomTrainer(model, training.make_optimizer(), **options)
+    per_execution = trainer.accum_steps * trainer.steps_per_execution
+    iterator = iter(trainer.strategy.experimental_distribute_dataset(ds))
+    for _ in range(max(1, warmup // per_execution)):
+        trainer._execution_fn(iterator)
+    float(trainer._loss_sum.read_value())
+
+    executions = max(1, steps // per_execution)
+    start = time.perf_counter()
+    for _ in range(executions):
+        trainer._execution_fn(iterator)
+    float(trainer._loss_sum.read_value())  # wait for the last step
+    return executions * per_execution, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--examples", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--emb-dim", type=int, default=50)
+    parser.add_argument("--vocab", type=int, default=5000, help="synthetic terms mixed into the notes")
+    parser.add_argument("--steps", type=int, default=40, help="timed batches per configuration")
+    parser.add_argument("--warmup", type=int, default=8, help="untimed batches (tracing, XLA compilation)")
+    parser.add_argument("--only", default=None, help="run configurations whose name contains this string")
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    arrays, vs_in, vs_tgt = make_arrays(*make_corpus(args.examples, args.vocab))
+    ds = make_dataset(arrays, args.batch_size)
+    print(f"precision: {training.TRAIN_PRECISION}, batch_size={args.batch_size}, "
+          f"vocab={vs_in}/{vs_tgt}, threads={tf.config.threading.get_intra_op_parallelism_threads() or os.cpu_count()}")
+
+    results = {"precision": training.TRAIN_PRECISION, "batch_size": args.batch_size, "configs": {}}
+    for name, loop, options in CONFIGS:
+        if args.only and args.only not in name:
+            continue
+        model = new_model(vs_in, vs_tgt, args.emb_dim)
+        if loop == "fit":
+            batches, seconds = bench_fit(ds, model, args.steps, args.warmup)
+        else:
+            batches, seconds = bench_custom(ds, model, args.steps, args.warmup, **options)
+        examples_per_sec = batches * args.batch_size / seconds
+        results["configs"][name] = {"examples_per_sec": examples_per_sec, "batches": batches, "seconds": seconds}
+        print(f"{name:<24} {examples_per_sec:9.1f} examples/sec")
+
+    base = results["configs"].get("fit")
+    if base:
+        for name, stats in results["configs"].items():
+            print(f"{name:<24} {stats['examples_per_sec'] / base['examples_per_sec']:6.2f}x vs fit")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Load test for the notes and visual AI APIs.
+
+Against a running server:
+    locust -f tests/experiments/locustfile.py --host http://localhost:3000
+
+Headless, against a throwaway app with a tiny stub model, writing a JSON report:
+    python tests/experiments/run_load_test.py --users 20 --duration 60 --out load_report.json
+"""
+import os
+import random
+
+from locust import HttpUser, between, task
+
+from payloads import SEED, make_graph, make_note
+
+TRAIN_TIMESTEPS = int(os.environ.get("LOADTEST_TIMESTEPS", 5))
+
+
+class NotesUser(HttpUser):
+    """Someone typing notes and asking for summaries."""
+    wait_time = between(0.5, 2)
+    weight = 3
+
+    def on_start(self):
+        self.rng = random.Random(SEED + id(self) % 1000)
+        self.last_note = make_note(self.rng)
+        self.last_summary = ""
+
+    @task(5)
+    def process(self):
+        self.last_note = make_note(self.rng)
+        with self.client.post("/api/notes/process", json={"text_input": self.last_note},
+                              catch_response=True) as response:
+            if response.status_code == 200:
+                self.last_summary = response.json()["data"]["summary"] or "empty"
+            else:
+                response.failure(f"HTTP {response.status_code}")
+
+    @task(1)
+    def evaluate(self):
+        self.client.post("/api/notes/evaluate", json={
+            "summary": self.last_summary or "summary",
+            "original": self.last_note,
+        })
+
+
+class VisualAIUser(HttpUser):
+    """Someone building graphs in the visual editor and training them."""
+    wait_time = between(1, 3)
+    weight = 1
+
+    def on_start(self):
+        self.rng = random.Random(SEED + 7 + id(self) % 1000)
+        self.owner = f"loadtest-{self.rng.randint(0, 99)}"
+        self.model_ids = []
+        self.create()
+
+    @task(2)
+    def create(self):
+        graph = make_graph(self.rng)
+        response = self.client.post("/ai/create", json=dict(graph, owner=self.owner))
+        if response.status_code == 200:
+            self.model_ids.append(response.json()["model_id"])
+            del self.model_ids[:-20]
+
+    @task(1)
+    def train(self):
+        if not self.model_ids:
+            return
+        self.client.post("/ai/train", json={
+            "model_id": self.rng.choice(self.model_ids),
+            "dataset": os.environ.get("LOADTEST_DATASET", "loadtest"),
+            "timesteps": TRAIN_TIMESTEPS,
+        })
+
+    @task(3)
+    def logs(self):
+        if not self.model_ids:
+            return
+        # Models that were never trained have no logs yet; a 404 is an expected answer
+        with self.client.get(f"/ai/{self.rng.choice(self.model_ids)}/logs", name="/ai/[model_id]/logs",
+                             catch_response=True) as response:
+            if response.status_code in (200, 404):
+                response.success()
+
+    @task(3)
+    def list_models(self):
+        self.client.get(f"/ai/list?owner={self.owner}&limit=50", name="/ai/list?owner=[owner]")
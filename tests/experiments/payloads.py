@@ -0,0 +1,43 @@
+"""Deterministic request payloads shared by the locustfile and the headless runner."""
+import os
+
+# Payload sizes are drawn from these so runs are comparable between releases
+SEED = int(os.environ.get("LOADTEST_SEED", 1234))
+NOTE_WORDS_MEDIAN = 120
+NOTE_WORDS_MAX = 2000
+GRAPH_SIZES = (3, 10, 30, 100)
+
+VOCABULARY = (
+    "lecture students professor theory model data network learning gradient energy "
+    "history economics market policy experiment results analysis chapter exam summary "
+    "neuron layer training loss accuracy protein cell evolution climate carbon equation "
+    "integral derivative matrix vector probability sample variance hypothesis evidence"
+).split()
+FILLER = "the a of and to in is that for on with as this we it be are".split()
+
+
+def make_note(rng):
+    """A note whose length follows a long-tailed distribution, like real lecture notes."""
+    n_words = min(NOTE_WORDS_MAX, max(5, int(rng.lognormvariate(0, 0.8) * NOTE_WORDS_MEDIAN)))
+    words = [rng.choice(VOCABULARY) if rng.random() < 0.4 else rng.choice(FILLER) for _ in range(n_words)]
+    sentences, i = [], 0
+    while i < len(words):
+        length = rng.randint(6, 20)
+        sentences.append(" ".join(words[i:i + length]).capitalize() + ".")
+        i += length
+    return " ".join(sentences)
+
+def make_graph(rng, n_nodes=None):
+    """A random DAG: a few input nodes feeding layers of dense and LSTM nodes."""
+    n_nodes = n_nodes or rng.choice(GRAPH_SIZES)
+    n_inputs = max(1, n_nodes // 10)
+    nodes = [{"id": f"in{i}", "type": "input", "params": {"value": round(rng.uniform(-1, 1), 3)}}
+             for i in range(n_inputs)]
+    edges = []
+    for i in range(n_inputs, n_nodes):
+        node_type = "lstm_cell" if rng.random() < 0.3 else "dense"
+        params = {} if node_type == "lstm_cell" else {"weight": round(rng.uniform(-1, 1), 3), "bias": 0.0}
+        nodes.append({"id": f"n{i}", "type": node_type, "params": params})
+        for parent in rng.sample(nodes[:-1], k=min(len(nodes) - 1, rng.randint(1, 2))):
+            edges.append({"from": parent["id"], "to": f"n{i}", "from_port": "value", "to_port": parent["id"]})
+    return {"name": f"loadtest-{n_nodes}", "nodes": nodes, "edges": edges}
@@ -0,0 +1,198 @@
+"""
+Headless load test: starts the app in a scratch directory with a tiny stub
+summarizer, runs locustfile.py against it and writes p50/p95/p99 latency and
+RPS per endpoint as JSON, so runs can be diffed between releases.
+
+Run from the repo root:
+    python tests/experiments/run_load_test.py [--users 20] [--duration 60] [--out load_report.json]
+                                              [--baseline previous_report.json] [--gunicorn-workers 4]
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.abspath(os.path.join(HERE, "..", ".."))
+sys.path.insert(0, HERE)
+
+from payloads import SEED, make_note
+
+
+def build_stub_model(workdir, max_input_len=50, vocab_size=500):
+    """Embedding + softmax model with the summarizer's input/output shapes, plus tokenizers."""
+    import tensorflow as tf
+
+    rng = random.Random(SEED)
+    corpus = [make_note(rng) for _ in range(200)]
+    tokenizer = tf.keras.preprocessing.text.Tokenizer(num_words=vocab_size, oov_token="<unk>")
+    tokenizer.fit_on_texts(corpus + ["<start> <end>"])
+
+    inputs = tf.keras.Input(shape=(max_input_len,))
+    x = tf.keras.layers.Embedding(vocab_size, 16)(inputs)
+    outputs = tf.keras.layers.Dense(vocab_size, activation="softmax")(x)
+    model_path = os.path.join(workdir, "stub_model.keras")
+    tf.keras.Model(inputs, outputs).save(model_path)
+
+    tok_path = os.path.join(workdir, "stub_tokenizer.json")
+    with open(tok_path, "w", encoding="utf-8") as f:
+        f.write(tokenizer.to_json())
+    return model_path, tok_path
+
+def write_dataset(workdir, rows=200):
+    os.makedirs(os.path.join(workdir, "datasets"), exist_ok=True)
+    with open(os.path.join(workdir, "datasets", "loadtest.csv"), "w") as f:
+        f.write("x\n" + "".join(f"{(i % 17) / 17:.4f}\n" for i in range(rows)))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(workdir, port, model_path, tok_path, gunicorn_workers):
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO,
+        TF_CPP_MIN_LOG_LEVEL="3",
+        MODEL_PATH=model_path,
+        TOKENIZER_INPUT_PATH=tok_path,
+        TOKENIZER_TARGET_PATH=tok_path,
+        DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'app.db')}",
+        MODEL_PRELOAD="summarizer",
+    )
+    if gunicorn_workers:
+        cmd = [sys.executable, "-m", "gunicorn", "-w", str(gunicorn_workers), "-b", f"127.0.0.1:{port}",
+               "app:create_app()"]
+    else:
+        cmd = [sys.executable, "-c",
+               "from app import create_app; "
+               f"create_app().run(host='127.0.0.1', port={port}, threaded=True, debug=False, use_reloader=False)"]
+    # Relative storage paths (./ai_models, ./blob_store, ...) resolve inside workdir
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited early, see {log.name}")
+        try:
+            urllib.request.urlopen(url + "/healthz", timeout=1)
+            return proc, url
+        except OSError:
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError("Server did not become healthy in time")
+
+def run_locust(url, workdir, users, spawn_rate, duration):
+    prefix = os.path.join(workdir, "locust")
+    cmd = [
+        sys.executable, "-m", "locust", "-f", os.path.join(HERE, "locustfile.py"),
+        "--headless", "-u", str(users), "-r", str(spawn_rate), "-t", f"{duration}s",
+        "--host", url, "--csv", prefix, "--only-summary",
+    ]
+    subprocess.run(cmd, cwd=HERE, check=False)
+    return prefix + "_stats.csv"
+
+
+def _stats(row):
+    def num(key):
+        value = row.get(key) or "0"
+        return float(value) if value != "N/A" else None
+    return {
+        "requests": int(num("Request Count")),
+        "failures": int(num("Failure Count")),
+        "avg_ms": num("Average Response Time"),
+        "p50_ms": num("50%"),
+        "p95_ms": num("95%"),
+        "p99_ms": num("99%"),
+        "rps": num("Requests/s"),
+    }
+
+def parse_stats(csv_path):
+    endpoints, total = {}, None
+    with open(csv_path, newline="") as f:
+        for row in csv.DictReader(f):
+            if row["Name"] == "Aggregated":
+                total = _stats(row)
+            else:
+                endpoints[f"{row['Type']} {row['Name']}"] = _stats(row)
+    return endpoints, total
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report, baseline):
+    print(f"\n{'endpoint':<40} {'p95 ms':>10} {'was':>10} {'rps':>8} {'was':>8}")
+    for name, stats in sorted(report["endpoints"].items()):
+        old = baseline.get("endpoints", {}).get(name, {})
+        print(f"{name:<40} {stats['p95_ms'] or 0:>10.0f} {old.get('p95_ms') or 0:>10.0f} "
+              f"{stats['rps'] or 0:>8.1f} {old.get('rps') or 0:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--spawn-rate", type=float, default=5)
+    parser.add_argument("--duration", type=int, default=60, help="seconds")
+    parser.add_argument("--gunicorn-workers", type=int, default=0, help="serve with gunicorn instead of Flask")
+    parser.add_argument("--out", default="load_report.json")
+    parser.add_argument("--baseline", default=None, help="previous report to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    proc = None
+    try:
+        model_path, tok_path = build_stub_model(workdir)
+        write_dataset(workdir)
+        proc, url = start_server(workdir, free_port(), model_path, tok_path, args.gunicorn_workers)
+        print(f"[Info] Server up at {url}, running {args.users} users for {args.duration}s")
+        endpoints, total = parse_stats(run_locust(url, workdir, args.users, args.spawn_rate, args.duration))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if args.keep:
+            print(f"[Info] Scratch directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().strftime("%Y%m%dT%H%M%S"),
+            "commit": git_commit(),
+            "users": args.users,
+            "duration_s": args.duration,
+            "server": f"gunicorn x{args.gunicorn_workers}" if args.gunicorn_workers else "flask",
+            "seed": SEED,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "endpoints": endpoints,
+        "total": total,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"[✔] Report written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
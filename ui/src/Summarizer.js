@@ -95,6 +95,15 @@ function Summarizer() {
     }
   };
 
+  const pollJob = async jobId => {
+    for (;;) {
+      const res = await fetch(`/notes/jobs/${jobId}`);
+      const { data } = await res.json();
+      if (data.status === 'done' || data.status === 'failed') return data;
+      await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+  };
+
   const sendAudioBlob = async blob => {
     setLoading(true);
     setSummary('');
@@ -106,7 +115,13 @@ function Summarizer() {
 
       const res = await fetch('/notes/process', { method: 'POST', body: formData });
       const data = await res.json();
-      setSummary(data.summary || JSON.stringify(data));
+      if (res.status !== 202) {
+        setSummary(data.summary || JSON.stringify(data));
+        return;
+      }
+      // Audio is transcribed in the background; poll the job until it finishes
+      const job = await pollJob(data.data.job_id);
+      setSummary(job.result ? job.result.summary : `Audio processing failed: ${job.error}`);
     } catch (err) {
       console.error(err);
       alert('Audio summarization failed—check the console.');